@@ -0,0 +1,202 @@
+"""
+Time-budgeted Monte Carlo planner for the AI's unit type.
+
+Each candidate unit type is scored by simulated combat against many sampled player responses,
+drawn from what the AI can actually know when it commits: the player's R2 pool and both R1
+armies. It never looks at the player's submitted R2 deployment, so the AI does not cheat.
+Sampling is split into shards. One shard always runs in the calling thread, so a decision
+comes back even if the pool is busy; the others run on a process pool. All shards stop at the
+same deadline, and whatever has been scored by then decides.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from combat import AI_WINS, DRAW
+
+# What the AI assumes about the player in R2; any remaining probability is a uniformly random type
+P_COUNTER_AI_R1 = 0.4  # Player picks the type that beats the AI's revealed R1 type
+P_REPEAT_R1 = 0.2      # Player sticks with their R1 type
+P_FULL_POOL = 0.8      # Player deploys the whole pool; otherwise a uniform part of it
+
+DEFAULT_BUDGET_SECONDS = 0.02
+DEFAULT_BATCH_SIZE = 256
+COLLECT_FRACTION = 0.15 # Share of the budget kept back for collecting pool results
+
+
+class PlayerResponseModel:
+    """
+    Samples plausible player armies (type code, count) for a decision context.
+    - context: Dict. Round 1 passes the player's known army as 'player_type'/'player_count'.
+      Later rounds pass 'player_pool' and the types both sides fought with last round,
+      'player_last_type' and 'ai_last_type'.
+    """
+
+    def __init__(self, combat_engine, context):
+        codes = combat_engine.type_codes
+        self.n_types = len(codes)
+        self.fixed = None
+        if context.get('player_type') is not None:
+            self.fixed = (codes[context['player_type']], context['player_count'])
+            return
+        self.pool = context['player_pool']
+        self.repeat_code = codes.get(context.get('player_last_type'))
+        self.counter_code = None
+        ai_last_code = codes.get(context.get('ai_last_type'))
+        if ai_last_code is not None:
+            # Strongest answer to the type the AI fought with last round
+            best = max(range(self.n_types), key=lambda code: combat_engine.modifier_by_code(code, ai_last_code))
+            if combat_engine.modifier_by_code(best, ai_last_code) > 1.0:
+                self.counter_code = best
+
+    def sample(self, rng, size):
+        """Returns (type_codes, counts) lists of length size."""
+        if self.fixed is not None:
+            return [self.fixed[0]] * size, [self.fixed[1]] * size
+        type_codes, counts = [], []
+        pool, n_types = self.pool, self.n_types
+        for _ in range(size):
+            roll = rng.random()
+            if roll < P_COUNTER_AI_R1 and self.counter_code is not None:
+                type_codes.append(self.counter_code)
+            elif roll < P_COUNTER_AI_R1 + P_REPEAT_R1 and self.repeat_code is not None:
+                type_codes.append(self.repeat_code)
+            else:
+                type_codes.append(rng.randrange(n_types))
+            counts.append(pool if pool <= 0 or rng.random() < P_FULL_POOL else rng.randint(1, pool))
+        return type_codes, counts
+
+
+def evaluate_shard(combat_engine, context, seed, deadline, batch_size, max_samples, at_least_one_batch=False):
+    """
+    Scores every unit type against sampled player responses until the wall-clock deadline
+    (time.time()) or max_samples. Module-level so pool processes can run it.
+    Returns (scores, margins, samples): per-type sums of the AI's result (win 1, draw 0.5, loss 0)
+    and strength margin, and the number of responses each type was scored against.
+    """
+    rng = random.Random(seed)
+    model = PlayerResponseModel(combat_engine, context)
+    n_types = len(combat_engine.unit_types)
+    ai_count = context['ai_count']
+    scores, margins = [0.0] * n_types, [0.0] * n_types
+    samples = 0
+    while (at_least_one_batch and samples == 0) or time.time() < deadline:
+        size = batch_size if max_samples is None else min(batch_size, max_samples - samples)
+        if size <= 0:
+            break
+        player_codes, player_counts = model.sample(rng, size)
+        ai_counts = [ai_count] * size
+        for code in range(n_types):
+            result = combat_engine.resolve_batch(player_codes, player_counts, [code] * size, ai_counts)
+            # winner is from the player's side: AI_WINS (-1) -> 1.0, DRAW -> 0.5, PLAYER_WINS -> 0.0
+            scores[code] += result.winner.count(AI_WINS) + 0.5 * result.winner.count(DRAW)
+            margins[code] += sum(result.ai_strength) - sum(result.player_strength)
+        samples += size
+    return scores, margins, samples
+
+
+class MonteCarloPlanner:
+    """
+    Picks the AI's unit type within a hard time budget.
+    - combat_engine: CombatEngine used to score matchups.
+    - budget_seconds: Float, wall-clock budget per decision (default 20 ms).
+    - processes: Integer, pool processes for extra shards; 0 keeps all sampling in the calling thread.
+    - batch_size: Integer, responses scored per batch; the deadline is checked between batches.
+    - max_samples: Optional cap on responses per shard, e.g. for cheap or reproducible runs.
+    The pool is started in the background on first use (and again after a fork, so a planner
+    built before a pre-forking server starts its workers works in each of them); until it is
+    up, decisions are planned inline so no request waits on process startup.
+    """
+
+    def __init__(self, combat_engine, budget_seconds=DEFAULT_BUDGET_SECONDS, processes=0,
+                 batch_size=DEFAULT_BATCH_SIZE, max_samples=None):
+        self.combat_engine = combat_engine
+        self.budget_seconds = budget_seconds
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        """The process pool if it is up, else None (starting it in the background if needed)."""
+        if self.processes <= 0:
+            return None
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor, self._executor_pid = None, os.getpid()
+                threading.Thread(target=self._start_pool, daemon=True).start()
+            return self._executor
+
+    def _start_pool(self):
+        # forkserver: forking straight from a multi-threaded request worker is unsafe
+        executor = concurrent.futures.ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('forkserver'))
+        try:
+            # Make every process start before the pool is handed out
+            list(executor.map(time.sleep, [0.05] * self.processes))
+        except Exception:
+            executor.shutdown(wait=False)
+            return
+        with self._lock:
+            if self._executor_pid == os.getpid():
+                self._executor = executor
+                return
+        executor.shutdown(wait=False)
+
+    def plan(self, context, rng=random):
+        """
+        Returns (unit_type, report). report holds the samples scored, the expected score per type
+        and the elapsed time. The budget covers waiting for pool shards; late shards are dropped.
+        """
+        start = time.perf_counter()
+        deadline = time.time() + self.budget_seconds
+        pool = self._pool()
+        futures = []
+        if pool is not None:
+            # Pool shards stop early so their results arrive before the deadline
+            shard_deadline = deadline - self.budget_seconds * COLLECT_FRACTION
+            try:
+                futures = [pool.submit(evaluate_shard, self.combat_engine, context, rng.getrandbits(64), shard_deadline,
+                                       self.batch_size, self.max_samples)
+                           for _ in range(self.processes)]
+            except RuntimeError: # Pool broken (e.g. a process was killed); start a fresh one
+                with self._lock:
+                    self._executor_pid = None
+        shards = [evaluate_shard(self.combat_engine, context, rng.getrandbits(64), deadline,
+                                 self.batch_size, self.max_samples, at_least_one_batch=True)]
+        if futures:
+            done, not_done = concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.time()))
+            for future in not_done:
+                future.cancel()
+            shards.extend(future.result() for future in done if future.exception() is None)
+
+        n_types = len(self.combat_engine.unit_types)
+        scores, margins, samples = [0.0] * n_types, [0.0] * n_types, 0
+        for shard_scores, shard_margins, shard_samples in shards:
+            samples += shard_samples
+            for code in range(n_types):
+                scores[code] += shard_scores[code]
+                margins[code] += shard_margins[code]
+        best = max(range(n_types), key=lambda code: (scores[code], margins[code]))
+        report = {
+            'samples': samples,
+            'shards': len(shards),
+            'expected_score': {unit_type: scores[code] / samples for code, unit_type in enumerate(self.combat_engine.unit_types)},
+            'elapsed_ms': (time.perf_counter() - start) * 1e3
+        }
+        return self.combat_engine.unit_types[best], report
+
+    def choose_unit_type(self, context, rng=random):
+        return self.plan(context, rng)[0]
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            owned = self._executor_pid == os.getpid()
+            self._executor_pid = None
+        if executor is not None and owned:
+            executor.shutdown(wait=False, cancel_futures=True)
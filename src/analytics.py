@@ -0,0 +1,171 @@
+"""
+Balance analytics: how finished games turned out, aggregated inside the server.
+
+For each tumbling window of window_seconds (the last `windows` of them are kept) it counts:
+- per round and (player type, AI type) matchup: games, wins per side, draws, and the sum and
+  sum of squares of the strength difference (player - AI), for its mean and spread;
+- the bonus troops R1's winner takes into R2, as a fixed-bucket histogram per winning side;
+- R1 winner x R2 winner, to see how much winning R1 decides the game.
+Everything is a counter, so memory is bounded by windows x matchups whatever the traffic.
+
+Games are fed in as game_log.GameRecord, so a log read back with GameLogReader can be
+aggregated the same way offline. Each worker process keeps its own stats.
+
+Updates are lock-light: there are SHARDS independent stripes, each with its own lock, and a
+thread always updates the same stripe (handed out round-robin on its first game), so request
+threads almost never wait on each other. Reads lock one stripe at a time and merge them.
+"""
+import itertools
+import math
+import threading
+import time
+
+from instrumentation import Histogram
+
+WINDOW_SECONDS = 60
+WINDOW_COUNT = 60 # One hour of one-minute windows
+SHARDS = 8
+BONUS_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+OUTCOMES = ('Player', 'AI', 'Draw')
+# Matchup counter slots: games, one per outcome, strength difference sum and sum of squares
+_GAMES, _DIFF_SUM, _DIFF_SQUARES = 0, 4, 5
+_OUTCOME_SLOT = {'Player': 1, 'AI': 2, 'Draw': 3}
+
+
+class _Window:
+    __slots__ = ('index', 'games', 'matchups', 'bonus', 'rounds')
+
+    def __init__(self, index):
+        self.index = index
+        self.games = 0
+        self.matchups = {} # (round, player type, AI type) -> counter slots
+        self.bonus = {winner: Histogram(BONUS_BUCKETS) for winner in ('Player', 'AI')}
+        self.rounds = {} # (R1 winner, R2 winner) -> games
+
+    def merge(self, other):
+        self.games += other.games
+        for key, counts in other.matchups.items():
+            mine = self.matchups.setdefault(key, [0, 0, 0, 0, 0.0, 0.0])
+            for slot, value in enumerate(counts):
+                mine[slot] += value
+        for winner, histogram in other.bonus.items():
+            mine = self.bonus[winner]
+            mine.counts = [a + b for a, b in zip(mine.counts, histogram.counts)]
+            mine.total += histogram.total
+            mine.count += histogram.count
+        for key, games in other.rounds.items():
+            self.rounds[key] = self.rounds.get(key, 0) + games
+
+
+class _Shard:
+    __slots__ = ('lock', 'windows')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {} # Window index -> _Window
+
+
+class BalanceStats:
+    """
+    Incremental per-matchup outcome counters over tumbling time windows.
+    - window_seconds: Length of one window.
+    - windows: Number of most recent windows kept; older ones are dropped.
+    - clock: Function returning the current time in seconds (time.time by default).
+    """
+
+    def __init__(self, window_seconds=WINDOW_SECONDS, windows=WINDOW_COUNT, clock=time.time):
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.clock = clock
+        self._shards = [_Shard() for _ in range(SHARDS)]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._next_shard) % SHARDS]
+        return shard
+
+    def record(self, game):
+        """Counts one finished game (a game_log.GameRecord, or anything with its r1 and r2 tuples)."""
+        index = int(self.clock() // self.window_seconds)
+        r1, r2 = game.r1, game.r2
+        shard = self._shard()
+        with shard.lock:
+            window = shard.windows.get(index)
+            if window is None:
+                window = shard.windows[index] = _Window(index)
+                for stale in [old for old in shard.windows if old <= index - self.windows]:
+                    del shard.windows[stale]
+            window.games += 1
+            for round_number, (player_type, ai_type, winner, player_strength, ai_strength) in ((1, r1), (2, r2)):
+                counts = window.matchups.get((round_number, player_type, ai_type))
+                if counts is None:
+                    counts = window.matchups[(round_number, player_type, ai_type)] = [0, 0, 0, 0, 0.0, 0.0]
+                difference = player_strength - ai_strength
+                counts[_GAMES] += 1
+                counts[_OUTCOME_SLOT[winner]] += 1
+                counts[_DIFF_SUM] += difference
+                counts[_DIFF_SQUARES] += difference * difference
+            if r1[2] != 'Draw':
+                window.bonus[r1[2]].observe(int(abs(r1[3] - r1[4]))) # Same rule as the R2 bonus troops
+            key = (r1[2], r2[2])
+            window.rounds[key] = window.rounds.get(key, 0) + 1
+
+    def snapshot(self, last=None):
+        """
+        JSON-able summary of the last `last` windows (all kept windows by default), the current
+        partial window included.
+        """
+        last = self.windows if last is None else max(1, min(last, self.windows))
+        current = int(self.clock() // self.window_seconds)
+        first = current - last + 1
+        merged = _Window(None)
+        for shard in self._shards:
+            with shard.lock:
+                for window in shard.windows.values():
+                    if first <= window.index <= current:
+                        merged.merge(window)
+        return {
+            'window_seconds': self.window_seconds,
+            'windows': last,
+            'since': first * self.window_seconds,
+            'games': merged.games,
+            'matchups': [_describe_matchup(key, counts) for key, counts in sorted(merged.matchups.items())],
+            'bonus_troops': {winner: _describe_histogram(histogram) for winner, histogram in merged.bonus.items()},
+            'round_correlation': _describe_rounds(merged.rounds)
+        }
+
+
+def _describe_matchup(key, counts):
+    round_number, player_type, ai_type = key
+    games = counts[_GAMES]
+    mean = counts[_DIFF_SUM] / games
+    variance = max(0.0, counts[_DIFF_SQUARES] / games - mean * mean)
+    return {
+        'round': round_number, 'player_type': player_type, 'ai_type': ai_type, 'games': games,
+        'player_win_rate': counts[1] / games, 'ai_win_rate': counts[2] / games, 'draw_rate': counts[3] / games,
+        'mean_strength_difference': mean, 'stddev_strength_difference': math.sqrt(variance)
+    }
+
+def _describe_histogram(histogram):
+    bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+    return {
+        'games': histogram.count,
+        'mean': histogram.total / histogram.count if histogram.count else None,
+        'buckets': [{'le': bound, 'games': games} for bound, games in zip(bounds, histogram.counts)] # Not cumulative
+    }
+
+def _describe_rounds(rounds):
+    """R1 x R2 winner table, the share of games whose R2 went the same way, and the phi
+    coefficient between "player won R1" and "player won R2" (None until both vary)."""
+    table = {r1: {r2: rounds.get((r1, r2), 0) for r2 in OUTCOMES} for r1 in OUTCOMES}
+    games = sum(rounds.values())
+    same = sum(table[outcome][outcome] for outcome in OUTCOMES)
+    won_both = table['Player']['Player']
+    won_r1 = sum(table['Player'].values())
+    won_r2 = sum(table[r1]['Player'] for r1 in OUTCOMES)
+    denominator = won_r1 * (games - won_r1) * won_r2 * (games - won_r2)
+    phi = (won_both * games - won_r1 * won_r2) / math.sqrt(denominator) if denominator else None
+    return {'table': table, 'same_winner_rate': same / games if games else None, 'phi': phi}
@@ -0,0 +1,201 @@
+"""
+Static asset build and in-memory asset cache.
+Build from src/:  python assets.py  (writes static/dist/)
+
+The build:
+- copies style.css and script.js under content-hashed names (style.<hash>.css);
+- packs the unit images in static/images into one sprite atlas with a stylesheet of
+  .unit-<image name> classes (see sprites), also content-hashed;
+- writes a gzip twin (<name>.gz) of every compressible file once, at the highest level;
+- rewrites index.html to load the hashed files and tells script.js to draw units from the atlas;
+- records what it wrote in manifest.json.
+
+AssetCache loads a built directory into memory at import, so serve.py's workers share it and a
+request never touches the disk or compresses anything. Hashed files change name when their
+content does, so they are served as immutable for a year; index.html keeps its name and is
+revalidated on every load. Every response has a strong ETag, so a matching If-None-Match gets
+a bodyless 304. Without a build, the server keeps serving the plain files in static/.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import Response
+
+import sprites
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+URL_PREFIX = '/assets/'
+MANIFEST = 'manifest.json'
+HASHED_SOURCES = ('style.css', 'script.js')
+GZIP_TYPES = {'text/css', 'text/html', 'text/javascript', 'application/javascript', 'application/json'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()[:16]
+
+def hashed_name(name, body):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{content_hash(body)}{ext}'
+
+def _mimetype(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+def _rewrite_index(html, urls, sprites_css_url):
+    """index.html pointing at the hashed files, with the sprite stylesheet and the sprite flag added."""
+    for name, url in urls.items():
+        if f'/static/{name}' not in html:
+            raise ValueError(f'index.html does not load /static/{name}.')
+        html = html.replace(f'/static/{name}', url)
+    if '</head>' not in html or '<body>' not in html:
+        raise ValueError('index.html has no </head> or <body> tag.')
+    html = html.replace('</head>', f'    <link rel="stylesheet" href="{sprites_css_url}">\n</head>', 1)
+    return html.replace('<body>', '<body data-unit-sprites>', 1) # script.js draws units from the atlas
+
+def build(static_dir=STATIC_DIR, out_dir=DIST_DIR):
+    """
+    Builds the assets in static_dir into out_dir. Files a previous build listed in its manifest
+    and this one no longer writes are removed; nothing else in out_dir is touched.
+    Returns the manifest: {'files': {source name: built name}, 'assets': {built name: {'gzip': bool}}}.
+    """
+    outputs = {} # built name -> body
+    files = {}
+    for name in HASHED_SOURCES:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            body = f.read()
+        files[name] = hashed_name(name, body)
+        outputs[files[name]] = body
+
+    images_dir = os.path.join(static_dir, 'images')
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.endswith('.png'):
+            with open(os.path.join(images_dir, name), 'rb') as f:
+                images.append((name[:-4], sprites.read_png(f.read())))
+    atlas, offsets = sprites.build_atlas(images)
+    atlas_png = sprites.write_png(atlas)
+    files['units.png'] = hashed_name('units.png', atlas_png)
+    outputs[files['units.png']] = atlas_png
+    units_css = sprites.atlas_css(URL_PREFIX + files['units.png'], offsets).encode('utf-8')
+    files['units.css'] = hashed_name('units.css', units_css)
+    outputs[files['units.css']] = units_css
+
+    with open(os.path.join(static_dir, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    urls = {name: URL_PREFIX + files[name] for name in HASHED_SOURCES}
+    outputs['index.html'] = _rewrite_index(html, urls, URL_PREFIX + files['units.css']).encode('utf-8')
+    files['index.html'] = 'index.html'
+
+    os.makedirs(out_dir, exist_ok=True)
+    assets = {}
+    for name, body in outputs.items():
+        _write(os.path.join(out_dir, name), body)
+        assets[name] = {'gzip': _mimetype(name) in GZIP_TYPES}
+        if assets[name]['gzip']:
+            _write(os.path.join(out_dir, name + '.gz'), gzip.compress(body, compresslevel=9, mtime=0))
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f).get('assets', {})
+        for name, info in previous.items():
+            if name not in assets:
+                for stale in (name, name + '.gz') if info.get('gzip') else (name,):
+                    if os.path.exists(os.path.join(out_dir, stale)):
+                        os.remove(os.path.join(out_dir, stale))
+    manifest = {'files': files, 'assets': assets}
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+def _write(path, body):
+    # Write then rename, so a server loading the directory never reads a half-written file
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+class Asset:
+    """One built file held in memory: body, optional gzip body, content type, ETag and Cache-Control."""
+
+    __slots__ = ('body', 'gzip_body', 'mimetype', 'etag', 'cache_control')
+
+    def __init__(self, body, gzip_body, mimetype, etag, cache_control):
+        self.body = body
+        self.gzip_body = gzip_body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+
+
+class AssetCache:
+    """
+    Built assets served from memory.
+    - assets: Dict of built name -> Asset.
+    """
+
+    def __init__(self, assets):
+        self.assets = assets
+
+    @classmethod
+    def load(cls, directory=DIST_DIR):
+        """Cache of a build() output directory, or None if it has not been built."""
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        assets = {}
+        for name, info in manifest['assets'].items():
+            with open(os.path.join(directory, name), 'rb') as f:
+                body = f.read()
+            gzip_body = None
+            if info.get('gzip'):
+                with open(os.path.join(directory, name + '.gz'), 'rb') as f:
+                    gzip_body = f.read()
+            assets[name] = Asset(body, gzip_body, _mimetype(name), content_hash(body),
+                                 REVALIDATE if name == 'index.html' else IMMUTABLE)
+        return cls(assets)
+
+    def response(self, name, request):
+        """Response for a built asset (304 when the client's copy is current), or None if there is no such asset."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        # Each encoding is its own representation, so it gets its own strong ETag
+        use_gzip = asset.gzip_body is not None and request.accept_encodings['gzip'] > 0
+        etag = asset.etag + '-gzip' if use_gzip else asset.etag
+        headers = {'Cache-Control': asset.cache_control}
+        if asset.gzip_body is not None:
+            headers['Vary'] = 'Accept-Encoding'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(asset.gzip_body if use_gzip else asset.body, mimetype=asset.mimetype, headers=headers)
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        # Final as built: compressing it again on the way out would send a second body under this ETag
+        response.direct_passthrough = True
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Builds fingerprinted, precompressed static assets and the unit sprite atlas.')
+    parser.add_argument('--static-dir', default=STATIC_DIR, help='Source static directory.')
+    parser.add_argument('--out-dir', default=DIST_DIR, help='Output directory (served from memory by the app).')
+    args = parser.parse_args()
+    manifest = build(args.static_dir, args.out_dir)
+    for name in sorted(manifest['assets']):
+        size = os.path.getsize(os.path.join(args.out_dir, name))
+        compressed = f', {os.path.getsize(os.path.join(args.out_dir, name + ".gz"))} gzipped' if manifest['assets'][name]['gzip'] else ''
+        print(f'{name}: {size} bytes{compressed}')
+
+if __name__ == '__main__':
+    main()
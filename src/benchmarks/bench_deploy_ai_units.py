@@ -0,0 +1,51 @@
+"""
+Times deploy_ai_units on square maps of increasing size.
+Run from src/:  python -m benchmarks.bench_deploy_ai_units [--sizes 5 64 512 2048]
+"""
+import argparse
+import random
+import time
+
+from game_engine import deploy_ai_units
+from occupancy import OccupancyGrid
+
+DEFAULT_SIZES = [5, 64, 512, 2048]
+
+
+def make_grid(size, fill_ratio, rng):
+    grid = OccupancyGrid(size)
+    for x, y in grid.sample_free_cells(int(size * size * fill_ratio), rng):
+        grid.occupy(x, y)
+    return grid
+
+
+def time_deploy(size, units, fill_ratio, repeat, rng):
+    base_grid = make_grid(size, fill_ratio, rng)
+    best = float('inf')
+    for _ in range(repeat):
+        grid = base_grid.copy() # Copy outside the timed section; only the deployment is measured
+        start = time.perf_counter()
+        deploy_ai_units(units, 'infantry', grid, 'AI', rng)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--units', type=int, nargs='+', default=[10, 1000])
+    parser.add_argument('--fill', type=float, default=0.01, help='Fraction of cells occupied before deploying.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'map_size':>9} {'units':>7} {'best_ms':>10}")
+    for size in args.sizes:
+        for units in args.units:
+            seconds = time_deploy(size, units, args.fill, args.repeat, rng)
+            print(f"{size:>9} {units:>7} {seconds * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Microbenchmarks for the game hot paths, with a JSON baseline and regression thresholds.
+Run from src/:
+    python -m benchmarks.suite                      # compare against benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline    # record a new baseline
+    python -m benchmarks.suite --quick --filter deploy
+
+Each case is timed over several repeats (per-call min and median) and then run once
+under tracemalloc for peak allocated bytes. Exits 1 if any case is slower, or allocates
+more, than its baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import launch
+from deployments import DeploymentBatch
+from game_engine import VALID_UNIT_TYPES, GameEngine, deploy_ai_units, populate_map_from_deployments, initialize_map
+from movement import MovementPhase
+from occupancy import OccupancyGrid
+from spatial_combat import SpatialCombat
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+UNIT_TYPES = VALID_UNIT_TYPES
+
+
+class BenchCase:
+    """
+    One parameterized benchmark.
+    - name: String, the benchmark family, e.g. 'deploy_ai_units'.
+    - params: Dict of parameters; together with name it forms the baseline key.
+    - setup: Callable returning a zero-argument callable to time. Setup cost is not measured.
+    """
+
+    def __init__(self, name, params, setup):
+        self.name = name
+        self.params = params
+        self.setup = setup
+
+    @property
+    def key(self):
+        return self.name + '[' + ','.join(f'{k}={v}' for k, v in sorted(self.params.items())) + ']'
+
+
+def make_deployments(map_size, count, owner, rng):
+    grid = OccupancyGrid(map_size)
+    return [{'owner': owner, 'unit_type': rng.choice(UNIT_TYPES), 'count': rng.randint(1, 9), 'x': x, 'y': y}
+            for x, y in grid.sample_free_cells(count, rng)]
+
+
+# --- Case setups ---
+def setup_deploy_ai_units(map_size, units):
+    rng = random.Random(1)
+    base_grid = OccupancyGrid(map_size, [(0, 0), (map_size - 1, map_size - 1)])
+    def run():
+        deploy_ai_units(units, 'infantry', base_grid.copy(), 'AI', rng, DeploymentBatch(map_size, UNIT_TYPES))
+    return run
+
+def setup_populate_map(map_size, deployments):
+    # The batch form is what the engine passes around
+    deployment_list = DeploymentBatch.from_dicts(make_deployments(map_size, deployments, 'P1', random.Random(2)), map_size, UNIT_TYPES)
+    def run():
+        populate_map_from_deployments(deployment_list, initialize_map(map_size, UNIT_TYPES))
+    return run
+
+def make_mixed_map(map_size, deployments, seed):
+    # Both sides' stacks scattered over one map
+    rng = random.Random(seed)
+    deployment_list = [dict(dep, owner=rng.choice(['P1', 'AI'])) for dep in make_deployments(map_size, deployments, 'P1', rng)]
+    return populate_map_from_deployments(deployment_list, initialize_map(map_size, UNIT_TYPES))
+
+def setup_spatial_combat(map_size, deployments):
+    game_map = make_mixed_map(map_size, deployments, 6)
+    spatial_combat = SpatialCombat(launch.combat_engine)
+    def run():
+        spatial_combat.resolve(game_map)
+    return run
+
+def setup_movement(map_size, deployments, cache):
+    game_map = make_mixed_map(map_size, deployments, 7)
+    move_ranges = {name: stats.get('move_range', 1) for name, stats in launch.unit_registry.current.stats.items()}
+    movement = MovementPhase(move_ranges)
+    def run():
+        # 'cold' recomputes the distance fields, as after any occupancy change; 'warm' reuses them
+        (movement if cache == 'warm' else MovementPhase(move_ranges)).move(game_map.copy())
+    return run
+
+def setup_validate_r2(map_size, deployments):
+    engine = GameEngine(map_size=map_size)
+    _, state = engine.play_round_1(random.Random(3))
+    state['player_pool'] = 10 ** 9 # Large enough that the payload is always within budget
+    free = state['occupancy'].sample_free_cells(deployments, random.Random(4))
+    payload = [{'unit_type': UNIT_TYPES[i % len(UNIT_TYPES)], 'unit_count': 1, 'x': x, 'y': y} for i, (x, y) in enumerate(free)]
+    def run():
+        engine.validate_round_2_deployments(state, payload)
+    return run
+
+def _use_engine(map_size):
+    # Route benchmarks swap in an engine with the requested map size, configured like the server's
+    launch.game_engine = launch.make_game_engine(launch.unit_registry.current, map_size=map_size)
+
+def setup_request_r1(map_size):
+    _use_engine(map_size)
+    client = launch.app.test_client()
+    def run():
+        response = client.post('/submit_round_1', json={})
+        assert response.status_code == 200, response.data[:200]
+    return run
+
+def setup_request_r2(map_size, deployments):
+    _use_engine(map_size)
+    client = launch.app.test_client()
+    rng = random.Random(5)
+    def run():
+        r1 = client.post('/submit_round_1', json={}).get_json()
+        state = launch.game_store.get(r1['game_id'])
+        state['player_pool'] = 10 ** 9
+        free = state['occupancy'].sample_free_cells(deployments, rng)
+        payload = {'game_id': r1['game_id'],
+                   'player_deployments_r2': [{'unit_type': 'cavalry', 'unit_count': 1, 'x': x, 'y': y} for x, y in free]}
+        response = client.post('/submit_round_2', json=payload)
+        assert response.status_code == 200, response.data[:200]
+    return run
+
+
+def build_cases(quick=False):
+    map_sizes = [5, 64] if quick else [5, 64, 512]
+    cases = []
+    for map_size in map_sizes:
+        for units in (10, 1000):
+            cases.append(BenchCase('deploy_ai_units', {'map_size': map_size, 'units': units},
+                                   lambda m=map_size, u=units: setup_deploy_ai_units(m, u)))
+        for deployments in (10, 1000):
+            if deployments >= map_size * map_size - 2:
+                continue
+            cases.append(BenchCase('populate_map', {'map_size': map_size, 'deployments': deployments},
+                                   lambda m=map_size, d=deployments: setup_populate_map(m, d)))
+            cases.append(BenchCase('validate_r2', {'map_size': map_size, 'deployments': deployments},
+                                   lambda m=map_size, d=deployments: setup_validate_r2(m, d)))
+            cases.append(BenchCase('spatial_combat', {'map_size': map_size, 'deployments': deployments},
+                                   lambda m=map_size, d=deployments: setup_spatial_combat(m, d)))
+            for cache in ('cold', 'warm'):
+                cases.append(BenchCase('movement', {'map_size': map_size, 'deployments': deployments, 'cache': cache},
+                                       lambda m=map_size, d=deployments, c=cache: setup_movement(m, d, c)))
+        cases.append(BenchCase('request_r1', {'map_size': map_size}, lambda m=map_size: setup_request_r1(m)))
+        for deployments in (10, 1000):
+            if deployments >= map_size * map_size - 2:
+                continue
+            cases.append(BenchCase('request_r2', {'map_size': map_size, 'deployments': deployments},
+                                   lambda m=map_size, d=deployments: setup_request_r2(m, d)))
+    return cases
+
+
+def measure(case, repeat, min_time):
+    """Returns {'min_s', 'median_s', 'peak_bytes', 'number'} for one case."""
+    run = case.setup()
+    run() # Warm-up
+
+    # Pick an iteration count so one repeat takes at least min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= min_time or number >= 1 << 16:
+            break
+        number *= 2
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        per_call.append((time.perf_counter() - start) / number)
+
+    # Memory is measured separately: tracemalloc slows every allocation down
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'min_s': min(per_call), 'median_s': statistics.median(per_call), 'peak_bytes': peak, 'number': number}
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """
+    Compares results against baseline (both dicts keyed by case key).
+    Returns a list of human-readable regression messages; empty means pass.
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if current['median_s'] > base['median_s'] * (1 + time_threshold):
+            regressions.append(f"{key}: median {current['median_s'] * 1e3:.3f} ms vs baseline {base['median_s'] * 1e3:.3f} ms")
+        if current['peak_bytes'] > base['peak_bytes'] * (1 + memory_threshold):
+            regressions.append(f"{key}: peak {current['peak_bytes']} B vs baseline {base['peak_bytes']} B")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Game hot path microbenchmarks.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline instead of comparing.')
+    parser.add_argument('--output', help='Also write this run\'s results to a JSON file.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed fractional slowdown of the median (0.25 = 25%%).')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='Allowed fractional growth of peak memory.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per repeat.')
+    parser.add_argument('--quick', action='store_true', help='Skip the largest map sizes.')
+    parser.add_argument('--filter', default='', help='Only run cases whose key contains this substring.')
+    args = parser.parse_args(argv)
+
+    launch.app.logger.disabled = True
+    original_engine = launch.game_engine
+    results = {}
+    try:
+        print(f"{'case':<52} {'median_ms':>10} {'min_ms':>10} {'peak_kb':>10}")
+        for case in build_cases(args.quick):
+            if args.filter not in case.key:
+                continue
+            result = measure(case, args.repeat, args.min_time)
+            results[case.key] = result
+            print(f"{case.key:<52} {result['median_s'] * 1e3:>10.3f} {result['min_s'] * 1e3:>10.3f} {result['peak_bytes'] / 1024:>10.1f}")
+    finally:
+        launch.game_engine = original_engine
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    for message in regressions:
+        print('REGRESSION ' + message, file=sys.stderr)
+    if not regressions:
+        print(f'No regressions beyond {args.threshold:.0%} time / {args.memory_threshold:.0%} memory.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
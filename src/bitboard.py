@@ -0,0 +1,69 @@
+"""
+Occupancy bitboards: one bit per map cell packed into a Python int, so whole-grid set
+operations (shift, and, or) run in C instead of a Python loop per cell.
+
+Each row (fixed x) is padded with one always-empty cell, so cell x * size + y sits at bit
+cell + cell // size and a row is W = size + 1 bits wide. Shifting by 1 moves along y and by W
+along x, and a shift never wraps from the end of one row into the next.
+"""
+import functools
+
+from game_map import OWNER_CODES
+
+PLAYER_CODE, AI_CODE = OWNER_CODES['P1'], OWNER_CODES['AI']
+_NONZERO_TO_ONE = bytes([0] + [1] * 255) # translate() table: any set bit in a byte -> 1
+
+
+def board_bytes(size):
+    """Length in bytes of a board for a size x size map."""
+    return (size * (size + 1) + 7) // 8
+
+
+@functools.lru_cache(maxsize=16)
+def valid_mask(size):
+    """Board with every real (non-padding) cell set."""
+    width = size + 1
+    mask, rows = (1 << size) - 1, 1
+    while rows < size: # Double the rows each step instead of OR-ing them in one by one
+        mask |= mask << (rows * width)
+        rows *= 2
+    return mask & ((1 << (size * width)) - 1)
+
+
+def neighbours(board, width):
+    """Cells orthogonally adjacent to any cell of board (may include padding; mask if needed)."""
+    return (board << 1) | (board >> 1) | (board << width) | (board >> width)
+
+
+def owner_boards(game_map):
+    """
+    Returns (boards, totals): boards maps owner code -> board of that owner's stacks,
+    totals maps owner code -> total units on the map.
+    """
+    size = game_map.size
+    n_bytes = board_bytes(size)
+    player, ai = bytearray(n_bytes), bytearray(n_bytes)
+    totals = {PLAYER_CODE: 0, AI_CODE: 0}
+    for cell, owner_code, _, count in game_map.iter_codes():
+        bit = cell + cell // size
+        (player if owner_code == PLAYER_CODE else ai)[bit >> 3] |= 1 << (bit & 7)
+        totals[owner_code] += count
+    return {PLAYER_CODE: int.from_bytes(player, 'little'), AI_CODE: int.from_bytes(ai, 'little')}, totals
+
+
+def board_cells(board, size):
+    """Flat cell indexes of the set bits of board, in increasing order."""
+    width = size + 1
+    data = board.to_bytes(board_bytes(size), 'little')
+    flags = data.translate(_NONZERO_TO_ONE)
+    cells = []
+    index = flags.find(1)
+    while index != -1: # find() skips empty stretches at C speed
+        base, byte = index * 8, data[index]
+        index = flags.find(1, index + 1)
+        while byte:
+            low = byte & -byte
+            bit = base + low.bit_length() - 1
+            cells.append(bit - bit // width) # Back from padded board position to flat cell index
+            byte ^= low
+    return cells
@@ -0,0 +1,83 @@
+from array import array
+from collections import namedtuple
+
+# Rock-paper-scissors advantage: each key beats its value.
+BEATS = {'infantry': 'archers', 'archers': 'cavalry', 'cavalry': 'infantry'}
+ADVANTAGE_MODIFIER = 1.25
+
+PLAYER_WINS, DRAW, AI_WINS = 1, 0, -1
+WINNER_NAMES = {PLAYER_WINS: 'Player', DRAW: 'Draw', AI_WINS: 'AI'}
+
+# Columnar batch results; each field is an array with one entry per matchup.
+CombatBatchResult = namedtuple('CombatBatchResult', ['player_strength', 'ai_strength', 'winner', 'bonus_troops'])
+
+
+class CombatEngine:
+    """
+    Resolves army-vs-army combat with the type-advantage rules.
+    - unit_types: List of unit type names; a type's code is its index here.
+    - beats: Dict of attacker type -> type it has the advantage over.
+    - advantage_modifier: Float multiplier applied to the side with the advantage.
+    - modifiers: Optional dict of (attacker type, defender type) -> multiplier, applied on top of
+      beats; this is how unit_registry passes per-pair values from the unit config.
+    Modifiers are precompiled into a flat table indexed by attacker_code * n + defender_code,
+    so one matchup costs two table lookups regardless of how many types exist.
+    max_count is the largest count resolve_batch takes: with the biggest modifier applied, its
+    strength (and so its bonus troops) still fits the int64 bonus_troops column.
+    """
+
+    def __init__(self, unit_types, beats=BEATS, advantage_modifier=ADVANTAGE_MODIFIER, modifiers=None):
+        self.unit_types = list(unit_types)
+        self.type_codes = {unit_type: code for code, unit_type in enumerate(self.unit_types)}
+        n = len(self.unit_types)
+        self._n = n
+        self._modifiers = [1.0] * (n * n)
+        for attacker, defender in beats.items():
+            if attacker in self.type_codes and defender in self.type_codes:
+                self._modifiers[self.type_codes[attacker] * n + self.type_codes[defender]] = advantage_modifier
+        for (attacker, defender), modifier in (modifiers or {}).items():
+            self._modifiers[self.type_codes[attacker] * n + self.type_codes[defender]] = float(modifier)
+        # 2**62 rather than 2**63 leaves room for float rounding in count * modifier
+        self.max_count = int(2 ** 62 / max(self._modifiers + [1.0]))
+
+    def modifier(self, attacker_type, defender_type):
+        return self._modifiers[self.type_codes[attacker_type] * self._n + self.type_codes[defender_type]]
+
+    def modifier_by_code(self, attacker_code, defender_code):
+        return self._modifiers[attacker_code * self._n + defender_code]
+
+    def encode_types(self, unit_types):
+        """Converts type names to codes. Raises KeyError on an unknown type."""
+        type_codes = self.type_codes
+        return array('B', [type_codes[unit_type] for unit_type in unit_types])
+
+    def resolve(self, player_type, player_count, ai_type, ai_count):
+        """
+        Resolves a single matchup.
+        Returns a dict: {'player_strength', 'ai_strength', 'winner' ('Player'/'AI'/'Draw'), 'bonus_troops'}.
+        bonus_troops is the integer strength difference, awarded to the winner (0 on a draw).
+        """
+        player_strength = float(player_count) * self.modifier(player_type, ai_type)
+        ai_strength = float(ai_count) * self.modifier(ai_type, player_type)
+        winner = (player_strength > ai_strength) - (player_strength < ai_strength)
+        return {
+            'player_strength': player_strength,
+            'ai_strength': ai_strength,
+            'winner': WINNER_NAMES[winner],
+            'bonus_troops': int(abs(player_strength - ai_strength))
+        }
+
+    def resolve_batch(self, player_type_codes, player_counts, ai_type_codes, ai_counts):
+        """
+        Resolves many matchups in one call. Inputs are equal-length sequences of type codes
+        (see encode_types) and counts. Returns a CombatBatchResult of arrays; winner holds
+        PLAYER_WINS / DRAW / AI_WINS. Produces the same numbers as resolve().
+        """
+        n, modifiers = self._n, self._modifiers
+        player_strength = array('d', [float(count) * modifiers[p * n + a]
+                                      for p, count, a in zip(player_type_codes, player_counts, ai_type_codes)])
+        ai_strength = array('d', [float(count) * modifiers[a * n + p]
+                                  for a, count, p in zip(ai_type_codes, ai_counts, player_type_codes)])
+        winner = array('b', [(p > a) - (p < a) for p, a in zip(player_strength, ai_strength)])
+        bonus_troops = array('q', [int(abs(p - a)) for p, a in zip(player_strength, ai_strength)])
+        return CombatBatchResult(player_strength, ai_strength, winner, bonus_troops)
@@ -0,0 +1,117 @@
+"""
+Compact deployment records.
+
+A round's deployments are held as a DeploymentBatch: parallel arrays of codes (flat cell
+index, owner code, unit type code, count), the same layout GameMap uses, so validation, AI
+deployment, map population, fog and combat pass a handful of arrays around instead of one
+dict per stack. Deployment is a __slots__ record for looking at a single stack.
+Dicts ('owner', 'unit_type', 'count', 'x', 'y') are only built by to_dicts() at the JSON
+boundary, and from_dicts() accepts them from callers that still build lists by hand.
+"""
+from array import array
+
+from game_map import OWNERS, OWNER_CODES
+
+MAX_COUNT = 2 ** 63 - 1 # Largest count the int64 counts column holds
+
+
+class Deployment:
+    """One stack: owner ('P1'/'AI'), unit_type name, count and coordinates."""
+
+    __slots__ = ('owner', 'unit_type', 'count', 'x', 'y')
+
+    def __init__(self, owner, unit_type, count, x, y):
+        self.owner = owner
+        self.unit_type = unit_type
+        self.count = count
+        self.x = x
+        self.y = y
+
+    def to_dict(self):
+        return {'owner': self.owner, 'unit_type': self.unit_type, 'count': self.count, 'x': self.x, 'y': self.y}
+
+    def __repr__(self):
+        return f'Deployment({self.owner!r}, {self.unit_type!r}, {self.count}, {self.x}, {self.y})'
+
+
+class DeploymentBatch:
+    """
+    A list of deployments in columns.
+    - size: Integer, side length of the map; a stack at (x, y) has cell x * size + y.
+    - unit_types: List of unit type names; a stack's type code is its index here.
+    """
+
+    __slots__ = ('size', 'unit_types', 'cells', 'owners', 'types', 'counts')
+
+    def __init__(self, size, unit_types):
+        self.size = size
+        self.unit_types = unit_types
+        self.cells = array('q')   # flat cell index per stack
+        self.owners = array('B')  # owner code per stack
+        self.types = array('B')   # unit type code per stack
+        self.counts = array('q')  # unit count per stack
+
+    @classmethod
+    def from_dicts(cls, deployments, size, unit_types):
+        """Batch from deployment dicts ('owner', 'unit_type', 'count', 'x', 'y')."""
+        batch = cls(size, unit_types)
+        type_codes = {unit_type: code for code, unit_type in enumerate(unit_types)}
+        for dep in deployments:
+            batch.append(dep['x'] * size + dep['y'], OWNER_CODES[dep['owner']], type_codes[dep['unit_type']], dep['count'])
+        return batch
+
+    @classmethod
+    def coerce(cls, deployments, size, unit_types):
+        """deployments itself if it is already a batch, else from_dicts()."""
+        if isinstance(deployments, cls):
+            return deployments
+        return cls.from_dicts(deployments, size, unit_types)
+
+    def append(self, cell, owner_code, type_code, count):
+        self.cells.append(cell)
+        self.owners.append(owner_code)
+        self.types.append(type_code)
+        self.counts.append(count)
+
+    def add(self, owner, unit_type, count, x, y):
+        """append() by names and coordinates."""
+        self.append(x * self.size + y, OWNER_CODES[owner], self.unit_types.index(unit_type), count)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, i):
+        x, y = divmod(self.cells[i], self.size)
+        return Deployment(OWNERS[self.owners[i]], self.unit_types[self.types[i]], self.counts[i], x, y)
+
+    def __eq__(self, other):
+        if not isinstance(other, DeploymentBatch):
+            return NotImplemented
+        return (self.size, self.unit_types, self.cells, self.owners, self.types, self.counts) == \
+               (other.size, other.unit_types, other.cells, other.owners, other.types, other.counts)
+
+    def clear(self):
+        for column in (self.cells, self.owners, self.types, self.counts):
+            del column[:]
+
+    def subset(self, positions):
+        """New batch with the stacks at the given positions, in that order."""
+        batch = DeploymentBatch(self.size, self.unit_types)
+        for i in positions:
+            batch.append(self.cells[i], self.owners[i], self.types[i], self.counts[i])
+        return batch
+
+    def iter_codes(self):
+        """Yields (cell_index, owner_code, type_code, count) per stack, like GameMap.iter_codes."""
+        return zip(self.cells, self.owners, self.types, self.counts)
+
+    def total(self):
+        """Units across all stacks."""
+        return sum(self.counts)
+
+    def to_dicts(self):
+        """The deployment dicts clients receive."""
+        size, unit_types = self.size, self.unit_types
+        return [{'owner': OWNERS[owner_code], 'unit_type': unit_types[type_code], 'count': count,
+                 'x': cell // size, 'y': cell % size}
+                for cell, owner_code, type_code, count in self.iter_codes()]
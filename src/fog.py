@@ -0,0 +1,149 @@
+"""
+Fog of war: what one player can see of the map.
+
+Each stack reveals the cells within its unit type's sight range (Manhattan distance, like
+movement). A player's visible cells are one bitboard (see bitboard). New stacks are revealed
+in a batch: their cells go on a board which is dilated one step per sight range, biggest
+ranges first, and OR-ed into the visible board. That is a few whole-grid shifts per step
+however many stacks land, and only the new stacks are processed, so the board is updated in
+place as deployments are applied instead of being recomputed from scratch.
+"""
+import base64
+
+from bitboard import board_bytes, board_cells, neighbours, valid_mask
+from game_map import MapDelta
+
+DEFAULT_SIGHT_RANGE = 2
+
+
+class Visibility:
+    """
+    One player's visible cells.
+    - size: Integer, side length of the map.
+    - sight_ranges: List of sight ranges indexed by unit type code.
+    """
+
+    __slots__ = ('size', 'sight_ranges', 'board', '_bits')
+
+    def __init__(self, size, sight_ranges):
+        self.size = size
+        self.sight_ranges = sight_ranges
+        self.board = 0
+        self._bits = None
+
+    @classmethod
+    def from_map(cls, game_map, owner_code, sight_ranges):
+        """Visibility of every stack owner_code has on game_map."""
+        visibility = cls(game_map.size, sight_ranges)
+        visibility.reveal([(cell, type_code) for cell, stack_owner, type_code, _ in game_map.iter_codes()
+                           if stack_owner == owner_code])
+        return visibility
+
+    def copy(self):
+        clone = Visibility(self.size, self.sight_ranges)
+        clone.board = self.board
+        return clone
+
+    def reveal(self, stacks):
+        """Marks what the given stacks can see. stacks is a list of (flat cell index, type code)."""
+        if not stacks:
+            return
+        size = self.size
+        width = size + 1
+        by_range = {}
+        for cell, type_code in stacks:
+            by_range.setdefault(self.sight_ranges[type_code], []).append(cell + cell // size)
+        ranges = sorted(by_range, reverse=True)
+        valid = valid_mask(size)
+        seen = 0
+        for i, radius in enumerate(ranges):
+            seen |= _cells_board(by_range[radius], size)
+            # Grow everything so far down to the next smaller range; masking each step keeps
+            # the padding column from carrying sight into the next row
+            for _ in range(radius - (ranges[i + 1] if i + 1 < len(ranges) else 0)):
+                seen |= neighbours(seen, width) & valid
+        self.board |= seen
+        self._bits = None
+
+    def reveal_deployments(self, batch):
+        """reveal() for the stacks of a deployments.DeploymentBatch."""
+        self.reveal(list(zip(batch.cells, batch.types)))
+
+    def show(self, cell):
+        """Marks a single flat cell index visible, e.g. a position known from the rules."""
+        self.board |= 1 << (cell + cell // self.size)
+        self._bits = None
+
+    @property
+    def bits(self):
+        """The board as bytes: bit b % 8 of byte b // 8, with b = x * (size + 1) + y."""
+        if self._bits is None:
+            self._bits = self.board.to_bytes(board_bytes(self.size), 'little')
+        return self._bits
+
+    def is_visible(self, x, y):
+        bit = x * (self.size + 1) + y
+        return (self.bits[bit >> 3] >> (bit & 7)) & 1 == 1
+
+    def visible_deployments(self, batch):
+        """The stacks of a deployments.DeploymentBatch that sit on visible cells, as a new batch."""
+        bits, size = self.bits, self.size
+        return batch.subset([i for i, cell in enumerate(batch.cells)
+                             if (bits[(cell + cell // size) >> 3] >> ((cell + cell // size) & 7)) & 1])
+
+    def visible_reports(self, reports, owner, coordinates=(('x', 'y'),)):
+        """
+        The report dicts (each with 'owner' and the coordinate keys in coordinates) that owner may
+        see: all of its own, and another owner's only when every cell the report names is visible.
+        """
+        return [report for report in reports
+                if report['owner'] == owner or all(self.is_visible(report[x], report[y]) for x, y in coordinates)]
+
+    def encode(self):
+        """JSON-able form for clients: size and the bits (see bits) as base64."""
+        return {'size': self.size, 'bits': base64.b64encode(self.bits).decode('ascii')}
+
+    def __getstate__(self):
+        # The cached bytes are derived; keep pickled session state small
+        return (self.size, self.sight_ranges, self.board)
+
+    def __setstate__(self, state):
+        self.size, self.sight_ranges, self.board = state
+        self._bits = None
+
+
+def view_changes(game_map, changes, owner_code, previous, current):
+    """
+    MapDelta of owner_code's view of game_map (its own stacks plus what it can see, see
+    GameMap.masked) between when it was shown with Visibility previous and now, with Visibility
+    current. changes is the map's journal for that span (GameMap.take_changes). Only changed
+    cells and cells whose visibility flipped are looked at, not the whole map.
+    """
+    size = game_map.size
+    before_bits, now_bits = previous.bits, current.bits
+    cells = set(changes)
+    flipped = previous.board ^ current.board
+    if flipped:
+        cells.update(board_cells(flipped, size))
+    delta = MapDelta()
+    for cell in sorted(cells):
+        bit = cell + cell // size
+        now = game_map.codes_at(cell)
+        if now is not None and now[0] != owner_code and not (now_bits[bit >> 3] >> (bit & 7)) & 1:
+            now = None
+        before = changes[cell] if cell in changes else game_map.codes_at(cell)
+        if before is not None and before[0] != owner_code and not (before_bits[bit >> 3] >> (bit & 7)) & 1:
+            before = None
+        if now is None:
+            if before is not None:
+                delta.removed.append(cell)
+        elif now != before:
+            delta.changed.append((cell,) + now)
+    return delta
+
+
+def _cells_board(bits, size):
+    board = bytearray(board_bytes(size))
+    for bit in bits:
+        board[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(board, 'little')
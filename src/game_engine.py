@@ -0,0 +1,605 @@
+import logging
+import random
+import secrets
+
+from combat import CombatEngine
+from deployments import MAX_COUNT, DeploymentBatch
+from fog import DEFAULT_SIGHT_RANGE, Visibility, view_changes
+from game_map import OWNER_CODES, OWNERS, GameMap
+from instrumentation import phase
+from movement import MovementPhase
+from occupancy import OccupancyGrid
+from spatial_combat import SpatialCombat
+
+logger = logging.getLogger(__name__)
+
+VALID_UNIT_TYPES = ['infantry', 'archers', 'cavalry'] # Built-in default; the server loads its set from unit_types.json
+MAP_SIZE = 5 # 5x5 grid
+
+R1_ARMY_SIZE = 10 # Both sides field exactly this many units in R1
+PLAYER_R1_UNIT_TYPE = 'infantry'
+R2_BASE_RECRUITS = 10 # Recruits each side gets before every round after the first
+ROUNDS = 2 # Default game length
+
+COMBAT_MODES = ('army', 'spatial')
+
+
+MAX_REPORTED_ERRORS = 50 # Validation errors listed in one response; the rest are only counted
+
+
+class DeploymentError(ValueError):
+    """
+    A player deployment failed validation. str(error) is the first problem, the message for the client.
+    - errors: List of {'index': position in the submitted list (None if not about one item), 'message': ...},
+      at most MAX_REPORTED_ERRORS of them.
+    - error_count: Integer, all problems found, including unlisted ones.
+    """
+
+    def __init__(self, message, errors=None, error_count=None):
+        super().__init__(message)
+        self.errors = errors if errors is not None else [{'index': None, 'message': message}]
+        self.error_count = error_count if error_count is not None else len(self.errors)
+
+
+class RoundValidator:
+    """
+    Validates the player's deployments for the next round of a game one at a time in a single
+    O(n) pass, so a list can be checked while it is still being parsed. Checks type, bounds, count,
+    duplicate cells, collisions with stacks the player can see and the budget, and collects every
+    problem instead of stopping at the first. With fog, a cell held by a stack the player was not
+    shown passes; play_round drops that deployment without saying why (see there).
+    Call add() or add_many() for the items, then finish().
+    """
+
+    def __init__(self, engine, state):
+        self.map_size = engine.map_size
+        self.unit_types = engine.unit_type_codes
+        self.round_number = state['round'] + 1
+        self.occupancy = state['occupancy'] # Kept in step with the map as each round is played
+        self.shown = state.get('shown_visibility') # With fog, the only occupied cells the player knows of are these
+        self.budget = state['player_pool']
+        self.player_cells = set() # Flat cell indexes, for self-collision within this round; grows with the list, not the map
+        self.validated = DeploymentBatch(self.map_size, engine.unit_types)
+        self.player_code = OWNER_CODES['P1']
+        self.total = 0
+        self.count = 0
+        self.errors = []
+        self.error_count = 0
+
+    def _error(self, index, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'index': index, 'message': message})
+        if self.validated is not None: # The round will be rejected; stop keeping accepted items
+            self.validated.clear()
+            self.validated = None
+
+    def invalid_format(self):
+        self._error(None, f'Invalid player_deployments_r{self.round_number} format.')
+
+    def add(self, dep):
+        self.add_many((dep,))
+
+    def add_many(self, deps):
+        """Validates each item of the iterable deps in turn (works on a streaming iterator)."""
+        map_size, unit_types, occupancy = self.map_size, self.unit_types, self.occupancy
+        player_cells, player_code = self.player_cells, self.player_code
+        label = f'R{self.round_number}'
+        occupied_by = 'an R1' if self.round_number == 2 else 'an'
+        shown = self.shown
+        batch = self.validated if self.validated is not None else DeploymentBatch(map_size, []) # Columns are appended to directly
+        add_cell, add_owner, add_type, add_count = batch.cells.append, batch.owners.append, batch.types.append, batch.counts.append
+        index = self.count - 1
+        for index, dep in enumerate(deps, self.count):
+            if not isinstance(dep, dict):
+                self._error(index, f'Invalid {label} deployment item.')
+                continue
+            unit_type, count_str, x, y = dep.get('unit_type'), dep.get('unit_count'), dep.get('x'), dep.get('y')
+
+            type_code = unit_types.get(unit_type) if isinstance(unit_type, str) else None
+            if type_code is None:
+                self._error(index, f'{label}: Invalid unit_type: {unit_type}.')
+                continue
+            if not isinstance(x, int) or not isinstance(y, int) or \
+               not (0 <= x < map_size and 0 <= y < map_size):
+                self._error(index, f'{label}: Invalid coordinates: ({x},{y}).')
+                continue
+            cell = x * map_size + y
+            if cell in player_cells:
+                self._error(index, f'Player cannot deploy to the same cell ({x},{y}) twice in {label}.')
+                continue
+            if (x,y) in occupancy and (shown is None or shown.is_visible(x, y)):
+                self._error(index, f'Player {label} cannot deploy to {occupied_by} occupied cell ({x},{y}).')
+                continue
+
+            try:
+                unit_count = int(count_str)
+            except (ValueError, TypeError, OverflowError): # OverflowError: Infinity, which JSON parsing lets through
+                self._error(index, f'{label}: Invalid unit_count format.')
+                continue
+            if unit_count < 0: # Can deploy 0
+                self._error(index, f'{label} unit count cannot be negative.')
+                continue
+            if unit_count > self.budget or unit_count > MAX_COUNT: # Checked per item so it fits the batch's int64 column
+                self._error(index, f'{label} unit count ({unit_count}) exceeds budget of {min(self.budget, MAX_COUNT)}.')
+                continue
+
+            player_cells.add(cell)
+            self.total += unit_count
+            if not self.error_count:
+                add_cell(cell); add_owner(player_code); add_type(type_code); add_count(unit_count)
+        self.count = index + 1
+
+    def finish(self):
+        """Returns (validated DeploymentBatch, total_deployed_count). Raises DeploymentError if anything failed."""
+        if self.total > self.budget:
+            self._error(None, f'Player R{self.round_number} deployment ({self.total}) exceeds budget of {self.budget}.')
+        if self.error_count:
+            raise DeploymentError(self.errors[0]['message'], self.errors, self.error_count)
+        return self.validated, self.total
+
+
+# --- Helper Function for AI Deployment ---
+def deploy_ai_units(units_to_deploy_total_count, unit_type, current_occupied_coords, owner_id="AI", rng=random, batch=None):
+    """
+    Deploys a given total count of AI units of a specific type onto random empty cells.
+    - units_to_deploy_total_count: Integer, total number of units of this type to deploy.
+    - unit_type: String, e.g., 'infantry'.
+    - current_occupied_coords: OccupancyGrid (updated in place), or a list of (x, y) tuples
+      already occupied (the list is appended to, as before).
+    - owner_id: String, 'AI' or 'P1'.
+    - rng: random.Random-like source, defaults to the module-level generator.
+    - batch: Optional DeploymentBatch (whose unit_types include unit_type) to append the
+      deployments to; it is then returned instead of a list of dicts.
+    Returns:
+        - list of deployment dicts: [{'unit_type': ..., 'count': ..., 'x': ..., 'y': ..., 'owner': ...}, ...],
+          or batch if one was given
+        - the updated occupied coords (same object that was passed in)
+    """
+    if isinstance(current_occupied_coords, OccupancyGrid):
+        occupancy = current_occupied_coords
+    else:
+        occupancy = OccupancyGrid(MAP_SIZE, current_occupied_coords)
+    ai_deployments = batch if batch is not None else DeploymentBatch(occupancy.size, [unit_type])
+    owner_code, type_code = OWNER_CODES[owner_id], ai_deployments.unit_types.index(unit_type)
+    size = occupancy.size
+
+    # AI tries to spread out: one unit per cell if possible. If it has more units than
+    # available cells, every free cell is used and the counts are distributed evenly,
+    # with the last cell taking whatever remains.
+    # Cells are sampled directly from the grid, so the cost grows with the number of
+    # deployment locations rather than the map area.
+    chosen_cells = occupancy.sample_free_cells(units_to_deploy_total_count, rng)
+    num_deployment_locations = len(chosen_cells)
+
+    # Basic distribution:
+    # if units_to_deploy_total_count = 7, num_deployment_locations = 3
+    # cell1: 3, cell2: 2, cell3: 2
+
+    units_remaining_to_assign = units_to_deploy_total_count
+
+    for i, cell_coord in enumerate(chosen_cells):
+        if units_remaining_to_assign <= 0:
+            break
+
+        # Determine count for this cell
+        count_for_this_cell = 1 # Default to 1
+        if i == num_deployment_locations - 1: # Last cell gets all remaining
+            count_for_this_cell = units_remaining_to_assign
+        else: # Distribute somewhat evenly
+             count_for_this_cell = units_remaining_to_assign // (num_deployment_locations - i)
+
+        count_for_this_cell = max(1, count_for_this_cell) # Ensure at least 1 if assigning
+        count_for_this_cell = min(count_for_this_cell, units_remaining_to_assign) # Don't assign more than available
+
+        ai_deployments.append(cell_coord[0] * size + cell_coord[1], owner_code, type_code, count_for_this_cell)
+        occupancy.occupy(cell_coord[0], cell_coord[1])
+        if occupancy is not current_occupied_coords:
+            current_occupied_coords.append(cell_coord)
+        units_remaining_to_assign -= count_for_this_cell
+
+    # If units still remain (e.g. no cells were available), they are not deployed.
+    # This is a simplification; a real game might handle this differently.
+
+    if batch is None:
+        return ai_deployments.to_dicts(), current_occupied_coords
+    return ai_deployments, current_occupied_coords
+
+
+def new_game_seed():
+    """A fresh seed for one game's random decisions (63 bits, so it fits a signed 64-bit field)."""
+    return secrets.randbits(63)
+
+def round_rng(seed, round_number):
+    """
+    The random.Random for one round of the game with this seed. Each round gets its own
+    generator, so replaying R2 only needs the seed, not R1's generator state; string seeds are
+    hashed the same way on every platform and Python version.
+    """
+    return random.Random(f'{seed}:{round_number}')
+
+
+def initialize_map(map_size=MAP_SIZE, unit_types=VALID_UNIT_TYPES):
+    return GameMap(map_size, unit_types)
+
+def populate_map_from_deployments(deployments_list, game_map=None):
+    """
+    Places deployments on a sparse GameMap.
+    - deployments_list: DeploymentBatch, or list of deployment dicts ('owner', 'unit_type', 'count', 'x', 'y').
+    - game_map: Optional existing GameMap to update in place; a new empty map is used if omitted.
+    Returns the GameMap. Call .to_grid() on it at the JSON boundary.
+    """
+    if game_map is None:
+        game_map = initialize_map()
+    if isinstance(deployments_list, DeploymentBatch):
+        overwritten = [(deployments_list[i].to_dict(), existing) for i, existing in game_map.apply_batch(deployments_list)]
+    else:
+        overwritten = game_map.apply(deployments_list)
+    for dep, existing in overwritten:
+        # Handle error or update logic if cell is already occupied (e.g. merging units)
+        # For now, this implies an error in deployment list generation or validation.
+        # The newer deployment overwrites, assuming validation should prevent this for distinct player deployments
+        logger.warning(f"Cell {dep['x']},{dep['y']} already occupied during map population. New: {dep}, Existing: {existing}")
+
+    return game_map
+
+
+class GameEngine:
+    """
+    The game without any HTTP: the Flask routes and the headless tournament simulator both
+    drive it. play_round_1 opens a game and returns its state; play_round plays each later
+    round on that state in place, until state['round'] reaches state['rounds'].
+    - unit_types: List of unit type names.
+    - map_size: Integer, side length of the square map.
+    - combat_engine: Optional CombatEngine; built from unit_types if omitted.
+    - build_maps: Boolean. The simulator turns this off because combat does not read the map.
+    - ai_planner: Optional planner (see ai_planner.MonteCarloPlanner) that picks the AI's unit
+      type each round. Without one the AI picks at random, which is the cheap mode.
+    - combat_mode: 'army' (default) fights each side's round total as one army. 'spatial' fights
+      stack against adjacent enemy stack on the map (see spatial_combat) and removes the losses
+      from the map, so each round starts from the survivors of the last. Needs build_maps.
+    - move_ranges: Optional dict of unit type -> move range. When given, every round after the
+      first runs a movement phase (see movement) after both sides deploy and before combat.
+      Needs build_maps.
+    - sight_ranges: Optional dict of unit type -> sight range. When given, each round's results
+      carry 'visibility', the fog.Visibility of the player's stacks, so callers can send the
+      player only what it can see. Needs build_maps.
+    - rounds: Integer, rounds per game (at least 2); the last round's winner wins the game.
+    Every random decision goes through the rng argument, so a seeded random.Random
+    replays a game exactly (with a time-budgeted planner, how far the search gets can vary).
+    """
+
+    def __init__(self, unit_types=VALID_UNIT_TYPES, map_size=MAP_SIZE, combat_engine=None, build_maps=True, ai_planner=None,
+                 combat_mode='army', move_ranges=None, sight_ranges=None, rounds=ROUNDS):
+        if combat_mode not in COMBAT_MODES:
+            raise ValueError(f'Unknown combat_mode {combat_mode!r}, expected one of {COMBAT_MODES}.')
+        if combat_mode == 'spatial' and not build_maps:
+            raise ValueError('Spatial combat needs build_maps=True.')
+        if move_ranges is not None and not build_maps:
+            raise ValueError('The movement phase needs build_maps=True.')
+        if sight_ranges is not None and not build_maps:
+            raise ValueError('Fog of war needs build_maps=True.')
+        if rounds < 2:
+            raise ValueError(f'A game needs at least 2 rounds, not {rounds}.')
+        self.unit_types = list(unit_types)
+        self.unit_type_codes = {unit_type: code for code, unit_type in enumerate(self.unit_types)} # O(1) validation
+        self.map_size = map_size
+        self.combat_engine = combat_engine or CombatEngine(self.unit_types)
+        self.build_maps = build_maps
+        self.ai_planner = ai_planner
+        self.combat_mode = combat_mode
+        self.spatial_combat = SpatialCombat(self.combat_engine) if combat_mode == 'spatial' else None
+        self.movement = MovementPhase(move_ranges) if move_ranges is not None else None
+        self.sight_ranges = None
+        if sight_ranges is not None:
+            self.sight_ranges = [sight_ranges.get(unit_type, DEFAULT_SIGHT_RANGE) for unit_type in self.unit_types]
+        self.rounds = rounds
+
+    def resolve_spatial(self, game_map):
+        """
+        Spatial combat on game_map, applying the losses to it in place.
+        Returns the SpatialCombat result with 'cell_losses' as JSON-able dicts (x, y, owner, lost).
+        """
+        combat = self.spatial_combat.resolve(game_map)
+        game_map.apply_losses((cell, lost) for cell, _, lost in combat['cell_losses'])
+        size = self.map_size
+        combat['cell_losses'] = [{'x': cell // size, 'y': cell % size, 'owner': OWNERS[owner_code], 'lost': lost}
+                                 for cell, owner_code, lost in combat['cell_losses']]
+        return combat
+
+    def choose_ai_unit_type(self, context, rng=random):
+        """
+        The AI's unit type for a round. context is what the AI may know when it commits
+        (see ai_planner.PlayerResponseModel); it must not include the player's pending deployment.
+        """
+        if self.ai_planner is None:
+            return rng.choice(self.unit_types)
+        with phase('plan_ai'):
+            return self.ai_planner.choose_unit_type(context, rng)
+
+    def _next_pools(self, combat, next_round, player_unspent, ai_unspent):
+        """
+        What each side may deploy in next_round: the base recruits, units it did not deploy,
+        replacements for units lost in combat, and for the winner a bonus of the strength difference.
+        Returns (player_data, ai_data) dicts: base_recruits, bonus, total_r<next_round>_pool.
+        """
+        player_base = R2_BASE_RECRUITS + player_unspent + combat.get('player_losses', 0)
+        ai_base = R2_BASE_RECRUITS + ai_unspent + combat.get('ai_losses', 0)
+        bonus_troops = combat['bonus_troops'] # Bonus is based on effective strength difference
+        winner = combat['winner']
+        player_bonus, ai_bonus = (bonus_troops, 0) if winner == "Player" else (0, bonus_troops) if winner == "AI" else (0,0)
+        pool_key = f'total_r{next_round}_pool'
+        return ({'base_recruits': player_base, 'bonus': player_bonus, pool_key: max(0, player_base + player_bonus)},
+                {'base_recruits': ai_base, 'bonus': ai_bonus, pool_key: max(0, ai_base + ai_bonus)})
+
+    def play_round_1(self, rng=random):
+        """
+        Opens a game: resolves R1 with the fixed opening deployments.
+        Returns (results, state): results holds everything the R1 response reports, state is
+        the game as play_round carries it from round to round:
+        - rounds, round: Game length and the last round played.
+        - map: GameMap (None without build_maps), updated in place every round.
+        - occupancy: OccupancyGrid of the cells stacks stand on, kept in step with the map.
+        - player_pool, ai_pool: What each side may deploy next round.
+        - r1, last_round: (player_type, ai_type, winner, player_strength, ai_strength) of R1 and
+          of the last round played. Rounds in between are not kept, so the state stays the same
+          size however long the game runs; play_round hands each round's to the caller instead.
+        - With fog: player_visibility (what the player's stacks see now), shown_visibility
+          (what the last response showed) and public_cells (positions the rules reveal).
+        """
+        # --- Fixed Player 1 R1 Deployment ---
+        player_r1_combat_unit_type = PLAYER_R1_UNIT_TYPE
+        player_r1_combat_total_count = R1_ARMY_SIZE
+        validated_player_r1_deployments = DeploymentBatch(self.map_size, self.unit_types)
+        validated_player_r1_deployments.add('P1', player_r1_combat_unit_type, player_r1_combat_total_count, 0, 0)
+
+        # --- Fixed AI R1 Deployment ---
+        # Opposite corner from the player
+        ai_r1_combat_total_count = R1_ARMY_SIZE
+        ai_r1_combat_unit_type = self.choose_ai_unit_type({
+            'round': 1, 'ai_count': ai_r1_combat_total_count,
+            'player_type': player_r1_combat_unit_type, 'player_count': player_r1_combat_total_count # The opening is fixed and known
+        }, rng)
+        corner = self.map_size - 1
+        ai_r1_deployments = DeploymentBatch(self.map_size, self.unit_types)
+        ai_r1_deployments.add('AI', ai_r1_combat_unit_type, ai_r1_combat_total_count, corner, corner)
+
+        # --- Map State: both sides' batches applied in turn ---
+        current_map_state = None
+        if self.build_maps:
+            with phase('map'):
+                current_map_state = GameMap(self.map_size, self.unit_types)
+                for batch in (validated_player_r1_deployments, ai_r1_deployments):
+                    populate_map_from_deployments(batch, current_map_state)
+
+        # --- Combat Logic ---
+        with phase('combat'):
+            if self.spatial_combat is not None:
+                r1_combat = self.resolve_spatial(current_map_state)
+            else:
+                r1_combat = self.combat_engine.resolve(player_r1_combat_unit_type, player_r1_combat_total_count,
+                                                       ai_r1_combat_unit_type, ai_r1_combat_total_count)
+        r1_winner = r1_combat['winner']
+
+        # Units lost in R1 are replaced on top of the base recruits (army combat has no losses, so base is 10)
+        player_r2_data, ai_r2_data = self._next_pools(r1_combat, 2, R1_ARMY_SIZE - player_r1_combat_total_count,
+                                                      R1_ARMY_SIZE - ai_r1_combat_total_count)
+
+        results = {
+            'player_army': {'type': player_r1_combat_unit_type, 'count': player_r1_combat_total_count, 'strength': r1_combat['player_strength']},
+            'ai_army': {'type': ai_r1_combat_unit_type, 'count': ai_r1_combat_total_count, 'strength': r1_combat['ai_strength']},
+            'round_winner': r1_winner,
+            'bonus_troops': r1_combat['bonus_troops'],
+            'player_r1_deployments': validated_player_r1_deployments,
+            'ai_r1_deployments': ai_r1_deployments,
+            'map': current_map_state,
+            'player_r2_data': player_r2_data,
+            'ai_r2_data': ai_r2_data
+        }
+        if self.spatial_combat is not None:
+            results['spatial_combat'] = _spatial_summary(r1_combat)
+        state = {
+            'rounds': self.rounds,
+            'round': 1,
+            'map': current_map_state,
+            'occupancy': OccupancyGrid(self.map_size, [divmod(cell, self.map_size) for cell, _, _, _ in current_map_state.iter_codes()]
+                                       if self.build_maps else [divmod(cell, self.map_size) for batch in
+                                       (validated_player_r1_deployments, ai_r1_deployments) for cell in batch.cells]),
+            'player_pool': player_r2_data['total_r2_pool'],
+            'ai_pool': ai_r2_data['total_r2_pool'],
+            'r1': (player_r1_combat_unit_type, ai_r1_combat_unit_type, r1_winner,
+                   r1_combat['player_strength'], r1_combat['ai_strength'])
+        }
+        state['last_round'] = state['r1']
+        if self.sight_ranges is not None:
+            with phase('fog'):
+                # The opening is fixed by the rules, so where the AI's R1 army stands is public
+                public_cells = list(ai_r1_deployments.cells)
+                visibility = Visibility(self.map_size, self.sight_ranges)
+                visibility.reveal_deployments(validated_player_r1_deployments)
+                for cell in public_cells: visibility.show(cell)
+                results['visibility'] = visibility
+                state['shown_visibility'] = visibility.copy() # What the player was shown after R1
+                state['public_cells'] = public_cells
+                state['player_visibility'] = self._surviving_visibility(state, r1_combat) or visibility
+        return results, state
+
+    def _surviving_visibility(self, state, combat):
+        # Stacks may have died in combat; the next round starts from what the survivors see.
+        # None when nobody on the player's side was lost and the current visibility still holds.
+        if not combat.get('player_losses'):
+            return None
+        visibility = Visibility.from_map(state['map'], OWNER_CODES['P1'], self.sight_ranges)
+        for cell in state['public_cells']: visibility.show(cell)
+        return visibility
+
+    def round_validator(self, state):
+        """A RoundValidator for the next round of this game, to feed deployments one at a time."""
+        return RoundValidator(self, state)
+
+    def validate_round_deployments(self, state, player_deployments_input):
+        """
+        Checks the player's deployment list for the next round against the game state.
+        Returns (validated_deployments, total_deployed_count). Raises DeploymentError listing every problem.
+        """
+        validator = self.round_validator(state)
+        if not isinstance(player_deployments_input, list):
+            validator.invalid_format()
+        else:
+            validator.add_many(player_deployments_input)
+        return validator.finish()
+
+    validate_round_2_deployments = validate_round_deployments # Round 2 is just the first round after the opening
+
+    def play_round(self, state, validated_player_deployments, player_total_deployed_count, rng=random):
+        """
+        Plays the next round of a game opened by play_round_1, for already-validated player
+        deployments (a DeploymentBatch from validate_round_deployments, or deployment dicts):
+        deploys the AI, updates the map, moves, fights, and works out the next round's pools.
+        state is advanced in place. The map, occupancy, fog and pools only take this round's
+        changes, so a round costs the same however long the game has run (spatial combat and
+        movement still look at every stack on the map, as their rules do).
+        A player stack sent onto a cell another stack holds (under fog the validator lets through
+        cells the player cannot see) is left out, and its units stay in the player's pool;
+        'player_deployments' lists the stacks that were placed.
+        Returns a results dict: 'round', the armies, 'round_winner', 'summary' (the round's
+        state['last_round'] tuple), 'player_deployments' and 'ai_deployments' (DeploymentBatch
+        objects), 'map', and 'map_changes', the MapDelta of what the player sees against what
+        the last response showed. The last round adds
+        'game_winner'; earlier ones add 'player_next_data' and 'ai_next_data' (see _next_pools).
+        """
+        round_number = state['round'] + 1
+        if round_number > state['rounds']:
+            raise ValueError(f'The game is over; it had {state["rounds"]} rounds.')
+        size = self.map_size
+        validated_player_deployments = DeploymentBatch.coerce(validated_player_deployments, size, self.unit_types)
+        # --- AI Deployment ---
+        # Chosen from what both sides saw after the last round, not from the player's submission
+        previous = state['last_round']
+        ai_chosen_unit_type = self.choose_ai_unit_type({
+            'round': round_number, 'ai_count': state['ai_pool'], 'player_pool': state['player_pool'],
+            'player_last_type': previous[0], 'ai_last_type': previous[1]
+        }, rng)
+        # Player stacks sent onto cells held by stacks it could not see are dropped; saying why
+        # would tell the player where the hidden stacks are
+        occupancy = state['occupancy']
+        cells = validated_player_deployments.cells
+        placed = [i for i in range(len(cells)) if divmod(cells[i], size) not in occupancy]
+        if len(placed) < len(cells):
+            unplaced = validated_player_deployments.total()
+            validated_player_deployments = validated_player_deployments.subset(placed)
+            player_total_deployed_count -= unplaced - validated_player_deployments.total()
+        # AI deploys on cells that are free after the player's choices this round
+        for cell in validated_player_deployments.cells: occupancy.occupy(*divmod(cell, size))
+
+        with phase('deploy_ai'):
+            ai_deployments, _ = deploy_ai_units(
+                state['ai_pool'],
+                ai_chosen_unit_type,
+                occupancy,
+                "AI",
+                rng,
+                DeploymentBatch(size, self.unit_types)
+            )
+        ai_actual_deployed_count = ai_deployments.total()
+
+        # --- Map Update: only this round's deployments, applied in place and journaled ---
+        game_map = state['map']
+        if self.build_maps:
+            with phase('map'):
+                game_map.track_changes()
+                for batch in (validated_player_deployments, ai_deployments):
+                    populate_map_from_deployments(batch, game_map)
+
+        # --- Fog: the player's view grows with every stack it places ---
+        visibility = None
+        if self.sight_ranges is not None:
+            with phase('fog'):
+                visibility = state['player_visibility']
+                visibility.reveal_deployments(validated_player_deployments)
+
+        # --- Movement: every stack closes in on the enemy before combat ---
+        moves = None
+        if self.movement is not None:
+            with phase('move'):
+                cell_moves = self.movement.move(game_map)
+                moved = [(cell, to_cell, game_map.codes_at(to_cell)) for cell, to_cell in cell_moves]
+                moves = [{'owner': OWNERS[codes[0]], 'x': cell // size, 'y': cell % size, 'to_x': to_cell // size, 'to_y': to_cell % size}
+                         for cell, to_cell, codes in moved]
+            if visibility is not None:
+                with phase('fog'):
+                    player_code = OWNER_CODES['P1']
+                    visibility.reveal([(to_cell, codes[1]) for _, to_cell, codes in moved if codes[0] == player_code])
+
+        # --- Combat Logic (Simplified - based on the round's total counts) ---
+        # Use total deployed counts and a "main" type for combat modifiers.
+        player_combat_unit_type = self.unit_types[validated_player_deployments.types[0]] if validated_player_deployments and player_total_deployed_count > 0 else self.unit_types[0]
+        player_combat_total_count = player_total_deployed_count
+
+        ai_combat_unit_type = ai_chosen_unit_type
+        ai_combat_total_count = ai_actual_deployed_count
+
+        with phase('combat'):
+            if self.spatial_combat is not None:
+                combat = self.resolve_spatial(game_map) # Survivors of earlier rounds fight too
+            else:
+                combat = self.combat_engine.resolve(player_combat_unit_type, player_combat_total_count,
+                                                    ai_combat_unit_type, ai_combat_total_count)
+        winner = combat['winner']
+
+        results = {
+            'round': round_number,
+            'player_army': {'type': player_combat_unit_type, 'count': player_combat_total_count, 'strength': combat['player_strength']},
+            'ai_army': {'type': ai_combat_unit_type, 'count': ai_combat_total_count, 'strength': combat['ai_strength']},
+            'round_winner': winner,
+            'player_deployments': validated_player_deployments,
+            'ai_deployments': ai_deployments,
+            'map': game_map
+        }
+        if self.build_maps:
+            changes = game_map.take_changes()
+            for cell in changes: # Moves and losses free cells and fill others; only changed cells can differ
+                if game_map.codes_at(cell) is None: occupancy.vacate(*divmod(cell, size))
+                else: occupancy.occupy(*divmod(cell, size))
+            if visibility is not None:
+                with phase('fog'):
+                    results['map_changes'] = view_changes(game_map, changes, OWNER_CODES['P1'], state['shown_visibility'], visibility)
+                    state['shown_visibility'] = visibility.copy()
+                    state['player_visibility'] = self._surviving_visibility(state, combat) or visibility
+            else:
+                results['map_changes'] = game_map.diff_changes(changes)
+        if self.spatial_combat is not None:
+            results['spatial_combat'] = _spatial_summary(combat)
+        if moves is not None:
+            results['moves'] = moves
+        if visibility is not None:
+            results['visibility'] = visibility
+
+        # --- Carry the game forward ---
+        state['round'] = round_number
+        state['last_round'] = results['summary'] = (player_combat_unit_type, ai_combat_unit_type, winner,
+                                                    combat['player_strength'], combat['ai_strength'])
+        if round_number == state['rounds']:
+            results['game_winner'] = winner # The last round decides the game
+        else:
+            results['player_next_data'], results['ai_next_data'] = self._next_pools(
+                combat, round_number + 1, state['player_pool'] - player_total_deployed_count,
+                state['ai_pool'] - ai_actual_deployed_count)
+            state['player_pool'] = results['player_next_data'][f'total_r{round_number + 1}_pool']
+            state['ai_pool'] = results['ai_next_data'][f'total_r{round_number + 1}_pool']
+        return results
+
+    def play_round_2(self, state, validated_player_r2_deployments, player_r2_total_deployed_count, rng=random):
+        """
+        play_round() for the round after the opening, with its deployment lists also under
+        the R2 names 'player_r2_deployments' and 'ai_r2_deployments'.
+        """
+        results = self.play_round(state, validated_player_r2_deployments, player_r2_total_deployed_count, rng)
+        results['player_r2_deployments'] = results['player_deployments']
+        results['ai_r2_deployments'] = results['ai_deployments']
+        return results
+
+
+def _spatial_summary(combat):
+    # The per-engagement part of a spatial combat result, as reported to clients
+    return {key: combat[key] for key in ('player_losses', 'ai_losses', 'engagements', 'cell_losses')}
@@ -0,0 +1,437 @@
+"""
+Append-only binary log of finished games.
+Summarize or verify a log from src/:  python game_log.py games.log [--replay]
+
+Every record is length-prefixed, so a reader can skip what it does not need:
+    <uint32 body length> <uint8 kind> body
+- UNIT_TABLE: <uint32 table id>, then the unit type names, NUL-separated UTF-8. Game records
+  store unit type codes; a writer puts the table they index into in the log before its
+  first game that uses it.
+- GAME: the GAME_FIXED struct, the game id (UTF-8), then the player's and the AI's
+  deployments in the last round as columns: cells (uint32), type codes (uint8), counts (uint32).
+  "R2" in the fields below is the last round, which is R2 in the default two-round game.
+- ROUND: one round between R1 and the last, written when it is played, so only games longer
+  than two rounds have them. The ROUND_FIXED struct, the game id, then the player's deployments
+  as columns. Games run concurrently, so a game's ROUND records are interleaved with other
+  games' records, but always come before its GAME record.
+All numbers are little-endian. A record cut short at the end of the file (the server died
+mid-write) is ignored.
+
+Each game plays from its own seed (see game_engine.round_rng), so the seed plus the player's
+deployments in every round after R1 are enough to replay it; the rest of the record is there
+to check a replay against and for analytics without replaying.
+
+GameLogWriter keeps logging off the request path: a request only puts the finished round or
+game on a queue, and a background thread encodes whatever has queued up and appends it with a
+single write(). The file is opened with O_APPEND, so the pre-forked workers of serve.py can
+share one log. GameLogReader memory-maps the file and decodes records on demand.
+"""
+import argparse
+import atexit
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from combat import WINNER_NAMES
+from deployments import DeploymentBatch
+from game_engine import round_rng
+from game_map import OWNER_CODES
+
+logger = logging.getLogger(__name__)
+
+UNIT_TABLE, GAME, ROUND = 1, 2, 4 # 3 was a per-game block of middle rounds, no longer written
+RECORD_HEADER = struct.Struct('<IB')
+TABLE_ID = struct.Struct('<I')
+# seed, unit table id, map size, flags, R1 player type / AI type / winner, R2 player type /
+# AI type / winner, R1 player / AI strength, R2 player / AI strength, player / AI R2 stacks,
+# game id length
+GAME_FIXED = struct.Struct('<qIIBBBbBBbddddIIB')
+# unit table id, map size, round number, player type / AI type / winner, player / AI strength,
+# player stacks, game id length
+ROUND_FIXED = struct.Struct('<IIIBBbddIB')
+FLAG_SPATIAL, FLAG_MOVEMENT, FLAG_FOG = 1, 2, 4
+UNKNOWN_TYPE = 255 # Stored for a type name missing from the table (a config reload mid-game)
+WINNER_CODES = {name: code for code, name in WINNER_NAMES.items()}
+DEFAULT_QUEUE_SIZE = 100000
+MAX_WRITE_BATCH = 4096 # Records per write()
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+class GameRecord:
+    """
+    One finished game.
+    - game_id, seed: What the game was handed out as and played from.
+    - unit_types: List of unit type names the deployments' type codes index into.
+    - map_size, flags: The engine setup; flags are FLAG_* bits.
+    - r1, r2: Tuples (player_type, ai_type, winner, player_strength, ai_strength), types by name.
+      r2 is the last round, whose winner wins the game.
+    - player_r2, ai_r2: DeploymentBatch of each side's last-round deployments (None if not decoded).
+    - middle_rounds: List of (summary tuple like r1, player DeploymentBatch or None) for the
+      rounds between R1 and the last; empty for a two-round game. The server logs these as
+      RoundRecords while the game runs, and GameLogReader puts them back together.
+    """
+
+    __slots__ = ('game_id', 'seed', 'unit_types', 'map_size', 'flags', 'r1', 'r2', 'player_r2', 'ai_r2', 'middle_rounds')
+
+    def __init__(self, game_id, seed, unit_types, map_size, flags, r1, r2, player_r2, ai_r2, middle_rounds=()):
+        self.game_id = game_id
+        self.seed = seed
+        self.unit_types = unit_types
+        self.map_size = map_size
+        self.flags = flags
+        self.r1 = r1
+        self.r2 = r2
+        self.player_r2 = player_r2
+        self.ai_r2 = ai_r2
+        self.middle_rounds = list(middle_rounds)
+
+    @classmethod
+    def from_game(cls, game_id, state, results, engine, middle_rounds=()):
+        """
+        Record of a finished game from its state, the last round's play_round results and the
+        engine that played it. The state does not keep the middle rounds; pass them to have them
+        in the record.
+        """
+        flags = (FLAG_SPATIAL if engine.spatial_combat is not None else 0) | \
+                (FLAG_MOVEMENT if engine.movement is not None else 0) | \
+                (FLAG_FOG if engine.sight_ranges is not None else 0)
+        return cls(game_id, state['seed'], engine.unit_types, engine.map_size, flags,
+                   state['r1'], results['summary'], results['player_deployments'], results['ai_deployments'], middle_rounds)
+
+
+class RoundRecord:
+    """
+    One round between R1 and the last of a game still being played.
+    - game_id, round_number: The game and which round this was.
+    - unit_types, map_size: As in GameRecord.
+    - summary: (player_type, ai_type, winner, player_strength, ai_strength), types by name.
+    - player_deployments: The player's DeploymentBatch.
+    """
+
+    __slots__ = ('game_id', 'round_number', 'unit_types', 'map_size', 'summary', 'player_deployments')
+
+    def __init__(self, game_id, round_number, unit_types, map_size, summary, player_deployments):
+        self.game_id = game_id
+        self.round_number = round_number
+        self.unit_types = unit_types
+        self.map_size = map_size
+        self.summary = summary
+        self.player_deployments = player_deployments
+
+    @classmethod
+    def from_round(cls, game_id, results, engine):
+        """Record of a round from its play_round results and the engine that played it."""
+        return cls(game_id, results['round'], engine.unit_types, engine.map_size, results['summary'], results['player_deployments'])
+
+
+def table_id(unit_types):
+    return zlib.crc32('\0'.join(unit_types).encode('utf-8'))
+
+def encode_table(unit_types):
+    body = TABLE_ID.pack(table_id(unit_types)) + '\0'.join(unit_types).encode('utf-8')
+    return RECORD_HEADER.pack(len(body), UNIT_TABLE) + body
+
+def _type_code(unit_types):
+    type_codes = {unit_type: code for code, unit_type in enumerate(unit_types)}
+    return lambda unit_type: type_codes.get(unit_type, UNKNOWN_TYPE)
+
+def encode_round(record, record_table_id):
+    """The ROUND record (header included) for a RoundRecord whose unit table has id record_table_id."""
+    code = _type_code(record.unit_types)
+    game_id, summary, batch = record.game_id.encode('utf-8'), record.summary, record.player_deployments
+    body = b''.join([ROUND_FIXED.pack(record_table_id, record.map_size, record.round_number,
+                                      code(summary[0]), code(summary[1]), WINNER_CODES[summary[2]], summary[3], summary[4],
+                                      len(batch), len(game_id)),
+                     game_id, _column_bytes('I', batch.cells), batch.types.tobytes(), _column_bytes('I', batch.counts)])
+    return RECORD_HEADER.pack(len(body), ROUND) + body
+
+def encode_game(record, record_table_id):
+    """
+    The GAME record (header included) for a GameRecord whose unit table has id record_table_id.
+    Its middle rounds are not included; they are written as ROUND records while the game runs.
+    """
+    code = _type_code(record.unit_types)
+    game_id = record.game_id.encode('utf-8')
+    r1, r2 = record.r1, record.r2
+    parts = [GAME_FIXED.pack(record.seed, record_table_id, record.map_size, record.flags,
+                             code(r1[0]), code(r1[1]), WINNER_CODES[r1[2]], code(r2[0]), code(r2[1]), WINNER_CODES[r2[2]],
+                             r1[3], r1[4], r2[3], r2[4], len(record.player_r2), len(record.ai_r2), len(game_id)),
+             game_id]
+    for batch in (record.player_r2, record.ai_r2):
+        parts += [_column_bytes('I', batch.cells), batch.types.tobytes(), _column_bytes('I', batch.counts)]
+    body = b''.join(parts)
+    return RECORD_HEADER.pack(len(body), GAME) + body
+
+def _column_bytes(typecode, values):
+    column = array(typecode, values)
+    if _BIG_ENDIAN:
+        column.byteswap()
+    return column.tobytes()
+
+def _column(typecode, data, offset, n):
+    # (array, end offset) of n little-endian items read from data at offset
+    column = array(typecode)
+    end = offset + n * column.itemsize
+    column.frombytes(data[offset:end])
+    if _BIG_ENDIAN:
+        column.byteswap()
+    return column, end
+
+
+class GameLogWriter:
+    """
+    Appends GameRecords and RoundRecords to a log file from a background thread.
+    - path: File to append to; created if missing.
+    - max_queue: Records waiting to be written. When the queue is full (the disk cannot keep
+      up), new records are dropped and counted in .dropped instead of blocking requests.
+    The thread and file descriptor are per process and started on first use, so a writer
+    made before serve.py forks works in every worker.
+    """
+
+    def __init__(self, path, max_queue=DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.max_queue = max_queue
+        self.written = self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._queue = queue.Queue(self.max_queue)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._table_ids = {} # Tables already written by this process, by tuple of names
+        self._thread = threading.Thread(target=self._run, name='game-log', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def append(self, record):
+        """Queues a GameRecord or RoundRecord to be written. Never blocks."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout=None):
+        """Blocks until everything appended so far is written."""
+        if self._pid == os.getpid():
+            written = threading.Event()
+            self._queue.put(written)
+            written.wait(timeout)
+
+    def close(self):
+        """Writes what is queued and stops the thread."""
+        if self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+            os.close(self._fd)
+            self._pid = None
+
+    def _run(self):
+        records = self._queue
+        while True:
+            # Take whatever has queued up (at least one item) and write it in one go
+            items = [records.get()]
+            while len(items) < MAX_WRITE_BATCH:
+                try:
+                    items.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            chunks = []
+            for item in items:
+                if isinstance(item, (GameRecord, RoundRecord)):
+                    try:
+                        chunks.append(self._encode(item))
+                    except Exception:
+                        logger.exception(f'Could not encode game {item.game_id} for the game log')
+            if chunks:
+                try:
+                    data = b''.join(chunks)
+                    while data:
+                        data = data[os.write(self._fd, data):]
+                    self.written += len(chunks)
+                except OSError:
+                    logger.exception(f'Could not write to the game log {self.path}')
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in items:
+                return
+
+    def _encode(self, record):
+        encode = encode_game if isinstance(record, GameRecord) else encode_round
+        names = tuple(record.unit_types)
+        record_table_id = self._table_ids.get(names)
+        if record_table_id is None:
+            record_table_id = self._table_ids[names] = table_id(names)
+            return encode_table(names) + encode(record, record_table_id)
+        return encode(record, record_table_id)
+
+
+class GameLogReader:
+    """
+    Reads a game log through a read-only memory map. Use as a context manager, or call close().
+    Unit tables are picked up as they are passed, so read records in file order.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.tables = {} # Unit table id -> list of names
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def records(self):
+        """Yields (kind, body offset, body length) for every complete record."""
+        data, header = self._data, RECORD_HEADER
+        end, pos = len(data), 0
+        while pos + header.size <= end:
+            length, kind = header.unpack_from(data, pos)
+            start = pos + header.size
+            if start + length > end:
+                break # Cut short mid-write
+            if kind == UNIT_TABLE:
+                names = data[start + TABLE_ID.size:start + length].decode('utf-8')
+                self.tables[TABLE_ID.unpack_from(data, start)[0]] = names.split('\0') if names else []
+            yield kind, start, length
+            pos = start + length
+
+    def games(self, deployments=True):
+        """
+        Yields a GameRecord per finished game, with its ROUND records as middle_rounds. With
+        deployments=False the deployment columns are skipped (player_r2, ai_r2 and the middle
+        rounds' batches are None), which is much faster for scans over the outcomes.
+        """
+        data, fixed = self._data, GAME_FIXED
+        # Game id -> {round number: ROUND record offset} until the game's GAME record; games that
+        # never finished (expired) stay here, but only as offsets
+        round_offsets = {}
+        for kind, start, _ in self.records():
+            if kind == ROUND:
+                fields = ROUND_FIXED.unpack_from(data, start)
+                round_number, id_length = fields[2], fields[-1]
+                offset = start + ROUND_FIXED.size
+                round_offsets.setdefault(data[offset:offset + id_length].decode('utf-8'), {})[round_number] = start
+                continue
+            if kind != GAME:
+                continue
+            (seed, record_table_id, map_size, flags, r1_player, r1_ai, r1_winner, r2_player, r2_ai, r2_winner,
+             r1_player_strength, r1_ai_strength, r2_player_strength, r2_ai_strength,
+             n_player, n_ai, id_length) = fixed.unpack_from(data, start)
+            unit_types = self.tables[record_table_id]
+            name = lambda code: unit_types[code] if code < len(unit_types) else None
+            offset = start + fixed.size
+            game_id = data[offset:offset + id_length].decode('utf-8')
+            rounds = round_offsets.pop(game_id, {})
+            middle_rounds = [self._round(rounds[round_number], deployments) for round_number in sorted(rounds)]
+            player_r2 = ai_r2 = None
+            if deployments:
+                offset += id_length
+                player_r2, offset = self._batch(offset, n_player, OWNER_CODES['P1'], map_size, unit_types)
+                ai_r2, offset = self._batch(offset, n_ai, OWNER_CODES['AI'], map_size, unit_types)
+            yield GameRecord(game_id, seed, unit_types, map_size, flags,
+                             (name(r1_player), name(r1_ai), WINNER_NAMES[r1_winner], r1_player_strength, r1_ai_strength),
+                             (name(r2_player), name(r2_ai), WINNER_NAMES[r2_winner], r2_player_strength, r2_ai_strength),
+                             player_r2, ai_r2, middle_rounds)
+
+    def _round(self, start, deployments):
+        # (summary, player DeploymentBatch or None) of the ROUND record at start
+        (record_table_id, map_size, _, player, ai, winner, player_strength, ai_strength,
+         n_player, id_length) = ROUND_FIXED.unpack_from(self._data, start)
+        unit_types = self.tables[record_table_id]
+        name = lambda code: unit_types[code] if code < len(unit_types) else None
+        batch = None
+        if deployments:
+            batch, _ = self._batch(start + ROUND_FIXED.size + id_length, n_player, OWNER_CODES['P1'], map_size, unit_types)
+        return (name(player), name(ai), WINNER_NAMES[winner], player_strength, ai_strength), batch
+
+    def _batch(self, offset, n, owner_code, map_size, unit_types):
+        batch = DeploymentBatch(map_size, unit_types)
+        cells, offset = _column('I', self._data, offset, n)
+        types, offset = _column('B', self._data, offset, n)
+        counts, offset = _column('I', self._data, offset, n)
+        batch.cells, batch.types, batch.counts = array('q', cells), types, array('q', counts)
+        batch.owners = array('B', [owner_code]) * n
+        return batch, offset
+
+
+def replay(record, engine):
+    """
+    Plays a logged game again on engine, from its seed and the player's logged deployments.
+    Returns the names of the fields that came out differently; empty means it reproduced.
+    engine must be set up like the server that played the game (unit types, map size, modes);
+    the game is played for as many rounds as the record has, whatever engine.rounds is.
+    """
+    if engine.unit_types != record.unit_types:
+        raise ValueError(f'Game {record.game_id} used unit types {record.unit_types}, the engine has {engine.unit_types}.')
+    _, state = engine.play_round_1(round_rng(record.seed, 1))
+    state['seed'] = record.seed
+    player_deployments = [batch for _, batch in record.middle_rounds] + [record.player_r2]
+    state['rounds'] = len(player_deployments) + 1
+    middle_rounds = []
+    for round_number, batch in enumerate(player_deployments, 2):
+        results = engine.play_round(state, batch, batch.total(), round_rng(record.seed, round_number))
+        if round_number < state['rounds']:
+            middle_rounds.append((results['summary'], results['player_deployments']))
+    replayed = GameRecord.from_game(record.game_id, state, results, engine, middle_rounds)
+    return [field for field in ('map_size', 'flags', 'r1', 'middle_rounds', 'r2', 'ai_r2') if getattr(replayed, field) != getattr(record, field)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize a game log, and optionally check that every game replays.')
+    parser.add_argument('path')
+    parser.add_argument('--replay', action='store_true',
+                        help='Re-play every game with the engine the server would build from this environment.')
+    args = parser.parse_args(argv)
+
+    winners = {'r1': dict.fromkeys(WINNER_CODES, 0), 'r2': dict.fromkeys(WINNER_CODES, 0)}
+    games = differed = skipped = 0
+    engines = {}
+    if args.replay:
+        import launch # Builds the engine from unit_types.json and the env, like the server
+    with GameLogReader(args.path) as reader:
+        for record in reader.games(deployments=args.replay):
+            games += 1
+            winners['r1'][record.r1[2]] += 1
+            winners['r2'][record.r2[2]] += 1
+            if args.replay:
+                engine = engines.get(record.map_size)
+                if engine is None:
+                    engine = engines[record.map_size] = launch.make_game_engine(launch.unit_registry.current, map_size=record.map_size)
+                try:
+                    mismatches = replay(record, engine)
+                except ValueError as e:
+                    skipped += 1
+                    print(e, file=sys.stderr)
+                    continue
+                if mismatches:
+                    differed += 1
+                    print(f'Game {record.game_id} differs on replay: {", ".join(mismatches)}', file=sys.stderr)
+    print(f'{games} games; R1 winners {winners["r1"]}; last-round winners {winners["r2"]}')
+    if args.replay:
+        print(f'Replayed {games - skipped}: {differed} differed, {skipped} skipped')
+    return 1 if differed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
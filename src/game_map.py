@@ -0,0 +1,265 @@
+from array import array
+
+OWNERS = [None, 'P1', 'AI'] # Owner codes: index into this list (0 means empty)
+OWNER_CODES = {owner: code for code, owner in enumerate(OWNERS) if owner}
+
+
+class GameMap:
+    """
+    Sparse map: only occupied cells are stored, in parallel arrays of codes.
+    - size: Integer, side length of the square map.
+    - unit_types: List of unit type names; a cell's type code is its index here.
+    A dict from flat cell index (x * size + y) to slot number gives O(1) lookup.
+    Memory grows with the number of occupied cells, not the map area, and a new
+    round's deployments are applied in place instead of rebuilding the map.
+    to_grid() produces the dense JSON shape clients have always received.
+    track_changes() starts a journal of the cells changed from then on, so a round played in
+    place can still be sent as a delta (see take_changes) without keeping the old map.
+    """
+
+    __slots__ = ('size', 'unit_types', '_type_codes', '_slot_by_cell', '_cells', '_owners', '_types', '_counts', '_changes')
+
+    def __init__(self, size, unit_types):
+        self.size = size
+        self.unit_types = list(unit_types)
+        self._type_codes = {unit_type: code for code, unit_type in enumerate(self.unit_types)}
+        self._slot_by_cell = {}
+        self._cells = array('q')   # flat cell index per slot
+        self._owners = array('B')  # owner code per slot
+        self._types = array('B')   # unit type code per slot
+        self._counts = array('q')  # unit count per slot
+        self._changes = None       # While tracking: flat cell index -> codes it held before (None if empty)
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __contains__(self, coord):
+        x, y = coord
+        return 0 <= x < self.size and 0 <= y < self.size and (x * self.size + y) in self._slot_by_cell
+
+    def _cell_dict(self, slot):
+        return {
+            'owner': OWNERS[self._owners[slot]],
+            'unit_type': self.unit_types[self._types[slot]],
+            'count': self._counts[slot]
+        }
+
+    def get(self, x, y):
+        """Returns the cell as {'owner', 'unit_type', 'count'}, or None if empty."""
+        slot = self._slot_by_cell.get(x * self.size + y)
+        return None if slot is None else self._cell_dict(slot)
+
+    def codes_at(self, cell):
+        """Returns (owner_code, type_code, count) for a flat cell index, or None if empty."""
+        slot = self._slot_by_cell.get(cell)
+        return None if slot is None else (self._owners[slot], self._types[slot], self._counts[slot])
+
+    def set_cell(self, x, y, owner, unit_type, count):
+        """
+        Places a stack on (x, y). Returns the previous cell dict if one was
+        overwritten, else None.
+        """
+        return self._set_codes(x * self.size + y, OWNER_CODES[owner], self._type_codes[unit_type], count)
+
+    def track_changes(self):
+        """Starts a new journal of changed cells; see take_changes()."""
+        self._changes = {}
+
+    def take_changes(self):
+        """
+        Stops tracking. Returns {flat cell index: (owner_code, type_code, count) the cell held when
+        tracking started, or None if it was empty} for every cell changed since track_changes().
+        """
+        changes, self._changes = self._changes, None
+        return changes if changes is not None else {}
+
+    def _note(self, cell):
+        # First change to a cell since tracking started: remember what it held
+        if cell not in self._changes:
+            self._changes[cell] = self.codes_at(cell)
+
+    def _set_codes(self, cell, owner_code, type_code, count):
+        if self._changes is not None:
+            self._note(cell)
+        slot = self._slot_by_cell.get(cell)
+        if slot is None:
+            self._slot_by_cell[cell] = len(self._cells)
+            self._cells.append(cell)
+            self._owners.append(owner_code)
+            self._types.append(type_code)
+            self._counts.append(count)
+            return None
+        previous = self._cell_dict(slot)
+        self._owners[slot] = owner_code
+        self._types[slot] = type_code
+        self._counts[slot] = count
+        return previous
+
+    def apply(self, deployments_list):
+        """
+        Applies a round's deployments on top of the current map.
+        Deployments outside the map are skipped.
+        Returns a list of (deployment, previous_cell) for cells that were overwritten.
+        """
+        overwritten = []
+        size = self.size
+        for dep in deployments_list:
+            x, y = dep['x'], dep['y']
+            if 0 <= x < size and 0 <= y < size:
+                previous = self.set_cell(x, y, dep['owner'], dep['unit_type'], dep['count'])
+                if previous is not None:
+                    overwritten.append((dep, previous))
+        return overwritten
+
+    def apply_batch(self, batch):
+        """
+        apply() for a deployments.DeploymentBatch of the same map size, code for code
+        without building any dicts. Returns a list of (position in batch, previous_cell) for cells
+        that were overwritten.
+        """
+        overwritten = []
+        area = self.size * self.size
+        # A map kept from before a unit config reload may number the types differently
+        translate = None if batch.unit_types == self.unit_types else [self._type_codes.get(t) for t in batch.unit_types]
+        for i, (cell, owner_code, type_code, count) in enumerate(batch.iter_codes()):
+            if 0 <= cell < area:
+                if translate is not None:
+                    if translate[type_code] is None:
+                        raise KeyError(batch.unit_types[type_code])
+                    type_code = translate[type_code]
+                previous = self._set_codes(cell, owner_code, type_code, count)
+                if previous is not None:
+                    overwritten.append((i, previous))
+        return overwritten
+
+    def move(self, cell, to_cell):
+        """Moves the stack on flat cell index cell to the empty flat cell index to_cell."""
+        if self._changes is not None:
+            self._note(cell)
+            self._note(to_cell)
+        slot = self._slot_by_cell.pop(cell)
+        self._cells[slot] = to_cell
+        self._slot_by_cell[to_cell] = slot
+
+    def apply_losses(self, losses):
+        """
+        Subtracts combat losses in place. losses is an iterable of (cell_index, units_lost);
+        stacks reduced to zero are removed from the map.
+        """
+        for cell, lost in losses:
+            slot = self._slot_by_cell.get(cell)
+            if slot is None:
+                continue
+            if self._changes is not None:
+                self._note(cell)
+            remaining = self._counts[slot] - lost
+            if remaining > 0:
+                self._counts[slot] = remaining
+                continue
+            # Swap-remove: move the last slot into the freed one
+            last = len(self._cells) - 1
+            if slot != last:
+                moved_cell = self._cells[last]
+                self._cells[slot] = moved_cell
+                self._owners[slot] = self._owners[last]
+                self._types[slot] = self._types[last]
+                self._counts[slot] = self._counts[last]
+                self._slot_by_cell[moved_cell] = slot
+            del self._slot_by_cell[cell]
+            for column in (self._cells, self._owners, self._types, self._counts):
+                column.pop()
+
+    def cells(self):
+        """Yields (x, y, owner, unit_type, count) for every occupied cell, in placement order."""
+        size, unit_types = self.size, self.unit_types
+        for cell, owner_code, type_code, count in zip(self._cells, self._owners, self._types, self._counts):
+            x, y = divmod(cell, size)
+            yield x, y, OWNERS[owner_code], unit_types[type_code], count
+
+    def iter_codes(self):
+        """Yields (cell_index, owner_code, type_code, count) for every occupied cell."""
+        return zip(self._cells, self._owners, self._types, self._counts)
+
+    def diff(self, previous):
+        """
+        Compares against an earlier map of the same size.
+        Returns (changed, removed): changed is a list of (cell_index, owner_code, type_code, count)
+        for cells that are new or differ, removed is a list of cell indexes that were emptied.
+        """
+        changed = []
+        previous_slots = previous._slot_by_cell
+        for cell, owner_code, type_code, count in self.iter_codes():
+            slot = previous_slots.get(cell)
+            if slot is None or previous._owners[slot] != owner_code or \
+               previous._types[slot] != type_code or previous._counts[slot] != count:
+                changed.append((cell, owner_code, type_code, count))
+        removed = [cell for cell in previous._cells if cell not in self._slot_by_cell]
+        return changed, removed
+
+    def diff_changes(self, changes):
+        """
+        diff() against the map as it was when take_changes() returned changes, looking only at
+        the changed cells. Returns a MapDelta.
+        """
+        delta = MapDelta()
+        for cell, before in changes.items():
+            now = self.codes_at(cell)
+            if now is None:
+                if before is not None:
+                    delta.removed.append(cell)
+            elif now != before:
+                delta.changed.append((cell,) + now)
+        return delta
+
+    def masked(self, visible, owner):
+        """
+        Copy with only what owner can see: its own stacks, plus other stacks on cells whose
+        bit is set in visible (bytes of a bitboard, see bitboard: bit b % 8 of byte b // 8,
+        b = x * (size + 1) + y).
+        """
+        owner_code, size = OWNER_CODES[owner], self.size
+        clone = GameMap(size, self.unit_types)
+        for cell, cell_owner, type_code, count in zip(self._cells, self._owners, self._types, self._counts):
+            bit = cell + cell // size
+            if cell_owner == owner_code or (visible[bit >> 3] >> (bit & 7)) & 1:
+                clone._slot_by_cell[cell] = len(clone._cells)
+                clone._cells.append(cell)
+                clone._owners.append(cell_owner)
+                clone._types.append(type_code)
+                clone._counts.append(count)
+        return clone
+
+    def copy(self):
+        clone = GameMap.__new__(GameMap)
+        clone.size = self.size
+        clone.unit_types = self.unit_types
+        clone._type_codes = self._type_codes
+        clone._slot_by_cell = dict(self._slot_by_cell)
+        clone._cells = array('q', self._cells)
+        clone._owners = array('B', self._owners)
+        clone._types = array('B', self._types)
+        clone._counts = array('q', self._counts)
+        clone._changes = None
+        return clone
+
+    def to_grid(self):
+        """Dense list-of-lists (grid[x][y] is a cell dict or None), the JSON contract."""
+        grid = [[None] * self.size for _ in range(self.size)]
+        for slot, cell in enumerate(self._cells):
+            x, y = divmod(cell, self.size)
+            grid[x][y] = self._cell_dict(slot)
+        return grid
+
+
+class MapDelta:
+    """
+    How a map (or a player's view of it) changed since an earlier version, as diff() reports it:
+    changed is a list of (cell_index, owner_code, type_code, count), removed a list of cell
+    indexes. Delta encodings take one in place of the earlier map.
+    """
+
+    __slots__ = ('changed', 'removed')
+
+    def __init__(self, changed=None, removed=None):
+        self.changed = changed if changed is not None else []
+        self.removed = removed if removed is not None else []
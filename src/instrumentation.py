@@ -0,0 +1,203 @@
+import bisect
+import contextvars
+import threading
+import time
+
+# Per-request phase timings. None outside a request (e.g. in the headless simulator),
+# which turns phase() into a near no-op.
+_current_timings = contextvars.ContextVar('rts_request_timings', default=None)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus style. observe() is O(log buckets)."""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters keyed by (metric name, label tuple).
+    One lock guards all updates; each update is a few list operations, so contention stays low.
+    Each worker process keeps its own registry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {} # (name, labels) -> Histogram
+        self._counters = {}   # (name, labels) -> number
+        self._help = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = sorted((key, list(h.counts), h.total, h.count, h.buckets) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        seen = set()
+
+        def header(name, metric_type):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {metric_type}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_number(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in labels) + '}'
+
+
+class RequestTimings:
+    __slots__ = ('start', 'phases')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = [] # (phase name, seconds), in completion order
+
+
+class phase:
+    """
+    Times a block as a named phase of the current request:
+        with phase('validate'):
+            ...
+    Phases show up in the Server-Timing header and the per-phase histogram.
+    Outside a request this only does one ContextVar lookup.
+    """
+
+    __slots__ = ('name', '_timings', '_start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._timings = _current_timings.get()
+        if self._timings is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._timings is not None:
+            self._timings.phases.append((self.name, time.perf_counter() - self._start))
+        return False
+
+
+metrics = MetricsRegistry()
+metrics.describe('rts_requests_total', 'Requests handled, by route and status code.')
+metrics.describe('rts_request_errors_total', 'Unexpected exceptions caught by route handlers.')
+metrics.describe('rts_request_duration_seconds', 'End-to-end handler latency per route.')
+metrics.describe('rts_phase_duration_seconds', 'Latency of named phases within a request.')
+metrics.describe('rts_request_size_bytes', 'Request body size per route.')
+metrics.describe('rts_response_size_bytes', 'Response body size per route, after compression.')
+
+
+def record_error(route):
+    """Counts an unexpected exception caught in a route handler."""
+    metrics.inc('rts_request_errors_total', (('route', route),))
+
+
+def _route_label(request):
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_app(app, registry=metrics):
+    """
+    Hooks request timing into a Flask app and adds the /metrics endpoint.
+    Call right after creating the app, before registering other after_request hooks:
+    Flask runs after_request hooks in reverse order, so this one then sees the final
+    (compressed) response and any phases those hooks record.
+    """
+    from flask import Response, request
+
+    @app.before_request
+    def _start_request_timing():
+        request.environ['rts.timings_token'] = _current_timings.set(RequestTimings())
+
+    @app.after_request
+    def _finish_request_timing(response):
+        timings = _current_timings.get()
+        if timings is None:
+            return response
+        elapsed = time.perf_counter() - timings.start
+        route = _route_label(request)
+        labels = (('route', route),)
+
+        # Same-named phases (e.g. repeated inside a loop) are summed
+        totals = {}
+        for name, seconds in timings.phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+        for name, seconds in totals.items():
+            registry.observe('rts_phase_duration_seconds', labels + (('phase', name),), seconds)
+        entries = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in totals.items()]
+        entries.append(f'total;dur={elapsed * 1000:.3f}')
+        response.headers.add('Server-Timing', ', '.join(entries))
+
+        registry.observe('rts_request_duration_seconds', labels, elapsed)
+        registry.observe('rts_request_size_bytes', labels, request.content_length or 0, SIZE_BUCKETS)
+        if not response.is_streamed and not response.direct_passthrough:
+            registry.observe('rts_response_size_bytes', labels, response.calculate_content_length() or 0, SIZE_BUCKETS)
+        registry.inc('rts_requests_total', labels + (('status', str(response.status_code)),))
+        return response
+
+    @app.teardown_request
+    def _clear_request_timing(exc):
+        token = request.environ.pop('rts.timings_token', None)
+        if token is not None:
+            _current_timings.reset(token)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,157 @@
+"""
+Incremental reading of one top-level JSON object from a byte stream, so a large request body
+never has to be in memory at once.
+
+Members of the object come out one at a time. Members named in stream_keys whose value is an
+array come out as an iterator over the array's items instead, each item decoded with the
+stdlib decoder as soon as its text has arrived. Only the unread part of the current chunk and
+the item being decoded are held, and the total read is capped at max_bytes.
+"""
+import codecs
+import json
+import re
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class PayloadTooLarge(ValueError):
+    """More than max_bytes were read."""
+
+
+class JSONStreamError(ValueError):
+    """The body is not the expected JSON. str(error) says where."""
+
+
+class JSONObjectStream:
+    """
+    - stream: Binary file-like object with read(n), e.g. a WSGI request stream.
+    - max_bytes: Integer, PayloadTooLarge is raised once more than this has been read.
+    - stream_keys: Keys whose array values are yielded item by item.
+    """
+
+    def __init__(self, stream, max_bytes, stream_keys=(), chunk_size=DEFAULT_CHUNK_SIZE):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.stream_keys = frozenset(stream_keys)
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    # --- Buffer handling ---
+    def _fill(self, at_least=0):
+        """Reads more text. Returns False at end of stream."""
+        if self._eof:
+            return False
+        if self._pos > self.chunk_size: # Drop what has been consumed
+            self._buf, self._pos = self._buf[self._pos:], 0
+        data = self.stream.read(max(self.chunk_size, at_least))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise PayloadTooLarge(f'Request body is larger than {self.max_bytes} bytes.')
+        if not data:
+            self._eof = True
+            self._buf += self._decoder.decode(b'', final=True)
+            return False
+        try:
+            self._buf += self._decoder.decode(data)
+        except UnicodeDecodeError as e:
+            raise JSONStreamError('Request body is not valid UTF-8.') from e
+        return True
+
+    def _peek(self):
+        """Next non-whitespace character (not consumed), or '' at end of stream."""
+        while True:
+            buf = self._buf
+            pos = self._pos = _WHITESPACE.match(buf, self._pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise JSONStreamError(f"Expected one of {chars!r} at byte {self.bytes_read}, found {char or 'end of body'!r}.")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Decodes one complete JSON value, reading more text until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Probably cut off mid-value: read more (at least as much as is pending, so a
+                # big value is re-scanned only O(log n) times) and retry
+                if not self._fill(at_least=len(self._buf) - self._pos):
+                    raise JSONStreamError(f'Invalid JSON: {e.msg}.') from e
+                continue
+            except ValueError as e: # e.g. an integer with too many digits
+                raise JSONStreamError(f'Invalid JSON: {e}.') from e
+            # A number or literal that runs to the end of the buffer may continue in the next chunk
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    # --- Public API ---
+    def members(self):
+        """
+        Yields (key, value) for each member of the top-level object. For stream_keys with an
+        array value, value is an iterator over its items that must be consumed (or abandoned)
+        before asking for the next member.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return self._end()
+        while True:
+            if self._peek() != '"':
+                raise JSONStreamError('Expected an object key.')
+            key = self._value()
+            self._expect(':')
+            if key in self.stream_keys and self._peek() == '[':
+                self._pos += 1
+                items = self._items()
+                yield key, items
+                for _ in items: # Drain anything the caller left
+                    pass
+            else:
+                yield key, self._value()
+            if self._expect(',}') == '}':
+                break
+        self._end()
+
+    def _items(self):
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        decode, skip = self._json.raw_decode, _WHITESPACE.match
+        while True:
+            # Fast path: the item and the separator after it are already buffered. Anything
+            # else (item cut by the chunk end, bad JSON) goes through the refilling path.
+            buf = self._buf
+            try:
+                value, end = decode(buf, skip(buf, self._pos).end())
+                end = skip(buf, end).end()
+                separator = buf[end]
+            except (ValueError, IndexError):
+                value = self._value()
+                separator = self._expect(',]')
+            else:
+                if separator not in ',]':
+                    self._expect(',]') # Raises with the position
+                self._pos = end + 1
+            yield value
+            if separator == ']':
+                return
+
+    def _end(self):
+        if self._peek():
+            raise JSONStreamError('Unexpected data after the JSON object.')
@@ -1,332 +1,437 @@
-import random
-from flask import Flask, request, jsonify, send_from_directory
-
-app = Flask(__name__, static_folder='static')
-
-VALID_UNIT_TYPES = ['infantry', 'archers', 'cavalry']
-MAP_SIZE = 5 # 5x5 grid
-
-# --- Helper Function for AI Deployment ---
-def deploy_ai_units(units_to_deploy_total_count, unit_type, current_occupied_coords, owner_id="AI"):
+import os
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory
+from ai_planner import MonteCarloPlanner
+from analytics import BalanceStats
+from assets import AssetCache, DIST_DIR
+from combat import WINNER_NAMES
+import instrumentation
+import profiler
+from instrumentation import phase, record_error
+from json_stream import JSONObjectStream, JSONStreamError, PayloadTooLarge
+from fog import DEFAULT_SIGHT_RANGE
+from movement import DEFAULT_MOVE_RANGE
+from game_engine import (
+    MAP_SIZE, ROUNDS, DeploymentError, GameEngine, new_game_seed, round_rng
+)
+from deployments import DeploymentBatch
+from game_log import GameLogWriter, GameRecord, RoundRecord
+from session_store import InMemorySessionStore, SqliteSessionStore
+from unit_registry import DEFAULT_CONFIG_PATH as DEFAULT_UNIT_CONFIG_PATH, UnitRegistry
+from wire_format import (
+    DENSE_JSON, SPARSE_JSON, BINARY, COMPRESSIBLE_MIMETYPES,
+    negotiate_map_format, encode_sparse, encode_binary, compress_body
+)
+
+# Routes live on a blueprint so create_app() can build configured app instances
+game = Blueprint('game', __name__)
+
+# Unit types and modifiers come from UNIT_CONFIG_PATH and are reloaded when that file changes
+unit_registry = UnitRegistry(os.environ.get('UNIT_CONFIG_PATH', DEFAULT_UNIT_CONFIG_PATH))
+
+def make_game_engine(unit_set, ai_planner=None, map_size=MAP_SIZE):
+    # COMBAT_MODE=spatial fights adjacent stacks on the map instead of whole armies;
+    # MOVEMENT_PHASE=1 moves stacks toward the enemy (by their configured move_range) before R2 combat;
+    # FOG_OF_WAR=0 sends the whole map instead of what the player's stacks can see (sight_range);
+    # GAME_ROUNDS sets how many rounds a game lasts (2 by default)
+    move_ranges = sight_ranges = None
+    if os.environ.get('MOVEMENT_PHASE', '0') == '1':
+        move_ranges = {name: stats.get('move_range', DEFAULT_MOVE_RANGE) for name, stats in unit_set.stats.items()}
+    if os.environ.get('FOG_OF_WAR', '1') == '1':
+        sight_ranges = {name: stats.get('sight_range', DEFAULT_SIGHT_RANGE) for name, stats in unit_set.stats.items()}
+    engine = GameEngine(unit_set.unit_types, map_size, unit_set.combat_engine,
+                        combat_mode=os.environ.get('COMBAT_MODE', 'army'), move_ranges=move_ranges,
+                        sight_ranges=sight_ranges, rounds=int(os.environ.get('GAME_ROUNDS', ROUNDS)))
+    # AI_MODE=planner switches the AI from random picks to the time-budgeted Monte Carlo planner
+    if ai_planner is None and os.environ.get('AI_MODE', 'random') == 'planner':
+        ai_planner = MonteCarloPlanner(
+            engine.combat_engine,
+            budget_seconds=float(os.environ.get('AI_PLANNER_BUDGET_MS', 20)) / 1000,
+            processes=int(os.environ.get('AI_PLANNER_PROCESSES', max(0, (os.cpu_count() or 1) - 1)))
+        )
+    if ai_planner is not None:
+        ai_planner.combat_engine = engine.combat_engine
+        engine.ai_planner = ai_planner
+    return engine
+
+game_engine = make_game_engine(unit_registry.current)
+combat_engine = game_engine.combat_engine
+
+@game.before_app_request
+def reload_unit_types():
+    # A changed unit config swaps in a new engine; requests already running keep the old one
+    global game_engine, combat_engine
+    if unit_registry.refresh():
+        game_engine = make_game_engine(unit_registry.current, game_engine.ai_planner)
+        combat_engine = game_engine.combat_engine
+# Upper bound on matchups per /simulate_batch call, to keep one request from monopolizing a worker.
+MAX_BATCH_MATCHUPS = int(os.environ.get('MAX_BATCH_MATCHUPS', 100000))
+# Upper bound on a /submit_round_<n> body. The body is parsed as it streams in, so this bounds
+# reading time rather than memory.
+MAX_R2_BODY_BYTES = int(os.environ.get('MAX_R2_BODY_BYTES', 16 * 1024 * 1024))
+
+# In-progress games live server-side between rounds, keyed by the game_id handed out by R1.
+# Any SessionBackend implementation can be assigned here instead.
+def make_game_store():
+    # GAME_STORE_PATH selects the SQLite backend, needed when several worker processes serve one game
+    max_games = int(os.environ.get('GAME_STORE_MAX_GAMES', 10000))
+    ttl_seconds = float(os.environ.get('GAME_STORE_TTL_SECONDS', 3600))
+    if os.environ.get('GAME_STORE_PATH'):
+        return SqliteSessionStore(os.environ['GAME_STORE_PATH'], max_games=max_games, ttl_seconds=ttl_seconds)
+    return InMemorySessionStore(max_games=max_games, ttl_seconds=ttl_seconds)
+
+game_store = make_game_store()
+
+def make_game_log():
+    # GAME_LOG_PATH turns on the append-only binary log of finished games (see game_log)
+    path = os.environ.get('GAME_LOG_PATH')
+    return GameLogWriter(path) if path else None
+
+game_log = make_game_log()
+
+# Built static assets (python assets.py) served from memory; None until a build exists
+asset_cache = AssetCache.load(os.environ.get('ASSET_DIST_DIR', DIST_DIR))
+
+# Win rates per matchup, bonus troops and R1/R2 winner correlation over recent time windows (see analytics)
+balance_stats = BalanceStats(window_seconds=float(os.environ.get('BALANCE_STATS_WINDOW_SECONDS', 60)),
+                             windows=int(os.environ.get('BALANCE_STATS_WINDOWS', 60)))
+
+def visible_map(game_map, visibility):
+    # The map as the player sees it; without fog (visibility None) the whole map
+    if visibility is None:
+        return game_map
+    with phase('fog'):
+        return game_map.masked(visibility.bits, 'P1')
+
+def player_view(payload, game_map, visibility, ai_deployments_key):
     """
-    Deploys a given total count of AI units of a specific type onto random empty cells.
-    - units_to_deploy_total_count: Integer, total number of units of this type to deploy.
-    - unit_type: String, e.g., 'infantry'.
-    - current_occupied_coords: List of (x, y) tuples already occupied.
-    - owner_id: String, 'AI' or 'P1'.
-    Returns:
-        - list of deployment dicts: [{'unit_type': ..., 'count': ..., 'x': ..., 'y': ..., 'owner': ...}, ...]
-        - updated list of occupied_coords
+    Applies fog of war to a round response in place: the map, the AI deployment list and the
+    AI's moves and combat losses keep only what the player can see, and the visibility itself
+    is added for the client. Returns the map to send. Without fog (visibility None) everything
+    passes through.
     """
-    ai_deployments = []
-    available_cells = []
-    for r in range(MAP_SIZE):
-        for c in range(MAP_SIZE):
-            if (r, c) not in current_occupied_coords:
-                available_cells.append((r, c))
-    
-    random.shuffle(available_cells)
-
-    # For simplicity in this version, AI deploys its total count of a single unit type
-    # into as many cells as possible, or up to its total count if cells are limited.
-    # A more complex AI might split units, but here we assume 1 unit per cell if possible,
-    # or group them if cells are very scarce.
-    # For now, let's assume AI tries to spread out, one unit per cell if possible.
-    # If it has more units than available cells, it will deploy multiple units on some cells.
-
-    # This simplified AI will deploy 1 unit per chosen cell until units run out or cells run out.
-    # More advanced logic would be needed for "stacking" units if units > available_cells.
-    # For this iteration, if units_to_deploy_total_count > len(available_cells),
-    # it will deploy to all available_cells, with counts distributed.
-    
-    # Simplified: AI deploys its units into distinct cells if possible.
-    # If it has more units than cells, it will put more in some cells.
-    # This version will just pick distinct cells for now.
-    
-    num_deployment_locations = min(units_to_deploy_total_count, len(available_cells))
-    
-    # Basic distribution:
-    # if units_to_deploy_total_count = 7, num_deployment_locations = 3
-    # cell1: 3, cell2: 2, cell3: 2
-    
-    units_remaining_to_assign = units_to_deploy_total_count
-    
-    for i in range(num_deployment_locations):
-        if units_remaining_to_assign <= 0:
-            break
-            
-        cell_coord = available_cells.pop(0) # Get an available cell
-        
-        # Determine count for this cell
-        count_for_this_cell = 1 # Default to 1
-        if i == num_deployment_locations - 1: # Last cell gets all remaining
-            count_for_this_cell = units_remaining_to_assign
-        elif num_deployment_locations > 0 : # Distribute somewhat evenly
-             count_for_this_cell = units_remaining_to_assign // (num_deployment_locations - i)
-        
-        count_for_this_cell = max(1, count_for_this_cell) # Ensure at least 1 if assigning
-        count_for_this_cell = min(count_for_this_cell, units_remaining_to_assign) # Don't assign more than available
-
-        ai_deployments.append({
-            'owner': owner_id,
-            'unit_type': unit_type,
-            'count': count_for_this_cell,
-            'x': cell_coord[0],
-            'y': cell_coord[1]
-        })
-        current_occupied_coords.append(cell_coord)
-        units_remaining_to_assign -= count_for_this_cell
-        
-    # If units still remain (e.g. no cells were available), they are not deployed.
-    # This is a simplification; a real game might handle this differently.
-
-    return ai_deployments, current_occupied_coords
-
-
-def initialize_map():
-    return [[None for _ in range(MAP_SIZE)] for _ in range(MAP_SIZE)]
-
-def populate_map_from_deployments(deployments_list):
-    game_map = initialize_map()
-    for dep in deployments_list:
-        if 0 <= dep['x'] < MAP_SIZE and 0 <= dep['y'] < MAP_SIZE:
-            if game_map[dep['x']][dep['y']] is None:
-                game_map[dep['x']][dep['y']] = {'owner': dep['owner'], 'unit_type': dep['unit_type'], 'count': dep['count']}
-            else:
-                # Handle error or update logic if cell is already occupied (e.g. merging units)
-                # For now, this implies an error in deployment list generation or validation
-                app.logger.warning(f"Cell {dep['x']},{dep['y']} already occupied during map population. New: {dep}, Existing: {game_map[dep['x']][dep['y']]}")
-                # Overwrite for now, assuming validation should prevent this for distinct player deployments
-                game_map[dep['x']][dep['y']] = {'owner': dep['owner'], 'unit_type': dep['unit_type'], 'count': dep['count']}
-
-    return game_map
-
-@app.route('/')
+    if visibility is not None:
+        with phase('fog'):
+            payload[ai_deployments_key] = visibility.visible_deployments(payload[ai_deployments_key])
+            if 'moves' in payload: # An AI move shows only if both ends are in sight
+                payload['moves'] = visibility.visible_reports(payload['moves'], 'P1', (('x', 'y'), ('to_x', 'to_y')))
+            if 'spatial_combat' in payload:
+                spatial = payload['spatial_combat']
+                payload['spatial_combat'] = dict(spatial, cell_losses=visibility.visible_reports(spatial['cell_losses'], 'P1'))
+            payload['visibility'] = visibility.encode()
+    return visible_map(game_map, visibility)
+
+def make_round_response(payload, map_key, game_map, previous_map=None):
+    """
+    Serializes a round result in the map format the client asked for in its Accept header.
+    - payload: Dict of response fields, without the map. Deployment lists are DeploymentBatch objects.
+    - map_key: String, the field the map goes in ('current_map_state' / 'final_map_state').
+    - game_map: GameMap to send.
+    - previous_map: GameMap of the previous round, or a MapDelta against it (the engine's
+      'map_changes'); with ?delta=1 only changed cells are sent.
+    Dense JSON (the default) keeps the original 2D-array contract. Sparse JSON and binary
+    send occupied cells only and drop the deployment lists (every DeploymentBatch in the
+    payload), which the map already carries.
+    """
+    with phase('serialize'):
+        response = _serialize_round_response(payload, map_key, game_map, previous_map)
+    response.vary.add('Accept')
+    return response
+
+def _serialize_round_response(payload, map_key, game_map, previous_map):
+    map_format = negotiate_map_format(request.accept_mimetypes)
+    if map_format == DENSE_JSON:
+        payload[map_key] = game_map.to_grid()
+        for key, value in payload.items(): # Engine batches become dicts only here
+            if isinstance(value, DeploymentBatch):
+                payload[key] = value.to_dicts()
+        response = jsonify(payload)
+    else:
+        compact = {key: value for key, value in payload.items() if not isinstance(value, DeploymentBatch)}
+        delta_base = previous_map if request.args.get('delta') == '1' else None
+        if map_format == SPARSE_JSON:
+            compact[map_key] = encode_sparse(game_map, delta_base)
+            response = jsonify(compact)
+            response.mimetype = SPARSE_JSON
+        else:
+            compact['map_key'] = map_key
+            response = current_app.response_class(encode_binary(compact, game_map, delta_base), mimetype=BINARY)
+    return response
+
+@game.after_app_request
+def compress_response(response):
+    # gzip/deflate large bodies for clients that accept it; small ones are not worth the CPU.
+    if response.direct_passthrough or response.is_streamed or \
+       response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    with phase('compress'):
+        body, content_encoding = compress_body(response.get_data(), request.accept_encodings)
+    if content_encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = content_encoding
+        etag, weak = response.get_etag()
+        if etag and not weak: # A strong ETag names one exact body, so the compressed one needs its own
+            response.set_etag(f'{etag}-{content_encoding}')
+    return response
+
+@game.route('/')
 def index():
-    return send_from_directory(app.static_folder, 'index.html')
-
-@app.route('/submit_round_1', methods=['POST'])
+    if asset_cache is not None:
+        return asset_cache.response('index.html', request)
+    return send_from_directory(current_app.static_folder, 'index.html')
+
+@game.route('/assets/<name>')
+def built_asset(name):
+    response = asset_cache.response(name, request) if asset_cache is not None else None
+    if response is None:
+        return jsonify({'error': f'No asset named {name}.'}), 404
+    return response
+
+@game.route('/unit_types')
+def unit_types():
+    # Names, labels, stats and non-neutral modifiers of the active unit config
+    return jsonify(unit_registry.current.describe())
+
+@game.route('/submit_round_1', methods=['POST'])
 def submit_round_1():
     try:
         # Request body is no longer used for player R1 deployments, but keeping the structure
         # in case other data might be passed in the future.
-        data = request.get_json(silent=True) 
+        with phase('parse'):
+            data = request.get_json(silent=True) 
         # app.logger.info(f"R1 Data: {data}") # Optional: log if you want to see if client sends anything
 
-        # --- Fixed Player 1 R1 Deployment ---
-        player_r1_combat_unit_type = 'infantry'
-        player_r1_total_deployed_count = 10
-        validated_player_r1_deployments = [
-            {'owner': 'P1', 'unit_type': player_r1_combat_unit_type, 'count': player_r1_total_deployed_count, 'x': 0, 'y': 0}
-        ]
-        # player_occupied_cells_r1 is not strictly needed here with fixed deployments
-        # but if any other logic expected it, it would be:
-        # player_occupied_cells_r1 = set([(0,0)]) 
-
-        # --- Fixed AI R1 Deployment ---
-        ai_r1_total_budget = 10 
-        ai_r1_chosen_unit_type = random.choice(VALID_UNIT_TYPES) 
-        ai_r1_deployments = [
-            {'owner': 'AI', 'unit_type': ai_r1_chosen_unit_type, 'count': ai_r1_total_budget, 'x': 4, 'y': 4}
-        ]
-        ai_r1_actual_deployed_count = ai_r1_total_budget
-        
-        # --- Combine Deployments for Map State ---
-        all_r1_deployments = validated_player_r1_deployments + ai_r1_deployments
-        current_map_state = populate_map_from_deployments(all_r1_deployments)
-        
-        # Player R1 army summary (already defined variables are used)
-        # player_r1_combat_unit_type is 'infantry'
-        # player_r1_combat_total_count is 10
-
-        # AI R1 army summary (already defined variables are used)
-        # ai_r1_chosen_unit_type is the random choice
-        ai_r1_combat_unit_type = ai_r1_chosen_unit_type # Ensure this is assigned for clarity if not already
-        ai_r1_combat_total_count = ai_r1_actual_deployed_count # This is 10
-
-        # --- Combat Logic (remains the same) ---
-        player_modifier = 1.0
-        ai_modifier = 1.0
-        if (player_r1_combat_unit_type == 'infantry' and ai_r1_combat_unit_type == 'archers') or \
-           (player_r1_combat_unit_type == 'archers' and ai_r1_combat_unit_type == 'cavalry') or \
-           (player_r1_combat_unit_type == 'cavalry' and ai_r1_combat_unit_type == 'infantry'):
-            player_modifier = 1.25
-        elif (ai_r1_combat_unit_type == 'infantry' and player_r1_combat_unit_type == 'archers') or \
-              (ai_r1_combat_unit_type == 'archers' and player_r1_combat_unit_type == 'cavalry') or \
-              (ai_r1_combat_unit_type == 'cavalry' and player_r1_combat_unit_type == 'infantry'):
-            ai_modifier = 1.25
-
-        player_r1_eff_strength = float(player_r1_combat_total_count) * player_modifier
-        ai_r1_eff_strength = float(ai_r1_combat_total_count) * ai_modifier
-        
-        r1_winner = "Draw"
-        if player_r1_eff_strength > ai_r1_eff_strength: r1_winner = "Player"
-        elif ai_r1_eff_strength > player_r1_eff_strength: r1_winner = "AI"
-
-        player_r2_base_recruits = 10 + (10 - player_r1_combat_total_count) # player_r1_combat_total_count is 10, so base is 10
-        ai_r2_base_recruits = 10 + (10 - ai_r1_combat_total_count) # ai_r1_combat_total_count is 10, so base is 10
-
-        strength_diff = abs(player_r1_eff_strength - ai_r1_eff_strength)
-        bonus_troops = int(strength_diff) # Bonus is based on effective strength difference
-        player_r2_bonus, ai_r2_bonus = (bonus_troops, 0) if r1_winner == "Player" else (0, bonus_troops) if r1_winner == "AI" else (0,0)
-        
-        player_total_r2_pool = max(0, player_r2_base_recruits + player_r2_bonus)
-        ai_total_r2_pool = max(0, ai_r2_base_recruits + ai_r2_bonus)
+        # Fixed R1 deployments, combat and R2 pools are resolved by the game engine.
+        # Each game plays from its own seed so it can be replayed from the game log.
+        seed = new_game_seed()
+        r1, r1_state = game_engine.play_round_1(round_rng(seed, 1))
+        r1_state['seed'] = seed
 
-        return jsonify({
+        # --- Persist R1 state server-side for R2 ---
+        # R2 only needs the game_id; deployments, occupancy and budgets are never re-sent by the client.
+        game_id = game_store.create(r1_state)
+
+        payload = {
+            'game_id': game_id,
+            'rounds': r1_state['rounds'],
             'round_1_results': {
-                'player_army': { 
-                    'type': player_r1_combat_unit_type,
-                    'count': player_r1_combat_total_count,
-                    'strength': player_r1_eff_strength
-                },
-                'ai_army': {
-                    'type': ai_r1_combat_unit_type,
-                    'count': ai_r1_combat_total_count,
-                    'strength': ai_r1_eff_strength
-                },
-                'round_winner': r1_winner
+                'player_army': r1['player_army'],
+                'ai_army': r1['ai_army'],
+                'round_winner': r1['round_winner']
             },
-            'player_r1_deployments': validated_player_r1_deployments, # P1 fixed deployment
-            'ai_r1_deployments': ai_r1_deployments,                   # AI fixed deployment
-            'current_map_state': current_map_state,
-            'player_r2_data': {'base_recruits': player_r2_base_recruits, 'bonus': player_r2_bonus, 'total_r2_pool': player_total_r2_pool},
-            'ai_r1_army_details_for_r2': {'type': ai_r1_combat_unit_type, 'count': ai_r1_combat_total_count}, 
-            'ai_r2_data_for_r2': {'base_recruits': ai_r2_base_recruits, 'bonus': ai_r2_bonus, 'total_r2_pool': ai_total_r2_pool}
-        })
+            'player_r1_deployments': r1['player_r1_deployments'], # P1 fixed deployment
+            'ai_r1_deployments': r1['ai_r1_deployments'],         # AI fixed deployment
+            'player_r2_data': r1['player_r2_data'],
+            'ai_r1_army_details_for_r2': {'type': r1['ai_army']['type'], 'count': r1['ai_army']['count']}, 
+            'ai_r2_data_for_r2': r1['ai_r2_data'],
+            **({'spatial_combat': r1['spatial_combat']} if 'spatial_combat' in r1 else {})
+        }
+        return make_round_response(payload, 'current_map_state',
+                                   player_view(payload, r1['map'], r1.get('visibility'), 'ai_r1_deployments'))
 
     except Exception as e:
-        app.logger.error(f"Error in /submit_round_1: {str(e)}")
+        current_app.logger.error(f"Error in /submit_round_1: {str(e)}")
+        record_error('/submit_round_1')
         import traceback
-        app.logger.error(traceback.format_exc())
+        current_app.logger.error(traceback.format_exc())
         return jsonify({'error': 'An unexpected error occurred on the server.'}), 500
 
-@app.route('/submit_round_2', methods=['POST'])
-def submit_round_2():
+@game.route('/submit_round_2', methods=['POST'], defaults={'round_number': 2})
+@game.route('/submit_round_<int:round_number>', methods=['POST'])
+def submit_round(round_number):
+    """
+    Plays round round_number (2 or later) of a game: {"game_id": ..., "player_deployments_r<n>": [...]}.
+    Rounds must come in order; a round the game is not at gets 409. The last round's response
+    has 'game_winner' and the final map; earlier ones have the next round's pools and the map so far.
+    """
+    route = request.url_rule.rule
     try:
-        data = request.get_json(silent=True)
-        if not data: return jsonify({'error': 'Invalid request, no JSON data received.'}), 400
-
-        # --- Required R1 Data from Client ---
-        player_r1_deployments_from_client = data.get('player_r1_deployments')
-        ai_r1_deployments_from_client = data.get('ai_r1_deployments')
-        ai_r2_data_from_client = data.get('ai_r2_data_for_r2') # For AI's R2 budget
-        player_r2_pool_from_client = data.get('player_r2_total_pool') # Player's R2 budget
-
-        if not all([player_r1_deployments_from_client, ai_r1_deployments_from_client, ai_r2_data_from_client, player_r2_pool_from_client is not None]):
-            return jsonify({'error': 'Missing R1 deployment data or R2 pool data from client.'}), 400
-        
-        ai_total_r2_budget = int(ai_r2_data_from_client.get('total_r2_pool', 0))
-        player_total_r2_budget = int(player_r2_pool_from_client)
-
-
-        # --- Player R2 Deployment Input & Validation ---
-        player_r2_deployments_input = data.get('player_deployments_r2')
-        if not isinstance(player_r2_deployments_input, list):
-            return jsonify({'error': 'Invalid player_deployments_r2 format.'}), 400
-
-        validated_player_r2_deployments = []
-        player_r2_total_deployed_count = 0
-        player_occupied_cells_r2 = set() # For self-collision in R2 deployments
-
-        # Reconstruct occupied cells from R1 to avoid collision
-        r1_occupied_coords = set()
-        for dep in player_r1_deployments_from_client: r1_occupied_coords.add((dep['x'], dep['y']))
-        for dep in ai_r1_deployments_from_client: r1_occupied_coords.add((dep['x'], dep['y']))
-        
-        for dep in player_r2_deployments_input:
-            if not isinstance(dep, dict): return jsonify({'error': 'Invalid R2 deployment item.'}), 400
-            unit_type, count_str, x, y = dep.get('unit_type'), dep.get('unit_count'), dep.get('x'), dep.get('y')
-
-            if unit_type not in VALID_UNIT_TYPES: return jsonify({'error': f'R2: Invalid unit_type: {unit_type}.'}), 400
-            if not isinstance(x, int) or not isinstance(y, int) or \
-               not (0 <= x < MAP_SIZE and 0 <= y < MAP_SIZE):
-                return jsonify({'error': f'R2: Invalid coordinates: ({x},{y}).'}), 400
-            if (x,y) in player_occupied_cells_r2: return jsonify({'error': f'Player cannot deploy to the same cell ({x},{y}) twice in R2.'}), 400
-            if (x,y) in r1_occupied_coords: return jsonify({'error': f'Player R2 cannot deploy to an R1 occupied cell ({x},{y}).'}), 400
-            
+        # Oversized bodies are refused before any of them is read
+        if request.content_length is not None and request.content_length > MAX_R2_BODY_BYTES:
+            return jsonify({'error': f'Request body is larger than {MAX_R2_BODY_BYTES} bytes.'}), 413
+        if round_number < 2:
+            return jsonify({'error': f'There is no round {round_number} to submit deployments for.'}), 404
+
+        engine = game_engine # One engine for the whole request, even if the unit config reloads meanwhile
+        deployments_key = f'player_deployments_r{round_number}'
+        game_id = game_state = validator = None
+        held = None # The game while it is out of the store and still unplayed; put back on the way out
+        pending = [] # Deployments that arrive before game_id; sending game_id first avoids holding them
+        deployments_seen = False
+        try:
             try:
-                unit_count = int(count_str)
-                if unit_count < 0: return jsonify({'error': 'R2 unit count cannot be negative.'}), 400 # Can deploy 0
-            except (ValueError, TypeError): return jsonify({'error': 'R2: Invalid unit_count format.'}), 400
-            
-            validated_player_r2_deployments.append({'owner': 'P1', 'unit_type': unit_type, 'count': unit_count, 'x': x, 'y': y})
-            player_r2_total_deployed_count += unit_count
-            player_occupied_cells_r2.add((x,y))
-        
-        if player_r2_total_deployed_count > player_total_r2_budget:
-             return jsonify({'error': f'Player R2 deployment ({player_r2_total_deployed_count}) exceeds budget of {player_total_r2_budget}.'}), 400
-
-
-        # --- AI R2 Deployment ---
-        ai_r2_chosen_unit_type = random.choice(VALID_UNIT_TYPES)
-        # AI deploys on cells not occupied in R1 or by player's R2 choices
-        current_all_occupied_coords = list(r1_occupied_coords.union(player_occupied_cells_r2))
-        
-        ai_r2_deployments, _ = deploy_ai_units(
-            ai_total_r2_budget, 
-            ai_r2_chosen_unit_type, 
-            current_all_occupied_coords,
-            "AI"
-        )
-        ai_r2_actual_deployed_count = sum(d['count'] for d in ai_r2_deployments)
-
-        # --- Map State Construction R2 ---
-        # Combine R1 and R2 deployments
-        final_all_deployments = player_r1_deployments_from_client + \
-                                ai_r1_deployments_from_client + \
-                                validated_player_r2_deployments + \
-                                ai_r2_deployments
-        final_map_state = populate_map_from_deployments(final_all_deployments)
-
-        # --- R2 Combat Logic (Simplified - based on total R2 counts) ---
-        # Similar to R1, use total R2 deployed counts and a "main" type for combat modifiers.
-        player_r2_combat_unit_type = validated_player_r2_deployments[0]['unit_type'] if validated_player_r2_deployments and player_r2_total_deployed_count > 0 else VALID_UNIT_TYPES[0]
-        player_r2_combat_total_count = player_r2_total_deployed_count
-
-        ai_r2_combat_unit_type = ai_r2_chosen_unit_type
-        ai_r2_combat_total_count = ai_r2_actual_deployed_count
-
-        player_modifier = 1.0
-        ai_modifier = 1.0
-        if player_r2_combat_total_count > 0: # only apply modifier if units exist
-            if (player_r2_combat_unit_type == 'infantry' and ai_r2_combat_unit_type == 'archers') or \
-               (player_r2_combat_unit_type == 'archers' and ai_r2_combat_unit_type == 'cavalry') or \
-               (player_r2_combat_unit_type == 'cavalry' and ai_r2_combat_unit_type == 'infantry'):
-                player_modifier = 1.25
-        
-        if ai_r2_combat_total_count > 0: # only apply modifier if units exist
-            if (ai_r2_combat_unit_type == 'infantry' and player_r2_combat_unit_type == 'archers') or \
-                  (ai_r2_combat_unit_type == 'archers' and player_r2_combat_unit_type == 'cavalry') or \
-                  (ai_r2_combat_unit_type == 'cavalry' and player_r2_combat_unit_type == 'infantry'):
-                ai_modifier = 1.25
-        
-        player_r2_eff_strength = float(player_r2_combat_total_count) * player_modifier
-        ai_r2_eff_strength = float(ai_r2_combat_total_count) * ai_modifier
-
-        r2_winner = "Draw"
-        if player_r2_eff_strength > ai_r2_eff_strength: r2_winner = "Player"
-        elif ai_r2_eff_strength > player_r2_eff_strength: r2_winner = "AI"
-        
-        game_winner = r2_winner # In this version, R2 winner is game winner
+                # Deployments are validated item by item as the body streams in, so the raw body
+                # and the parsed list are never in memory whole
+                with phase('parse'):
+                    body = JSONObjectStream(request.stream, MAX_R2_BODY_BYTES, stream_keys=(deployments_key,))
+                    for key, value in body.members():
+                        if key == 'game_id' and validator is None: # A repeated game_id is ignored
+                            # --- Game State from the Server-side Game Store ---
+                            game_id = value
+                            if not isinstance(game_id, str) or not game_id:
+                                return jsonify({'error': 'Missing game_id from Round 1.'}), 400
+                            # Taken out of the store while the round is played, so a second
+                            # submission of the same round cannot play it too (it finds no game)
+                            held = game_state = game_store.pop(game_id)
+                            if game_state is None:
+                                return jsonify({'error': f'Unknown or expired game_id {game_id}.'}), 404
+                            conflict = _round_conflict(game_state, round_number)
+                            if conflict is not None:
+                                return conflict
+                            validator = engine.round_validator(game_state)
+                            validator.add_many(pending)
+                            pending = None
+                        elif key == deployments_key:
+                            deployments_seen = hasattr(value, '__next__') # Only an array value comes back as an iterator
+                            if not deployments_seen:
+                                continue
+                            if validator is None: pending.extend(value)
+                            else: validator.add_many(value)
+            except PayloadTooLarge as e:
+                return jsonify({'error': str(e)}), 413
+            except JSONStreamError:
+                return jsonify({'error': 'Invalid request, no JSON data received.'}), 400
+            if validator is None:
+                return jsonify({'error': 'Missing game_id from Round 1.'}), 400
+
+            # --- Player Deployment Validation (cross-item checks) ---
+            try:
+                with phase('validate'):
+                    if not deployments_seen:
+                        validator.invalid_format()
+                    validated_player_deployments, player_total_deployed_count = validator.finish()
+            except DeploymentError as e:
+                return jsonify({'error': str(e), 'errors': e.errors, 'error_count': e.error_count}), 400
+            held = None # From here the round changes the state; a failure loses the game rather than storing half a round
+        finally:
+            if held is not None:
+                game_store.put(game_id, held)
+
+        # --- AI Deployment, Map Update and Combat ---
+        results = engine.play_round(game_state, validated_player_deployments, player_total_deployed_count,
+                                    round_rng(game_state['seed'], round_number))
+
+        payload = {
+            f'round_{round_number}_results': {
+                'player_army_summary_for_combat': results['player_army'],
+                'ai_army_summary_for_combat': results['ai_army'],
+                'round_winner': results['round_winner']
+            },
+            f'player_r{round_number}_deployments': results['player_deployments'],
+            f'ai_r{round_number}_deployments': results['ai_deployments'],
+            **{key: results[key] for key in ('spatial_combat', 'moves') if key in results}
+        }
+        if 'game_winner' in results:
+            # Game is over; its state stays out of the store so the id cannot be replayed.
+            record = GameRecord.from_game(game_id, game_state, results, engine)
+            balance_stats.record(record)
+            if game_log is not None:
+                game_log.append(record) # Written off the request thread
+            payload['game_winner'] = results['game_winner']
+            map_key = 'final_map_state'
+        else:
+            # Finished rounds go to the game log rather than the state, so the stored game
+            # stays the same size however many rounds it has played
+            if game_log is not None:
+                game_log.append(RoundRecord.from_round(game_id, results, engine))
+            game_store.put(game_id, game_state)
+            next_round = round_number + 1
+            payload[f'player_r{next_round}_data'] = results['player_next_data']
+            payload[f'ai_r{next_round}_data_for_r{next_round}'] = results['ai_next_data']
+            map_key = 'current_map_state'
+        # Deltas are against the map as the player was shown it after the previous round
+        return make_round_response(payload, map_key,
+                                   player_view(payload, results['map'], results.get('visibility'), f'ai_r{round_number}_deployments'),
+                                   results['map_changes'])
 
+    except Exception as e:
+        current_app.logger.error(f"Error in {route}: {str(e)}")
+        record_error(route)
+        import traceback
+        current_app.logger.error(traceback.format_exc())
+        return jsonify({'error': 'An unexpected error occurred on the server.'}), 500
+
+def _round_conflict(game_state, round_number):
+    # A 409 response if the game is not waiting for round_number, else None
+    if game_state['round'] != round_number - 1:
+        return jsonify({'error': f'This game is waiting for round {game_state["round"] + 1}, not round {round_number}.'}), 409
+    return None
+
+@game.route('/balance_stats')
+def get_balance_stats():
+    """
+    Balance analytics for games finished in this worker: per-matchup win rates and strength
+    differences, bonus troops and R1/R2 winner correlation. ?windows=N limits it to the last N windows.
+    """
+    windows = request.args.get('windows', type=int)
+    if windows is not None and windows < 1:
+        return jsonify({'error': 'windows must be a positive integer.'}), 400
+    return jsonify(balance_stats.snapshot(windows))
+
+@game.route('/simulate_batch', methods=['POST'])
+def simulate_batch():
+    """
+    Resolves many matchups in one call. Body is columnar:
+    {"player_types": [...], "player_counts": [...], "ai_types": [...], "ai_counts": [...]}
+    Response uses the same columnar layout: player_strength, ai_strength, winner, bonus_troops.
+    """
+    try:
+        with phase('parse'):
+            data = request.get_json(silent=True)
+        if not data: return jsonify({'error': 'Invalid request, no JSON data received.'}), 400
+
+        columns = [data.get('player_types'), data.get('player_counts'), data.get('ai_types'), data.get('ai_counts')]
+        if not all(isinstance(column, list) for column in columns):
+            return jsonify({'error': 'player_types, player_counts, ai_types and ai_counts must be lists.'}), 400
+        player_types, player_counts, ai_types, ai_counts = columns
+        if len({len(column) for column in columns}) != 1:
+            return jsonify({'error': 'All matchup columns must have the same length.'}), 400
+        if len(player_types) > MAX_BATCH_MATCHUPS:
+            return jsonify({'error': f'Too many matchups ({len(player_types)}); the limit is {MAX_BATCH_MATCHUPS}.'}), 400
+
+        engine = combat_engine # Stays consistent if the unit config reloads meanwhile
+        try:
+            player_type_codes = engine.encode_types(player_types)
+            ai_type_codes = engine.encode_types(ai_types)
+        except (KeyError, TypeError) as e:
+            return jsonify({'error': f'Invalid unit_type: {e}.'}), 400
+        for count in player_counts + ai_counts:
+            if type(count) is not int or count < 0:
+                return jsonify({'error': f'Invalid unit count: {count}. Counts must be non-negative integers.'}), 400
+            if count > engine.max_count:
+                return jsonify({'error': f'Unit count {count} is too large; the limit is {engine.max_count}.'}), 400
+
+        result = engine.resolve_batch(player_type_codes, player_counts, ai_type_codes, ai_counts)
         return jsonify({
-            'round_2_results': {
-                'player_army_summary_for_combat': {'type': player_r2_combat_unit_type, 'count': player_r2_combat_total_count, 'strength': player_r2_eff_strength},
-                'ai_army_summary_for_combat': {'type': ai_r2_combat_unit_type, 'count': ai_r2_combat_total_count, 'strength': ai_r2_eff_strength},
-                'round_winner': r2_winner
-            },
-            'player_r2_deployments': validated_player_r2_deployments,
-            'ai_r2_deployments': ai_r2_deployments,
-            'final_map_state': final_map_state,
-            'game_winner': game_winner
+            'player_strength': result.player_strength.tolist(),
+            'ai_strength': result.ai_strength.tolist(),
+            'winner': [WINNER_NAMES[winner] for winner in result.winner],
+            'bonus_troops': result.bonus_troops.tolist()
         })
 
     except Exception as e:
-        app.logger.error(f"Error in /submit_round_2: {str(e)}")
+        current_app.logger.error(f"Error in /simulate_batch: {str(e)}")
+        record_error('/simulate_batch')
         import traceback
-        app.logger.error(traceback.format_exc())
+        current_app.logger.error(traceback.format_exc())
         return jsonify({'error': 'An unexpected error occurred on the server.'}), 500
 
+def create_app():
+    """
+    App factory. Module-level state (game engine, game store, combat tables) is built once at
+    import, so a pre-forking server that calls this before forking shares it with every worker.
+    """
+    app = Flask(__name__, static_folder='static')
+    # Registered first so its after_request hook runs last and sees the final response
+    instrumentation.init_app(app)
+    # PROFILER_TOKEN turns on /admin/profile and X-Profile request tracing (see profiler)
+    if os.environ.get('PROFILER_TOKEN'):
+        profiler.init_app(app, os.environ['PROFILER_TOKEN'])
+    app.register_blueprint(game)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Development server only; use serve.py for multi-worker serving
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=5000)
@@ -0,0 +1,383 @@
+"""
+Load generator: many concurrent asyncio clients each playing full R1 -> R2 games over HTTP,
+the same way static/script.js does (sparse map Accept header, game_id hand-off, ?delta=1 on R2).
+Run from src/:
+    python loadgen.py --clients 2000 --duration 30                      # starts serve.py locally
+    python loadgen.py --clients 2000 --games 20000 --server werkzeug    # compare with the dev server
+    python loadgen.py --url http://127.0.0.1:8000 --clients 500         # an already running server
+
+Clients share a pool of --connections keep-alive connections, like browsers share a per-host
+connection limit. Latency is measured from when a client issues a request until it has the
+full body, so it includes time spent waiting for a free connection.
+Reports throughput, p50/p95/p99 latency per endpoint and error rates; --json writes them out.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from collections import deque
+from urllib.parse import urlsplit
+
+from game_engine import VALID_UNIT_TYPES
+
+ROUND_ACCEPT_HEADER = 'application/vnd.rts.sparse+json, application/vnd.rts.map+octet-stream;q=0.9, application/json;q=0.5'
+ENDPOINTS = ('/submit_round_1', '/submit_round_2')
+
+
+class HTTPError(Exception):
+    """Transport-level failure: connection refused/reset, timeout or a malformed response."""
+
+
+class Connection:
+    """Minimal HTTP/1.1 client connection with keep-alive over asyncio streams."""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b'', headers=()):
+        """Returns (status, headers dict with lower-case names, decoded body bytes)."""
+        try:
+            return await asyncio.wait_for(self._request(method, path, body, headers), self.timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise HTTPError('timeout')
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self.close()
+            raise HTTPError(type(e).__name__)
+
+    async def _request(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        head.extend(f'{name}: {value}' for name, value in headers)
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ValueError('connection closed before response')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read() # Delimited by the server closing the connection
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+
+        encoding = response_headers.get('content-encoding')
+        if encoding == 'gzip':
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            data = zlib.decompress(data)
+        return status, response_headers, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class ConnectionPool:
+    """
+    At most `size` connections to one host; requests wait for a free one in FIFO order.
+    A released connection is handed straight to the oldest waiter (asyncio.Queue would let a
+    newly arriving request take it first, starving some clients for the whole run).
+    """
+
+    def __init__(self, host, port, size, timeout):
+        self._free = [Connection(host, port, timeout) for _ in range(size)]
+        self._all = list(self._free)
+        self._waiters = deque()
+
+    async def request(self, method, path, body=b'', headers=()):
+        if self._free:
+            connection = self._free.pop()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            connection = await waiter
+        try:
+            return await connection.request(method, path, body, headers)
+        finally:
+            self._release(connection)
+
+    def _release(self, connection):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done(): # Skip waiters that were cancelled
+                waiter.set_result(connection)
+                return
+        self._free.append(connection)
+
+    def close(self):
+        for connection in self._all:
+            connection.close()
+
+
+class LoadStats:
+    """Per-endpoint latencies, status codes and transport errors."""
+
+    def __init__(self):
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.statuses = {endpoint: {} for endpoint in ENDPOINTS}
+        self.errors = {endpoint: {} for endpoint in ENDPOINTS}
+        self.games_completed = 0
+        self.games_failed = 0
+
+    def record(self, endpoint, seconds, status=None, error=None):
+        self.latencies[endpoint].append(seconds)
+        if error is not None:
+            self.errors[endpoint][error] = self.errors[endpoint].get(error, 0) + 1
+        else:
+            key = str(status)
+            self.statuses[endpoint][key] = self.statuses[endpoint].get(key, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            latencies = sorted(self.latencies[endpoint])
+            requests = len(latencies)
+            failed = sum(self.errors[endpoint].values()) + \
+                sum(n for status, n in self.statuses[endpoint].items() if not status.startswith('2'))
+            endpoints[endpoint] = {
+                'requests': requests,
+                'throughput_rps': requests / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(latencies, 50) * 1e3,
+                'p95_ms': percentile(latencies, 95) * 1e3,
+                'p99_ms': percentile(latencies, 99) * 1e3,
+                'max_ms': (latencies[-1] if latencies else 0.0) * 1e3,
+                'error_rate': failed / requests if requests else 0.0,
+                'statuses': self.statuses[endpoint],
+                'errors': self.errors[endpoint]
+            }
+        return {
+            'elapsed_s': elapsed,
+            'games_completed': self.games_completed,
+            'games_failed': self.games_failed,
+            'games_per_s': self.games_completed / elapsed if elapsed else 0.0,
+            'endpoints': endpoints
+        }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list; 0.0 when empty."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100)) # ceil without floats
+    return sorted_values[int(rank) - 1]
+
+
+def occupied_cells(map_state):
+    """Set of (x, y) holding units, from either the sparse or the dense JSON map encoding."""
+    if isinstance(map_state, dict):
+        cells = map_state['cells']
+        return {(cells[i], cells[i + 1]) for i in range(0, len(cells), 5)}
+    return {(x, y) for x, column in enumerate(map_state) for y, cell in enumerate(column) if cell is not None}
+
+
+def map_size(map_state):
+    return map_state['size'] if isinstance(map_state, dict) else len(map_state)
+
+
+def build_r2_deployments(r1, rng, max_groups=5):
+    """
+    A valid R2 deployment for an R1 response: the whole total_r2_pool split into up to
+    max_groups stacks of random unit types, each on a distinct cell left free by R1.
+    """
+    pool = r1['player_r2_data']['total_r2_pool']
+    map_state = r1['current_map_state']
+    unit_types = map_state['unit_types'] if isinstance(map_state, dict) else VALID_UNIT_TYPES # Sparse maps carry the server's set
+    size = map_size(map_state)
+    occupied = occupied_cells(map_state)
+    free = [(x, y) for x in range(size) for y in range(size) if (x, y) not in occupied]
+    groups = min(pool, max_groups, len(free))
+    if groups <= 0:
+        return []
+    # Split pool into `groups` positive counts
+    cuts = sorted(rng.sample(range(1, pool), groups - 1)) if groups > 1 else []
+    counts = [b - a for a, b in zip([0] + cuts, cuts + [pool])]
+    return [{'unit_type': rng.choice(unit_types), 'unit_count': count, 'x': x, 'y': y}
+            for count, (x, y) in zip(counts, rng.sample(free, groups))]
+
+
+async def timed_post(pool, stats, endpoint, path, payload):
+    """POSTs JSON, records the outcome, and returns the parsed body for a 200 (else None)."""
+    body = json.dumps(payload).encode('utf-8')
+    headers = (('Content-Type', 'application/json'), ('Accept', ROUND_ACCEPT_HEADER), ('Accept-Encoding', 'gzip, deflate'))
+    start = time.perf_counter()
+    try:
+        status, _, data = await pool.request('POST', path, body, headers)
+    except HTTPError as e:
+        stats.record(endpoint, time.perf_counter() - start, error=str(e))
+        return None
+    stats.record(endpoint, time.perf_counter() - start, status=status)
+    return json.loads(data) if status == 200 else None
+
+
+async def play_game(pool, stats, rng):
+    r1 = await timed_post(pool, stats, '/submit_round_1', '/submit_round_1', {})
+    if r1 is None:
+        stats.games_failed += 1
+        return
+    payload = {'game_id': r1['game_id'], 'player_deployments_r2': build_r2_deployments(r1, rng)}
+    r2 = await timed_post(pool, stats, '/submit_round_2', '/submit_round_2?delta=1', payload)
+    if r2 is None:
+        stats.games_failed += 1
+    else:
+        stats.games_completed += 1
+
+
+async def client_loop(pool, stats, rng, should_continue, think_time):
+    while should_continue():
+        await play_game(pool, stats, rng)
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+
+async def run_load(host, port, clients, connections, games=None, duration=None, think_time=0.0, timeout=30.0, seed=None):
+    """
+    Runs `clients` concurrent game loops until `games` games have started or `duration` seconds
+    have passed (whichever is given; both may be). Returns LoadStats.summary().
+    """
+    if games is None and duration is None:
+        raise ValueError('Give games and/or duration.')
+    pool = ConnectionPool(host, port, connections, timeout)
+    stats = LoadStats()
+    started = 0
+    deadline = time.monotonic() + duration if duration is not None else None
+
+    def should_continue():
+        nonlocal started
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        if games is not None and started >= games:
+            return False
+        started += 1
+        return True
+
+    base_rng = random.Random(seed)
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(client_loop(pool, stats, random.Random(base_rng.random()), should_continue, think_time)
+                               for _ in range(clients)))
+    finally:
+        pool.close()
+    return stats.summary(time.perf_counter() - start)
+
+
+# --- Local server management ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(kind, port, workers, threads):
+    """Starts serve.py or the threaded Werkzeug dev server as a subprocess on 127.0.0.1:port."""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    if kind == 'serve':
+        command = [sys.executable, 'serve.py', '--port', str(port), '--workers', str(workers), '--threads', str(threads)]
+    elif kind == 'werkzeug':
+        command = [sys.executable, '-c', f"from launch import app; app.logger.disabled = True; app.run(port={port}, threaded=True)"]
+    else:
+        raise ValueError(f'Unknown server kind {kind!r}.')
+    process = subprocess.Popen(command, cwd=src_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} server exited with status {process.returncode}.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start listening on port {port}.')
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(35)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def format_table(summary):
+    lines = [f"{'endpoint':<18} {'requests':>9} {'req/s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'errors':>8}"]
+    for endpoint, s in summary['endpoints'].items():
+        lines.append(f"{endpoint:<18} {s['requests']:>9} {s['throughput_rps']:>9.1f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                     f"{s['p99_ms']:>9.2f} {s['max_ms']:>9.2f} {s['error_rate']:>8.2%}")
+    lines.append(f"games: {summary['games_completed']} completed, {summary['games_failed']} failed, "
+                 f"{summary['games_per_s']:.1f} games/s over {summary['elapsed_s']:.1f} s")
+    for endpoint, s in summary['endpoints'].items():
+        problems = dict(s['errors'], **{f'HTTP {k}': v for k, v in s['statuses'].items() if not k.startswith('2')})
+        if problems:
+            lines.append(f'{endpoint} failures: ' + ', '.join(f'{k}={v}' for k, v in sorted(problems.items())))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent full-game load generator.')
+    parser.add_argument('--url', help='Target an already running server instead of starting one.')
+    parser.add_argument('--server', choices=('serve', 'werkzeug'), default='serve', help='Local server to start when --url is not given.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='serve.py workers.')
+    parser.add_argument('--threads', type=int, default=8, help='serve.py threads per worker.')
+    parser.add_argument('--clients', type=int, default=1000, help='Concurrent simulated players.')
+    parser.add_argument('--connections', type=int, default=64, help='Shared keep-alive connections.')
+    parser.add_argument('--games', type=int, help='Stop after this many games.')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds (default 10 if --games is not given).')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean seconds a client pauses between games.')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', help='Also write the summary to this JSON file.')
+    args = parser.parse_args(argv)
+    if args.games is None and args.duration is None:
+        args.duration = 10.0
+
+    process = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        label = args.url
+    else:
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.server, port, args.workers, args.threads)
+        label = f'{args.server}' + (f' ({args.workers} workers x {args.threads} threads)' if args.server == 'serve' else '')
+    try:
+        summary = asyncio.run(run_load(host, port, args.clients, args.connections, args.games, args.duration,
+                                       args.think_time, args.timeout, args.seed))
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    summary['target'] = label
+    summary['clients'] = args.clients
+    summary['connections'] = args.connections
+    print(f'target: {label}, {args.clients} clients over {args.connections} connections')
+    print(format_table(summary))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
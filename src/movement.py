@@ -0,0 +1,188 @@
+"""
+Movement phase: every stack walks toward the nearest enemy stack, up to its unit type's
+move_range, and stops once it is next to one.
+
+Paths come from one shared distance field per side rather than a search per stack: a
+breadth-first flood from all enemy stacks at once, run on bitboards (see bitboard) so each
+BFS level is a handful of whole-grid shifts in C. Occupied cells are reached but block the
+flood. The flood stops as soon as every stack of the moving side has been reached. Only the
+levels some stack can walk through (the max_range levels below a stack's distance) are kept,
+and each is turned into bytes on first use so checking whether a neighbouring cell is one
+step closer is O(1). Fields are cached by the exact occupancy they
+were computed from, so a field is only rebuilt when occupancy changes.
+
+Stacks then move in one pass, closest to the enemy first, each stepping to any free
+neighbouring cell one level closer until its range runs out, no such cell is free, or an
+enemy (possibly one that moved earlier in the pass) is next to it.
+"""
+import threading
+from collections import OrderedDict
+
+from bitboard import AI_CODE, PLAYER_CODE, board_bytes, board_cells, neighbours, owner_boards, valid_mask
+
+DEFAULT_MOVE_RANGE = 1
+FIELD_CACHE_SIZE = 16
+
+
+class DistanceField:
+    """
+    BFS distances from a set of target cells.
+    - levels: List of boards; levels[d] holds the cells at distance d (levels[0] = targets),
+      or None for a level no stack can reach with its move range.
+    - distances: Dict of flat cell index -> distance for every reached non-target stack.
+    """
+
+    __slots__ = ('size', 'levels', 'distances', '_level_bytes', '_lock')
+
+    def __init__(self, size, levels, distances):
+        self.size = size
+        self.levels = levels
+        self.distances = distances
+        self._level_bytes = {}
+        self._lock = threading.Lock()
+
+    def level_bytes(self, distance):
+        """levels[distance] as bytes; bit b of the board is bit b % 8 of byte b // 8."""
+        data = self._level_bytes.get(distance)
+        if data is None:
+            with self._lock: # Cached fields are shared between request threads
+                data = self._level_bytes.get(distance)
+                if data is None:
+                    data = self._level_bytes[distance] = self.levels[distance].to_bytes(board_bytes(self.size), 'little')
+        return data
+
+    def at_distance(self, cell, distance):
+        """True if flat cell index cell is exactly distance steps from the targets."""
+        if not 0 <= distance < len(self.levels) or self.levels[distance] is None:
+            return False
+        bit = cell + cell // self.size
+        return (self.level_bytes(distance)[bit >> 3] >> (bit & 7)) & 1 == 1
+
+
+def compute_distance_field(size, targets, occupied, max_range=None):
+    """
+    Floods outward from the targets board through free cells.
+    - targets: Board of the cells to walk toward.
+    - occupied: Board of every occupied cell (targets included); these block the flood.
+    - max_range: Optional longest move range. Levels more than this below every stack's
+      distance are dropped, so a far-away stack does not keep hundreds of boards alive.
+    The flood ends once every occupied non-target cell is reached, or nothing new is reachable.
+    """
+    width = size + 1
+    valid = valid_mask(size)
+    unvisited = valid & ~targets
+    passable = valid & ~occupied
+    remaining = occupied & ~targets # Stacks still waiting for their distance
+    levels = [targets]
+    distances = {}
+    pinned = set() # Levels a stack found so far may walk through
+    frontier = targets
+    while remaining and frontier:
+        reached = neighbours(frontier, width) & unvisited
+        if not reached:
+            break
+        unvisited ^= reached
+        levels.append(reached)
+        distance = len(levels) - 1
+        stacks = reached & remaining
+        if stacks:
+            for cell in board_cells(stacks, size):
+                distances[cell] = distance
+            remaining ^= stacks
+            if max_range is not None:
+                pinned.update(range(max(0, distance - max_range), distance))
+        if max_range is not None:
+            # The level leaving the window of the last max_range levels is only kept if pinned
+            leaving = distance - max_range
+            if leaving >= 0 and leaving not in pinned:
+                levels[leaving] = None
+        frontier = reached & passable
+    return DistanceField(size, levels, distances)
+
+
+class MovementPhase:
+    """
+    Moves stacks on a GameMap toward the enemy.
+    - move_ranges: Dict of unit type name -> cells per phase; unknown types use DEFAULT_MOVE_RANGE.
+    - cache_size: Integer, distance fields kept (LRU), keyed by targets and occupancy.
+    """
+
+    def __init__(self, move_ranges, cache_size=FIELD_CACHE_SIZE):
+        self.move_ranges = dict(move_ranges)
+        self.max_range = max(self.move_ranges.values(), default=DEFAULT_MOVE_RANGE)
+        self.cache_size = cache_size
+        self._fields = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def distance_field(self, size, targets, occupied):
+        """The DistanceField for these boards, from the cache if occupancy has not changed."""
+        key = (size, targets, occupied)
+        with self._lock:
+            field = self._fields.get(key)
+            if field is not None:
+                self._fields.move_to_end(key)
+                self.hits += 1
+                return field
+        field = compute_distance_field(size, targets, occupied, max(self.max_range, DEFAULT_MOVE_RANGE))
+        with self._lock:
+            self.misses += 1
+            self._fields[key] = field
+            while len(self._fields) > self.cache_size:
+                self._fields.popitem(last=False)
+        return field
+
+    def move(self, game_map):
+        """
+        Runs one movement phase on game_map in place.
+        Returns a list of (from_cell, to_cell) flat cell indexes for the stacks that moved.
+        """
+        size = game_map.size
+        boards, _ = owner_boards(game_map)
+        occupied = boards[PLAYER_CODE] | boards[AI_CODE]
+        if not boards[PLAYER_CODE] or not boards[AI_CODE]:
+            return [] # Nothing to walk toward
+        fields = {
+            PLAYER_CODE: self.distance_field(size, boards[AI_CODE], occupied),
+            AI_CODE: self.distance_field(size, boards[PLAYER_CODE], occupied)
+        }
+        ranges = [self.move_ranges.get(unit_type, DEFAULT_MOVE_RANGE) for unit_type in game_map.unit_types]
+
+        owner_by_cell = {cell: owner_code for cell, owner_code, _, _ in game_map.iter_codes()}
+        movers = []
+        for field in fields.values():
+            for cell, distance in field.distances.items():
+                if distance > 1: # 1 is already next to an enemy
+                    movers.append((distance, cell, field))
+        movers.sort(key=lambda mover: (mover[0], mover[1]))
+
+        moves = []
+        for distance, cell, field in movers:
+            owner_code, type_code, _ = game_map.codes_at(cell)
+            steps = ranges[type_code]
+            position = cell
+            while steps and distance > 1:
+                closer = field.level_bytes(distance - 1)
+                x, y = divmod(position, size)
+                step = None
+                for neighbour, row, valid in ((position - size, x - 1, x > 0), (position + size, x + 1, x < size - 1),
+                                              (position - 1, x, y > 0), (position + 1, x, y < size - 1)):
+                    if not valid:
+                        continue
+                    other = owner_by_cell.get(neighbour)
+                    if other is None:
+                        bit = neighbour + row # Padded board position
+                        if step is None and (closer[bit >> 3] >> (bit & 7)) & 1:
+                            step = neighbour
+                    elif other != owner_code:
+                        step = None # Engaged; an enemy moved up this pass
+                        break
+                if step is None:
+                    break # Engaged or blocked; stays where it got to
+                position, distance, steps = step, distance - 1, steps - 1
+            if position != cell:
+                game_map.move(cell, position)
+                del owner_by_cell[cell]
+                owner_by_cell[position] = owner_code
+                moves.append((cell, position))
+        return moves
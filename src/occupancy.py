@@ -0,0 +1,106 @@
+import random
+
+
+class OccupancyGrid:
+    """
+    Occupied/free flags for a square map, one byte per cell in a flat bytearray.
+    Cell (x, y) lives at index x * size + y, matching game_map[x][y].
+    - size: Integer, side length of the map.
+    - occupied: Optional iterable of (x, y) tuples to mark occupied up front.
+    Membership tests are O(1) and a 2048x2048 grid costs 4 MB, so the grid can
+    be copied per request instead of rebuilding coordinate sets.
+    """
+
+    __slots__ = ('size', 'occupied_count', '_cells')
+
+    def __init__(self, size, occupied=()):
+        self.size = size
+        self.occupied_count = 0
+        self._cells = bytearray(size * size)
+        for x, y in occupied:
+            self.occupy(x, y)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def __contains__(self, coord):
+        x, y = coord
+        return self.in_bounds(x, y) and self._cells[x * self.size + y] != 0
+
+    def __len__(self):
+        return self.occupied_count
+
+    def __iter__(self):
+        # Walks occupied cells only; bytearray.find skips free runs at C speed.
+        cells, size = self._cells, self.size
+        idx = cells.find(1)
+        while idx != -1:
+            yield divmod(idx, size)
+            idx = cells.find(1, idx + 1)
+
+    @property
+    def free_count(self):
+        return self.size * self.size - self.occupied_count
+
+    def occupy(self, x, y):
+        """Marks (x, y) occupied. Returns False if it already was."""
+        idx = x * self.size + y
+        if self._cells[idx]:
+            return False
+        self._cells[idx] = 1
+        self.occupied_count += 1
+        return True
+
+    def vacate(self, x, y):
+        """Marks (x, y) free. Returns False if it already was."""
+        idx = x * self.size + y
+        if not self._cells[idx]:
+            return False
+        self._cells[idx] = 0
+        self.occupied_count -= 1
+        return True
+
+    def copy(self):
+        clone = OccupancyGrid.__new__(OccupancyGrid)
+        clone.size = self.size
+        clone.occupied_count = self.occupied_count
+        clone._cells = bytearray(self._cells)
+        return clone
+
+    def free_cells(self):
+        """Lists every free (x, y). O(map area); prefer sample_free_cells."""
+        cells, size = self._cells, self.size
+        result = []
+        idx = cells.find(0)
+        while idx != -1:
+            result.append(divmod(idx, size))
+            idx = cells.find(0, idx + 1)
+        return result
+
+    def sample_free_cells(self, k, rng=random):
+        """
+        Picks min(k, free_count) distinct free cells uniformly at random, in random order.
+        Does not mark them occupied.
+        While at least half the map is free and k is at most half the free cells,
+        rejection sampling needs at most ~4 draws per cell, so the cost grows with k,
+        not with the map area. Otherwise it falls back to listing the free cells. That
+        only happens when the area is within a small factor of the occupied cells or of k.
+        """
+        area = self.size * self.size
+        free = self.free_count
+        k = min(k, free)
+        if k <= 0:
+            return []
+        if free * 2 < area or k * 2 > free:
+            return rng.sample(self.free_cells(), k)
+
+        cells, size = self._cells, self.size
+        picked = []
+        seen = set()
+        while len(picked) < k:
+            idx = rng.randrange(area)
+            if cells[idx] or idx in seen:
+                continue
+            seen.add(idx)
+            picked.append(divmod(idx, size))
+        return picked
@@ -0,0 +1,209 @@
+"""
+On-demand profiling for a running server, in collapsed-stack format: one line per distinct
+stack, frames root to leaf separated by ';', then a space and a weight. flamegraph.pl,
+speedscope and most flamegraph tools read it directly.
+
+Two ways in, both opt-in (the token in PROFILER_TOKEN) and off the request path otherwise:
+- GET /admin/profile?seconds=10&hz=100 with "Authorization: Bearer <token>" samples every
+  thread's stack in this worker for that long and returns how many samples each stack got.
+  The profile request itself waits in one worker thread, so with serve.py the worker needs
+  --threads 2 or more for the profile to see anything else.
+- Any request sent with "X-Profile: <token>" is traced call by call on its own thread, and its
+  response is replaced by its stacks weighted by wall time in microseconds. The original status
+  code is kept in X-Profile-Status. Tracing slows the profiled request down (Python function
+  calls cost several times more), so compare stacks with each other, not with normal latency.
+
+Without PROFILER_TOKEN neither route nor hook is installed.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 60
+DEFAULT_HZ = 100
+MAX_HZ = 1000
+SAMPLING_SWITCH_INTERVAL = 0.0001 # Seconds; see sample()
+PROFILE_HEADER = 'X-Profile'
+
+
+def frame_label(code, labels):
+    """'function (file.py:line)' for a code object, cached in labels."""
+    label = labels.get(code)
+    if label is None:
+        # ';' separates frames and the last ' ' the weight; neither may appear inside a name
+        label = labels[code] = f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+    return label
+
+def _stack(frame, labels):
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame.f_code, labels))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def collapse(weights):
+    """Collapsed-stack text from {tuple of frame labels, root first: weight}, heaviest first."""
+    lines = [f'{";".join(stack)} {weight}' for stack, weight in sorted(weights.items(), key=lambda item: (-item[1], item[0])) if weight]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def sample(seconds, hz, clock=time.perf_counter, sleep=time.sleep):
+    """
+    Samples the stacks of every thread but the calling one, hz times a second for seconds.
+    Each stack starts with its thread's name. Returns {stack tuple: samples}.
+
+    A sample is taken when the sampling thread gets the GIL. With the default 5 ms switch
+    interval a busy thread mostly hands it over when it blocks in a system call, which piles the
+    samples onto I/O; so while sampling, the switch interval is cut to SAMPLING_SWITCH_INTERVAL
+    and the sampler gets the GIL close to when it asks for it.
+    """
+    me = threading.get_ident()
+    labels, counts = {}, {}
+    interval = 1.0 / hz
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(min(switch_interval, SAMPLING_SWITCH_INTERVAL))
+    try:
+        deadline = clock() + seconds
+        next_sample = clock()
+        while next_sample < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stack = tuple([names.get(ident, f'thread {ident}')] + _stack(frame, labels))
+                    counts[stack] = counts.get(stack, 0) + 1
+            next_sample += interval
+            delay = next_sample - clock()
+            if delay > 0:
+                sleep(delay)
+            else:
+                next_sample = clock() # Fell behind; carry on at the rate we can manage
+    finally:
+        sys.setswitchinterval(switch_interval)
+    return counts
+
+
+class RequestProfiler:
+    """
+    Wall time per stack of everything the calling thread runs between start() and stop(),
+    traced with sys.setprofile. Each call or return charges the time since the last event to the
+    stack that was running, so a stack's weight is its self time. Calls into C functions count as
+    frames of their own.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._labels = {}
+        self._nodes = {}      # (parent node, label) -> node
+        self._paths = [None]  # node -> (parent node, label); node 0 is the root
+        self._times = [0.0]   # node -> seconds
+        self._stack = [0]     # nodes of the frames currently running, innermost last
+        self._last = None
+
+    def _node(self, parent, label):
+        node = self._nodes.get((parent, label))
+        if node is None:
+            node = self._nodes[(parent, label)] = len(self._paths)
+            self._paths.append((parent, label))
+            self._times.append(0.0)
+        return node
+
+    def start(self):
+        # Frames already running when profiling starts (this one included, since setprofile
+        # reports its return) are the stack's base
+        for label in _stack(sys._getframe(), self._labels):
+            self._stack.append(self._node(self._stack[-1], label))
+        self._last = self.clock()
+        sys.setprofile(self._event)
+
+    def _event(self, frame, event, arg):
+        now = self.clock()
+        stack = self._stack
+        self._times[stack[-1]] += now - self._last
+        if event == 'call':
+            stack.append(self._node(stack[-1], frame_label(frame.f_code, self._labels)))
+        elif event == 'c_call':
+            name = getattr(arg, '__qualname__', None) or repr(arg)
+            module = getattr(arg, '__module__', None)
+            stack.append(self._node(stack[-1], (f'{module}.{name}' if module else name).replace(';', ':')))
+        elif len(stack) > 1: # 'return', 'c_return', 'c_exception'; never pop the root
+            stack.pop()
+        self._last = self.clock()
+
+    def stop(self):
+        """Stops tracing; returns {stack tuple: microseconds}."""
+        sys.setprofile(None)
+        self._times[self._stack[-1]] += self.clock() - self._last
+        weights = {}
+        for node in range(1, len(self._paths)):
+            micros = round(self._times[node] * 1e6)
+            if micros:
+                stack, parent = [], node
+                while parent:
+                    parent, label = self._paths[parent]
+                    stack.append(label)
+                weights[tuple(reversed(stack))] = micros
+        return weights
+
+
+def _token_matches(token, candidate):
+    return candidate is not None and hmac.compare_digest(candidate.encode('utf-8'), token.encode('utf-8'))
+
+
+def init_app(app, token):
+    """
+    Adds /admin/profile and the X-Profile request hooks, guarded by token.
+    Call after instrumentation.init_app and before registering routes whose after_request
+    hooks should count towards a profiled request (e.g. response compression): hooks registered
+    later run earlier, so the trace then covers them.
+    """
+    from flask import Response, jsonify, request
+
+    busy = threading.Lock() # One sampling profile per worker at a time
+
+    @app.before_request
+    def _start_request_profile():
+        candidate = request.headers.get(PROFILE_HEADER)
+        if candidate is None:
+            return None
+        if not _token_matches(token, candidate):
+            return jsonify({'error': 'Invalid profiling token.'}), 403
+        profiler = request.environ['rts.profiler'] = RequestProfiler()
+        profiler.start()
+        return None
+
+    @app.after_request
+    def _finish_request_profile(response):
+        profiler = request.environ.pop('rts.profiler', None)
+        if profiler is None:
+            return response
+        profiled = Response(collapse(profiler.stop()), mimetype='text/plain')
+        profiled.headers['X-Profile-Status'] = str(response.status_code)
+        return profiled
+
+    @app.teardown_request
+    def _stop_request_profile(exc):
+        # Unhandled exceptions skip after_request; never leave the thread traced
+        profiler = request.environ.pop('rts.profiler', None)
+        if profiler is not None:
+            sys.setprofile(None)
+
+    @app.route('/admin/profile')
+    def admin_profile():
+        authorization = request.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer ') or not _token_matches(token, authorization[len('Bearer '):]):
+            return jsonify({'error': 'Missing or invalid bearer token.'}), 401
+        seconds = request.args.get('seconds', DEFAULT_SECONDS, type=float)
+        hz = request.args.get('hz', DEFAULT_HZ, type=float)
+        if not 0 < seconds <= MAX_SECONDS or not 0 < hz <= MAX_HZ:
+            return jsonify({'error': f'seconds must be in (0, {MAX_SECONDS}] and hz in (0, {MAX_HZ}].'}), 400
+        if not busy.acquire(blocking=False):
+            return jsonify({'error': 'A profile is already running in this worker.'}), 409
+        try:
+            counts = sample(seconds, hz)
+        finally:
+            busy.release()
+        return Response(collapse(counts), mimetype='text/plain')
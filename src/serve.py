@@ -0,0 +1,498 @@
+"""
+Production entry point: a pre-forking, multi-threaded HTTP/1.1 WSGI server built on the standard library.
+Run from src/:  python serve.py --workers 8 --threads 4 --port 8000
+
+- The master binds the listening socket (with --backlog) and, with preload (the default), builds the
+  app through the factory once before forking, so every worker shares that setup copy-on-write.
+- Each worker accepts on the shared socket and handles requests on a pool of --threads threads.
+  HTTP/1.1 connections are kept alive for --keepalive seconds between requests; idle ones wait
+  in a selector rather than holding a thread.
+- Signals to the master: SIGTERM/SIGINT stop gracefully (in-flight requests finish, up to
+  --graceful-timeout); SIGHUP starts a fresh set of workers, then retires the old ones once they drain.
+  With --no-preload each worker imports the app itself, so SIGHUP also picks up code changes.
+- Games must survive R1 and R2 landing on different workers, so with more than one worker the game
+  store defaults to a shared SQLite file (GAME_STORE_PATH) unless one is configured already.
+- With AI_MODE=planner, each worker's planner pool gets the cores left over after the workers.
+"""
+import argparse
+import atexit
+import importlib
+import os
+import selectors
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler
+
+MAX_REQUEST_LINE = 65536
+REQUEST_TIMEOUT = 30 # Seconds a client may stall mid-request
+MAX_DRAIN_BYTES = 65536 # Unread body still read off to keep a connection alive; past this it is closed instead
+
+
+def load_app(target):
+    """
+    Loads a WSGI app from 'module:attribute'. 'module:factory()' calls the factory.
+    """
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name)
+    if attribute.endswith('()'):
+        return getattr(module, attribute[:-2])()
+    return getattr(module, attribute or 'app')
+
+
+class LimitedInput:
+    """wsgi.input limited to Content-Length, so an unread body can be drained before the next keep-alive request."""
+
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._rfile.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._rfile.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def worth_draining(self, status):
+        """
+        False if the unread rest of the body should go with the connection instead: the request
+        was rejected (status is the response's, e.g. '413 REQUEST ENTITY TOO LARGE'), or more than
+        MAX_DRAIN_BYTES of it is left. A client declaring a huge body then costs no reading.
+        """
+        return self.remaining <= 0 or (int(status[:3]) < 400 and self.remaining <= MAX_DRAIN_BYTES)
+
+    def drain(self):
+        """Discards the unread body. Returns False if the client went away mid-body."""
+        while self.remaining > 0:
+            if not self.read(min(self.remaining, 65536)):
+                return False
+        return True
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """
+    Notes whether the response was length-delimited before close() clears the headers, and
+    sends Connection: close when the unread body is not worth draining (see LimitedInput).
+    """
+
+    length_delimited = False
+    closes_connection = False
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        if not self.stdin.worth_draining(self.status):
+            self.closes_connection = True
+            self.headers['Connection'] = 'close'
+
+    def close(self):
+        self.length_delimited = self.headers is not None and 'Content-Length' in self.headers
+        super().close()
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    One client connection. Unlike wsgiref's handler, constructing it does not serve anything:
+    WorkerServer calls handle_one_request() each time the connection has a request waiting.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'RTSServe/1.0'
+    timeout = REQUEST_TIMEOUT # Applied to the socket while a request is being read or written
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+        # Responses are written as separate header and body sends; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def has_buffered_request(self):
+        """True if a pipelined request is already sitting in the read buffer (the selector can't see it)."""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def handle_one_request(self):
+        self.close_connection = True
+        try:
+            self.raw_requestline = self.rfile.readline(MAX_REQUEST_LINE + 1)
+        except (TimeoutError, ConnectionError):
+            return
+        if not self.raw_requestline:
+            return
+        if len(self.raw_requestline) > MAX_REQUEST_LINE:
+            self.requestline = self.request_version = self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request(): # Also decides keep-alive from the version and Connection header
+            return
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411) # Only Content-Length bodies are supported
+            self.close_connection = True
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.send_error(400, 'Invalid Content-Length')
+            self.close_connection = True
+            return
+        body = LimitedInput(self.rfile, content_length)
+
+        handler = KeepAliveServerHandler(body, self.wfile, self.get_stderr(), self.get_environ(),
+                                         multithread=self.server.threads > 1, multiprocess=True)
+        if self.request_version == 'HTTP/1.1':
+            handler.http_version = '1.1'
+        handler.request_handler = self # Used for access logging
+        handler.run(self.server.get_app())
+
+        # Without a Content-Length the client can only find the end of the body by the connection closing
+        if not handler.length_delimited or handler.closes_connection:
+            self.close_connection = True
+        elif not body.drain():
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+class WorkerServer:
+    """
+    WSGI server for one worker process, accepting on a socket the master already bound.
+    The main thread watches the listening socket and idle keep-alive connections with a selector;
+    a connection goes to the thread pool only once a request is waiting on it, so idle clients
+    don't tie up threads. While all threads are busy the worker stops accepting and leaves new
+    connections in the backlog for other workers.
+    """
+
+    def __init__(self, listen_socket, app, threads=1, keepalive_timeout=5.0, access_log=False, max_connections=1000):
+        self.listen_socket = listen_socket
+        host, port = listen_socket.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.base_environ = {
+            'SERVER_NAME': self.server_name, 'GATEWAY_INTERFACE': 'CGI/1.1', 'SERVER_PORT': str(port),
+            'REMOTE_HOST': '', 'CONTENT_LENGTH': '', 'SCRIPT_NAME': ''
+        }
+        self.application = app
+        self.threads = max(1, threads)
+        self.keepalive_timeout = keepalive_timeout
+        self.access_log = access_log
+        self.max_connections = max_connections
+        self.stopping = False
+
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix='worker')
+        self._selector = selectors.DefaultSelector()
+        self._idle = OrderedDict() # handler -> idle since, oldest first
+        self._connections = 0
+        self._in_flight = 0
+        self._accepting = False
+        self._finished = deque() # Handlers handed back by pool threads
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+    def get_app(self):
+        return self.application
+
+    def wakeup(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass # Already pending
+
+    def stop(self):
+        """Safe to call from a signal handler: stops accepting, lets in-flight requests finish."""
+        self.stopping = True
+        self.wakeup()
+
+    def serve_forever(self, graceful_timeout=30.0):
+        self.listen_socket.setblocking(False) # Several workers race to accept the same connection
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, 'wakeup')
+        self._set_accepting(True)
+        while not self.stopping:
+            for key, _ in self._selector.select(1.0):
+                if key.data == 'listen':
+                    self._accept()
+                elif key.data == 'wakeup':
+                    self._collect_finished()
+                else:
+                    self._dispatch(key.data)
+            self._close_expired_idle()
+            self._set_accepting(self._in_flight < self.threads and self._connections < self.max_connections)
+
+        # Graceful stop: no new connections or requests, wait for the in-flight ones
+        self._set_accepting(False)
+        for handler in list(self._idle):
+            self._selector.unregister(handler.connection)
+            self._close(handler)
+        self._idle.clear()
+        deadline = time.monotonic() + graceful_timeout
+        while self._in_flight and time.monotonic() < deadline:
+            self._selector.select(min(1.0, max(0.0, deadline - time.monotonic())))
+            self._collect_finished()
+        self._pool.shutdown(wait=False)
+
+    def _set_accepting(self, accepting):
+        if accepting != self._accepting:
+            if accepting:
+                self._selector.register(self.listen_socket, selectors.EVENT_READ, 'listen')
+            else:
+                self._selector.unregister(self.listen_socket)
+            self._accepting = accepting
+
+    def _accept(self):
+        try:
+            connection, client_address = self.listen_socket.accept()
+        except (BlockingIOError, InterruptedError, ConnectionAbortedError):
+            return # Another worker got it
+        connection.setblocking(True)
+        try:
+            handler = KeepAliveRequestHandler(connection, client_address, self)
+        except OSError:
+            connection.close()
+            return
+        self._connections += 1
+        self._watch_idle(handler)
+
+    def _watch_idle(self, handler):
+        self._idle[handler] = time.monotonic()
+        self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+
+    def _dispatch(self, handler):
+        self._selector.unregister(handler.connection)
+        del self._idle[handler]
+        self._in_flight += 1
+        self._pool.submit(self._serve, handler)
+
+    def _serve(self, handler):
+        # Runs on a pool thread
+        try:
+            handler.handle_one_request()
+            while not handler.close_connection and not self.stopping and handler.has_buffered_request():
+                handler.handle_one_request()
+        except Exception:
+            handler.close_connection = True
+            traceback.print_exc()
+        self._finished.append(handler)
+        self.wakeup()
+
+    def _collect_finished(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._finished:
+            handler = self._finished.popleft()
+            self._in_flight -= 1
+            if handler.close_connection or self.stopping:
+                self._close(handler)
+            else:
+                self._watch_idle(handler)
+
+    def _close_expired_idle(self):
+        cutoff = time.monotonic() - self.keepalive_timeout
+        while self._idle:
+            handler, idle_since = next(iter(self._idle.items()))
+            if idle_since > cutoff:
+                break
+            del self._idle[handler]
+            self._selector.unregister(handler.connection)
+            self._close(handler)
+
+    def _close(self, handler):
+        self._connections -= 1
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        try:
+            handler.connection.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        handler.connection.close()
+
+
+def run_worker(listen_socket, app, args):
+    """Body of a forked worker process. Never returns."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C goes to the whole group; the master coordinates shutdown
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    exit_code = 0
+    try:
+        if app is None:
+            app = load_app(args.app)
+        server = WorkerServer(listen_socket, app, args.threads, args.keepalive, args.access_log, args.max_connections)
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        server.serve_forever(args.graceful_timeout)
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        # os._exit skips atexit; run the app's exit hooks (e.g. the game log flushing its queue) first
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+class Master:
+    """Pre-forks workers, replaces ones that die, and handles reload/stop signals."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workers = {} # pid -> start time
+        self.retiring = set()
+        self.app = None
+        self.listen_socket = None
+        self._stop = False
+        self._reload = False
+
+    def log(self, message):
+        print(f'[serve {os.getpid()}] {message}', file=sys.stderr, flush=True)
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.listen_socket, self.app, self.args)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def run(self):
+        args = self.args
+        self.listen_socket = socket.create_server((args.bind, args.port), backlog=args.backlog)
+        self.listen_socket.set_inheritable(True)
+        if args.preload:
+            self.app = load_app(args.app) # Heavy setup happens once, before forking
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        self.log(f'listening on http://{args.bind}:{self.listen_socket.getsockname()[1]} '
+                 f'with {args.workers} workers x {args.threads} threads')
+        for _ in range(args.workers):
+            self.spawn_worker()
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def reload(self):
+        # New workers first so there is no gap in accepting, then drain the old generation
+        old = set(self.workers)
+        self.log(f'reloading: starting {self.args.workers} new workers')
+        for _ in range(self.args.workers):
+            self.spawn_worker()
+        for pid in old:
+            self.retiring.add(pid)
+            self._signal(pid, signal.SIGTERM)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if started is None or self._stop:
+                continue
+            self.log(f'worker {pid} exited with status {status}; restarting')
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0) # Avoid a tight crash loop
+            self.spawn_worker()
+
+    def shutdown(self):
+        self.log('stopping workers')
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout + 1.0
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+        self.reap()
+        self.listen_socket.close()
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Pre-forking multi-worker server for the game app.')
+    parser.add_argument('--app', default='launch:create_app()', help="'module:app' or 'module:factory()'.")
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=4, help='Requests handled at once per worker.')
+    parser.add_argument('--max-connections', type=int, default=1000, help='Open connections per worker, idle ones included.')
+    parser.add_argument('--backlog', type=int, default=2048, help='Listen backlog of the shared socket.')
+    parser.add_argument('--keepalive', type=float, default=5.0, help='Seconds an idle keep-alive connection is held open.')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    parser.add_argument('--no-preload', dest='preload', action='store_false', help='Import the app in each worker instead of the master.')
+    parser.add_argument('--access-log', action='store_true')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers > 1 and not os.environ.get('GAME_STORE_PATH'):
+        os.environ['GAME_STORE_PATH'] = os.path.join(tempfile.gettempdir(), f'rts_games_{args.port}.sqlite3')
+    # Workers already occupy the cores; only leftover cores go to each worker's AI planner pool
+    os.environ.setdefault('AI_PLANNER_PROCESSES', str(max(0, (os.cpu_count() or 1) // args.workers - 1)))
+    Master(args).run()
+
+
+if __name__ == '__main__':
+    main()
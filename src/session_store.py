@@ -0,0 +1,198 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class SessionBackend:
+    """
+    Interface for storing in-progress game state between rounds.
+    A backend maps a game_id (string) to a state dict. Implementations must be
+    safe to call from multiple request threads at once.
+    Swap in a file- or SQLite-backed store by subclassing this and
+    implementing get/put/delete/pop/__len__.
+    """
+
+    def new_game_id(self):
+        return uuid.uuid4().hex
+
+    def create(self, state):
+        """Stores state under a fresh game_id and returns the id."""
+        game_id = self.new_game_id()
+        self.put(game_id, state)
+        return game_id
+
+    def get(self, game_id):
+        """Returns the stored state, or None if unknown or expired."""
+        raise NotImplementedError
+
+    def put(self, game_id, state):
+        raise NotImplementedError
+
+    def delete(self, game_id):
+        """Removes the game. Deleting an unknown id is not an error."""
+        raise NotImplementedError
+
+    def pop(self, game_id):
+        """
+        Removes the game and returns its state, or None if unknown or expired.
+        Atomic: of two requests popping the same game, only one gets the state.
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionBackend):
+    """
+    Bounded in-process store with LRU + TTL eviction.
+    - max_games: Integer, hard cap on stored games. The least recently used
+      game is evicted when a new one would exceed it.
+    - ttl_seconds: Number, games not touched for this long are treated as gone.
+    - clock: Callable returning seconds, injectable for tests.
+    Entries are kept in an OrderedDict ordered by last access, so expired games
+    always sit at the front and can be swept without scanning the whole store.
+    """
+
+    def __init__(self, max_games=10000, ttl_seconds=3600, clock=time.monotonic):
+        if max_games < 1:
+            raise ValueError('max_games must be at least 1.')
+        self.max_games = max_games
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # game_id -> (last_access, state)
+        self._lock = threading.Lock()
+
+    def _sweep_expired(self, now):
+        # Oldest entries first; stop at the first one that is still fresh.
+        while self._entries:
+            game_id, (last_access, _) = next(iter(self._entries.items()))
+            if now - last_access < self.ttl_seconds:
+                break
+            del self._entries[game_id]
+
+    def get(self, game_id):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            if now - entry[0] >= self.ttl_seconds:
+                del self._entries[game_id]
+                return None
+            self._entries[game_id] = (now, entry[1])
+            self._entries.move_to_end(game_id)
+            return entry[1]
+
+    def put(self, game_id, state):
+        now = self._clock()
+        with self._lock:
+            self._sweep_expired(now)
+            self._entries[game_id] = (now, state)
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.max_games:
+                self._entries.popitem(last=False)
+
+    def delete(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def pop(self, game_id):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.pop(game_id, None)
+            if entry is None or now - entry[0] >= self.ttl_seconds:
+                return None
+            return entry[1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteSessionStore(SessionBackend):
+    """
+    Store shared by every process on one host, in a local SQLite file.
+    Multi-worker serving needs it: R1 and R2 of a game may be handled by different workers.
+    - path: String, database file path.
+    - max_games / ttl_seconds: Same eviction policy as InMemorySessionStore (least recently used first).
+    States are pickled; only the server itself writes them. Connections are opened lazily
+    per process and thread, so a store created before fork() is safe to use in the children.
+    """
+
+    def __init__(self, path, max_games=10000, ttl_seconds=3600, clock=time.time):
+        if max_games < 1:
+            raise ValueError('max_games must be at least 1.')
+        self.path = path
+        self.max_games = max_games
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, last_access REAL NOT NULL, state BLOB NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS games_last_access ON games (last_access)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL') # Games are ephemeral; no fsync per write
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, game_id):
+        now = self._clock()
+        conn = self._connection()
+        row = conn.execute('SELECT last_access, state FROM games WHERE game_id = ?', (game_id,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] >= self.ttl_seconds:
+            conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+            return None
+        conn.execute('UPDATE games SET last_access = ? WHERE game_id = ?', (now, game_id))
+        return pickle.loads(row[1])
+
+    def put(self, game_id, state):
+        now = self._clock()
+        conn = self._connection()
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM games WHERE last_access <= ?', (now - self.ttl_seconds,))
+            conn.execute('INSERT OR REPLACE INTO games (game_id, last_access, state) VALUES (?, ?, ?)', (game_id, now, blob))
+            (count,) = conn.execute('SELECT COUNT(*) FROM games').fetchone()
+            if count > self.max_games:
+                conn.execute('DELETE FROM games WHERE game_id IN (SELECT game_id FROM games ORDER BY last_access LIMIT ?)',
+                             (count - self.max_games,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, game_id):
+        self._connection().execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+
+    def pop(self, game_id):
+        now = self._clock()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE') # Takes the write lock first, so no other process reads the row in between
+        try:
+            row = conn.execute('SELECT last_access, state FROM games WHERE game_id = ?', (game_id,)).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None or now - row[0] >= self.ttl_seconds:
+            return None
+        return pickle.loads(row[1])
+
+    def __len__(self):
+        (count,) = self._connection().execute('SELECT COUNT(*) FROM games').fetchone()
+        return count
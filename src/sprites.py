@@ -0,0 +1,193 @@
+"""
+Unit sprite atlas: the unit images, scaled down to the size the map draws them at and packed
+side by side into one PNG, plus the CSS that picks a unit out of it.
+
+PNG reading and writing is done here with zlib, for the one kind of image the game ships:
+8-bit, non-interlaced greyscale, RGB or RGBA. Anything else raises ValueError.
+"""
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+CHANNELS = {0: 1, 2: 3, 6: 4} # PNG colour type -> channels (greyscale, RGB, RGBA)
+TILE_SIZE = 84 # Twice the 42px the map cells draw units at, so they stay sharp on HiDPI screens
+DISPLAY_SIZE = 42
+
+
+class Image:
+    """
+    8-bit pixels, row by row.
+    - width, height: Integers.
+    - channels: 1 (greyscale), 3 (RGB) or 4 (RGBA).
+    - pixels: bytearray of height * width * channels samples.
+    """
+
+    __slots__ = ('width', 'height', 'channels', 'pixels')
+
+    def __init__(self, width, height, channels, pixels):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.pixels = pixels
+
+    def with_channels(self, channels):
+        """Same image as RGB (3) or RGBA (4); greyscale is spread to colour, alpha added opaque."""
+        if channels == self.channels:
+            return self
+        src = self.pixels
+        if self.channels == 1:
+            rgb = bytearray(len(src) * 3)
+            for c in range(3):
+                rgb[c::3] = src
+            image = Image(self.width, self.height, 3, rgb)
+        elif self.channels == 4:
+            rgb = bytearray(len(src) // 4 * 3)
+            for c in range(3):
+                rgb[c::3] = src[c::4] # Alpha dropped; only asked for when mixing RGBA into RGB
+            image = Image(self.width, self.height, 3, rgb)
+        else:
+            image = self
+        if channels == 3:
+            return image
+        rgba = bytearray(b'\xff' * (len(image.pixels) // 3 * 4))
+        for c in range(3):
+            rgba[c::4] = image.pixels[c::3]
+        return Image(self.width, self.height, 4, rgba)
+
+
+def _add_rows(row, above):
+    # Byte-wise (row + above) mod 256 for whole rows at once: add the low 7 bits of every byte,
+    # then put back the top bits with XOR so no carry crosses into the next byte.
+    n = len(row)
+    low = int.from_bytes(b'\x7f' * n, 'big')
+    a, b = int.from_bytes(row, 'big'), int.from_bytes(above, 'big')
+    return (((a & low) + (b & low)) ^ ((a ^ b) & ~low & ((1 << 8 * n) - 1))).to_bytes(n, 'big')
+
+def _unfilter(raw, width, height, channels):
+    stride = width * channels
+    pixels = bytearray(stride * height)
+    previous = bytes(stride)
+    pos = 0
+    for y in range(height):
+        filter_type = raw[pos]
+        row = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if filter_type == 1: # Sub
+            for i in range(channels, stride):
+                row[i] = (row[i] + row[i - channels]) & 0xff
+        elif filter_type == 2: # Up
+            row = _add_rows(row, previous)
+        elif filter_type == 3: # Average
+            for i in range(stride):
+                left = row[i - channels] if i >= channels else 0
+                row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xff
+        elif filter_type == 4: # Paeth
+            for i in range(stride):
+                a = row[i - channels] if i >= channels else 0
+                b = previous[i]
+                c = previous[i - channels] if i >= channels else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+        elif filter_type != 0:
+            raise ValueError(f'Bad PNG filter type {filter_type} on row {y}.')
+        pixels[y * stride:(y + 1) * stride] = row
+        previous = row
+    return pixels
+
+def read_png(data):
+    """Image from PNG bytes."""
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError('Not a PNG file.')
+    pos, header, idat = 8, None, []
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'IDAT':
+            idat.append(body)
+        elif kind == b'IEND':
+            break
+        pos += 12 + length # length, kind, body, CRC
+    if header is None:
+        raise ValueError('PNG has no IHDR chunk.')
+    width, height, bit_depth, colour_type, _, _, interlace = header
+    if bit_depth != 8 or colour_type not in CHANNELS or interlace:
+        raise ValueError(f'Unsupported PNG: bit depth {bit_depth}, colour type {colour_type}, interlace {interlace}.')
+    channels = CHANNELS[colour_type]
+    return Image(width, height, channels, _unfilter(zlib.decompress(b''.join(idat)), width, height, channels))
+
+def _chunk(kind, body):
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+def write_png(image):
+    """PNG bytes for an Image. Rows use the Up filter, which suits flat-coloured sprites."""
+    colour_type = {channels: colour_type for colour_type, channels in CHANNELS.items()}[image.channels]
+    stride = image.width * image.channels
+    rows, previous = [], bytes(stride)
+    for y in range(image.height):
+        row = bytes(image.pixels[y * stride:(y + 1) * stride])
+        rows.append(b'\x02' + bytes((a - b) & 0xff for a, b in zip(row, previous)))
+        previous = row
+    return PNG_SIGNATURE + \
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', image.width, image.height, 8, colour_type, 0, 0, 0)) + \
+        _chunk(b'IDAT', zlib.compress(b''.join(rows), 9)) + \
+        _chunk(b'IEND', b'')
+
+def downscale(image, width, height):
+    """
+    Box-filtered resize to (width, height): each pixel averages the source pixels it covers.
+    Meant for shrinking; a dimension that grows repeats pixels instead.
+    """
+    channels, stride = image.channels, image.width * image.channels
+    xs = [(left, max(left + 1, (x + 1) * image.width // width)) for x in range(width) for left in [x * image.width // width]]
+    ys = [(top, max(top + 1, (y + 1) * image.height // height)) for y in range(height) for top in [y * image.height // height]]
+    src = image.pixels
+    out = bytearray(width * height * channels)
+    for y, (top, bottom) in enumerate(ys):
+        # Sum the covered source rows column-wise first, then average across each box
+        sums = [0] * stride
+        for row in range(top, bottom):
+            sums = [a + b for a, b in zip(sums, src[row * stride:(row + 1) * stride])]
+        base = y * width * channels
+        for x, (left, right) in enumerate(xs):
+            area = (right - left) * (bottom - top)
+            for c in range(channels):
+                out[base + x * channels + c] = (sum(sums[left * channels + c:right * channels:channels]) + area // 2) // area
+    return Image(width, height, channels, out)
+
+def build_atlas(images, tile_size=TILE_SIZE):
+    """
+    Packs images into one row of tile_size squares.
+    - images: List of (name, Image); the atlas uses RGBA if any image has alpha, else RGB.
+    Returns (atlas Image, {name: x offset in pixels}).
+    """
+    channels = 4 if any(image.channels == 4 for _, image in images) else 3
+    stride = tile_size * len(images) * channels
+    atlas = Image(tile_size * len(images), tile_size, channels, bytearray(stride * tile_size))
+    offsets = {}
+    for i, (name, image) in enumerate(images):
+        tile = downscale(image, tile_size, tile_size).with_channels(channels)
+        tile_stride = tile_size * channels
+        for y in range(tile_size):
+            start = y * stride + i * tile_stride
+            atlas.pixels[start:start + tile_stride] = tile.pixels[y * tile_stride:(y + 1) * tile_stride]
+        offsets[name] = i * tile_size
+    return atlas, offsets
+
+def atlas_css(atlas_url, offsets, tile_size=TILE_SIZE, display_size=DISPLAY_SIZE):
+    """Stylesheet with a .unit-sprite base class and one .unit-<name> class per image, drawn at display_size."""
+    scale = display_size / tile_size
+    lines = [
+        '.unit-sprite {',
+        f'    width: {display_size}px;',
+        f'    height: {display_size}px;',
+        f'    background: url({atlas_url}) no-repeat;',
+        f'    background-size: {round(tile_size * len(offsets) * scale)}px {display_size}px;',
+        '}'
+    ]
+    for name, offset in offsets.items():
+        x = round(offset * scale)
+        lines.append(f'.unit-{name} {{ background-position: {-x if x else 0}px 0; }}')
+    return '\n'.join(lines) + '\n'
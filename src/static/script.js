@@ -20,6 +20,9 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // Built pages (assets.py) draw units from one sprite atlas instead of an image per unit
+    const useUnitSprites = document.body.dataset.unitSprites !== undefined;
+
     // --- Map Grid Elements ---
     const mapGridTable = document.getElementById('map-grid');
 
@@ -70,12 +73,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let r2CurrentTotalUnits = 0;
     let R2_MAX_UNITS = 0; // Will be set after R1
 
-    // Variables to store data from R1 response for R2 request
-    let aiR1ArmyDetailsForR2 = null;
-    let aiR2DataForR2 = null;
-    let playerR1DeploymentsForR2 = null; // Player's R1 deployments also need to be sent for map reconstruction
-    let aiR1DeploymentsForR2 = null; 
-    let playerR2TotalPoolForR2 = null;
+    // R1 state is kept server-side; R2 only needs the game id handed out by R1.
+    let gameId = null;
 
     // --- Utility Functions ---
     function showMessage(message, isError = false) {
@@ -95,8 +94,114 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function renderMap(mapState) { // mapState is the 2D list from backend
+    // --- Unit Types ---
+    // The server's unit config is authoritative; UNIT_STATS and the options in index.html are the fallback.
+    function loadUnitTypes() {
+        fetch('/unit_types')
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || !Array.isArray(data.unit_types) || data.unit_types.length === 0) return;
+                const selected = r2BatchUnitTypeSelect.value;
+                r2BatchUnitTypeSelect.innerHTML = '';
+                data.unit_types.forEach(unit => {
+                    UNIT_STATS[unit.name] = Object.assign({}, UNIT_STATS[unit.name], unit);
+                    const option = document.createElement('option');
+                    option.value = unit.name;
+                    option.textContent = unit.label || unit.name;
+                    r2BatchUnitTypeSelect.appendChild(option);
+                });
+                r2BatchUnitTypeSelect.value = selected;
+                if (r2BatchUnitTypeSelect.selectedIndex < 0) r2BatchUnitTypeSelect.selectedIndex = 0;
+            })
+            .catch(error => console.error('Could not load unit types:', error));
+    }
+
+    // --- Map Wire Format Decoding ---
+    // Ask for the compact map encodings; the server falls back to the dense 2D array otherwise.
+    const ROUND_ACCEPT_HEADER = 'application/vnd.rts.sparse+json, application/vnd.rts.map+octet-stream;q=0.9, application/json;q=0.5';
+    const BINARY_MAP_MIMETYPE = 'application/vnd.rts.map+octet-stream';
+    let lastMapGrid = null; // Dense grid of the last rendered map, the base for delta updates
+
+    function decodeSparseMap(encoded, baseGrid) {
+        // encoded.cells is flat: [x, y, owner_code, type_code, count, ...]
+        const size = encoded.size;
+        const grid = (encoded.delta && baseGrid)
+            ? baseGrid.map(row => row.slice())
+            : Array.from({ length: size }, () => new Array(size).fill(null));
+        const removed = encoded.removed || [];
+        for (let i = 0; i < removed.length; i += 2) {
+            grid[removed[i]][removed[i + 1]] = null;
+        }
+        const cells = encoded.cells;
+        for (let i = 0; i < cells.length; i += 5) {
+            grid[cells[i]][cells[i + 1]] = {
+                owner: encoded.owners[cells[i + 2]],
+                unit_type: encoded.unit_types[cells[i + 3]],
+                count: cells[i + 4]
+            };
+        }
+        return grid;
+    }
+
+    function decodeBinaryResponse(buffer) {
+        // Layout matches wire_format.encode_binary: header, metadata JSON, cells, removed cells.
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+        if (magic !== 'RTSM') throw new Error('Unexpected binary map payload.');
+        const isDelta = (view.getUint8(5) & 0x01) !== 0;
+        const size = view.getUint32(8, true);
+        const metaLength = view.getUint32(12, true);
+        let offset = 16;
+        const data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset, metaLength)));
+        offset += metaLength;
+
+        const cellCount = view.getUint32(offset, true);
+        offset += 4;
+        const cells = [];
+        for (let i = 0; i < cellCount; i++, offset += 10) {
+            const cellIndex = view.getUint32(offset, true);
+            cells.push(Math.floor(cellIndex / size), cellIndex % size,
+                       view.getUint8(offset + 4), view.getUint8(offset + 5), view.getUint32(offset + 6, true));
+        }
+        const removedCount = view.getUint32(offset, true);
+        offset += 4;
+        const removed = [];
+        for (let i = 0; i < removedCount; i++, offset += 4) {
+            const cellIndex = view.getUint32(offset, true);
+            removed.push(Math.floor(cellIndex / size), cellIndex % size);
+        }
+
+        data[data.map_key] = { encoding: 'sparse', size: size, owners: data.owners, unit_types: data.unit_types,
+                               cells: cells, delta: isDelta, removed: removed };
+        return data;
+    }
+
+    async function readRoundResponse(response) {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (contentType.startsWith(BINARY_MAP_MIMETYPE)) {
+            return decodeBinaryResponse(await response.arrayBuffer());
+        }
+        return response.json();
+    }
+
+    // Fog of war: the server sends which cells the player can see as base64 bits,
+    // bit (b % 8) of byte (b / 8) for b = x * (size + 1) + y (rows are padded by one bit)
+    function decodeVisibility(visibility) {
+        if (!visibility) return null;
+        const raw = atob(visibility.bits);
+        return (x, y) => {
+            const bit = x * (visibility.size + 1) + y;
+            return (raw.charCodeAt(bit >> 3) >> (bit & 7)) & 1;
+        };
+    }
+
+    function renderMap(mapState, visibility) { // mapState is the 2D list from backend, or a sparse encoding of it
         if (!mapState) return;
+        const isVisible = decodeVisibility(visibility);
+        if (!Array.isArray(mapState)) {
+            mapState = decodeSparseMap(mapState, lastMapGrid);
+        }
+        lastMapGrid = mapState;
         for (let y = 0; y < 5; y++) {
             for (let x = 0; x < 5; x++) {
                 const cellId = `cell-${y}-${x}`; // Corrected ID format based on existing code
@@ -104,6 +209,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (cell) {
                     const cellData = mapState[y][x];
                     cell.innerHTML = ''; // Clear the cell first
+                    cell.classList.toggle('fogged', isVisible !== null && !isVisible(y, x)); // mapState[y][x]: y is the server's x
 
                     if (cellData) {
                         // Construct image filename
@@ -115,9 +221,18 @@ document.addEventListener('DOMContentLoaded', () => {
                         }
 
                         if (imageName) {
-                            const imgElement = document.createElement('img');
-                            imgElement.src = `static/images/${imageName}`; // Path to image
-                            imgElement.alt = `${cellData.owner} ${cellData.unit_type}`;
+                            let imgElement;
+                            if (useUnitSprites) {
+                                // One shared atlas image; the class picks the unit out of it
+                                imgElement = document.createElement('span');
+                                imgElement.className = `unit-sprite unit-${imageName.replace('.png', '')}`;
+                                imgElement.setAttribute('role', 'img');
+                                imgElement.setAttribute('aria-label', `${cellData.owner} ${cellData.unit_type}`);
+                            } else {
+                                imgElement = document.createElement('img');
+                                imgElement.src = `static/images/${imageName}`; // Path to image
+                                imgElement.alt = `${cellData.owner} ${cellData.unit_type}`;
+                            }
                             // Style for the image will be handled by CSS (next step)
                             // but ensure it's display block for centering if CSS handles that
                             imgElement.style.display = 'block'; 
@@ -161,6 +276,7 @@ document.addEventListener('DOMContentLoaded', () => {
     
     function resetDeploymentInputs(typeSelect, countInput, xInput, yInput) {
         typeSelect.value = 'infantry'; // Default
+        if (typeSelect.selectedIndex < 0) typeSelect.selectedIndex = 0; // Not in the server's unit config
         countInput.value = "1";
         xInput.value = "";
         yInput.value = "";
@@ -179,10 +295,10 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch('/submit_round_1', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Accept': ROUND_ACCEPT_HEADER },
                 body: JSON.stringify({}), // Send empty body for R1 fixed deployment
             });
-            const data = await response.json();
+            const data = await readRoundResponse(response);
 
             // --- Start of new defensive checks ---
             if (!data) {
@@ -205,8 +321,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 !data.ai_r1_army_details_for_r2 ||
                 !data.ai_r2_data_for_r2 ||
                 !data.current_map_state || // Also check for map state as it's crucial
-                !data.player_r1_deployments ||
-                !data.ai_r1_deployments) {
+                !data.game_id) {
                 
                 console.error("R1 Finalize Error: Malformed data received from server. One or more expected fields are missing.", data);
                 showMessage("R1 Error: Server response was incomplete or malformed. Cannot proceed.", true);
@@ -224,8 +339,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (!data.ai_r1_army_details_for_r2) console.error("Missing: data.ai_r1_army_details_for_r2");
                 if (!data.ai_r2_data_for_r2) console.error("Missing: data.ai_r2_data_for_r2");
                 if (!data.current_map_state) console.error("Missing: data.current_map_state");
-                if (!data.player_r1_deployments) console.error("Missing: data.player_r1_deployments");
-                if (!data.ai_r1_deployments) console.error("Missing: data.ai_r1_deployments");
+                if (!data.game_id) console.error("Missing: data.game_id");
 
                 startGameButton.disabled = false;
                 // r1AddBatchButton.disabled = false; // This button is removed
@@ -241,14 +355,10 @@ document.addEventListener('DOMContentLoaded', () => {
             computerR1ArmyDisplay.textContent = `Total ${r1res.ai_army.count} units`; // Simplified display
             computerR1StrengthDisplay.textContent = r1res.ai_army.strength;
             r1WinnerDisplay.textContent = r1res.round_winner;
-            renderMap(data.current_map_state); // Render R1 map
+            renderMap(data.current_map_state, data.visibility); // Render R1 map
 
             R2_MAX_UNITS = data.player_r2_data.total_r2_pool;
-            aiR1ArmyDetailsForR2 = data.ai_r1_army_details_for_r2; // Store for R2
-            aiR2DataForR2 = data.ai_r2_data_for_r2;                 // Store for R2
-            playerR1DeploymentsForR2 = data.player_r1_deployments; // Store player's R1 deployments
-            aiR1DeploymentsForR2 = data.ai_r1_deployments;
-            playerR2TotalPoolForR2 = data.player_r2_data.total_r2_pool; 
+            gameId = data.game_id; // Store for R2
 
             playerR2PoolDisplay.textContent = R2_MAX_UNITS;
             r2MaxUnitsLabel.textContent = R2_MAX_UNITS;
@@ -330,19 +440,14 @@ document.addEventListener('DOMContentLoaded', () => {
         r2AddBatchButton.disabled = true;
 
         try {
-            console.log("Submitting to /submit_round_2 payload:", JSON.stringify({ player_deployments_r2: r2Deployments, ai_r1_deployments: aiR1DeploymentsForR2, ai_r2_data_for_r2: aiR2DataForR2, player_r1_deployments: playerR1DeploymentsForR2, player_r2_total_pool: playerR2TotalPoolForR2 }, null, 2));
-            const response = await fetch('/submit_round_2', {
+            const r2Payload = { game_id: gameId, player_deployments_r2: r2Deployments };
+            console.log("Submitting to /submit_round_2 payload:", JSON.stringify(r2Payload, null, 2));
+            const response = await fetch('/submit_round_2?delta=1', { // Only cells changed since R1
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    player_deployments_r2: r2Deployments,
-                    ai_r1_deployments: aiR1DeploymentsForR2,
-                    ai_r2_data_for_r2: aiR2DataForR2,
-                    player_r1_deployments: playerR1DeploymentsForR2, 
-                    player_r2_total_pool: playerR2TotalPoolForR2 
-                }),
+                headers: { 'Content-Type': 'application/json', 'Accept': ROUND_ACCEPT_HEADER },
+                body: JSON.stringify(r2Payload),
             });
-            const data = await response.json();
+            const data = await readRoundResponse(response);
 
             if (!response.ok) { throw new Error(data.error || `HTTP error! Status: ${response.status}`); }
 
@@ -354,7 +459,7 @@ document.addEventListener('DOMContentLoaded', () => {
             r2WinnerDisplay.textContent = r2res.round_winner;
             gameWinnerDisplay.textContent = data.game_winner;
             
-            renderMap(data.final_map_state); // Render final map
+            renderMap(data.final_map_state, data.visibility); // Render final map
 
             r2ResultsSection.style.display = 'block';
             r2Section.style.display = 'none';
@@ -372,6 +477,8 @@ document.addEventListener('DOMContentLoaded', () => {
     function initializeGame() {
         createMapGrid();
         currentRound = 1;
+        gameId = null;
+        lastMapGrid = null;
         // R1 deployment related resets removed
         
         r2Deployments = [];
@@ -399,5 +506,6 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    loadUnitTypes();
     initializeGame(); // Start the game
 });
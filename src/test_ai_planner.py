@@ -0,0 +1,52 @@
+import random
+import time
+import unittest
+
+from ai_planner import MonteCarloPlanner, PlayerResponseModel
+from combat import CombatEngine
+from game_engine import GameEngine, VALID_UNIT_TYPES
+
+
+class TestMonteCarloPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.combat_engine = CombatEngine(VALID_UNIT_TYPES)
+        # Sample-capped so the decisions don't depend on machine speed
+        self.planner = MonteCarloPlanner(self.combat_engine, budget_seconds=float('inf'), max_samples=512)
+
+    def test_counters_known_r1_army(self):
+        context = {'round': 1, 'ai_count': 10, 'player_type': 'infantry', 'player_count': 10}
+        self.assertEqual(self.planner.choose_unit_type(context, random.Random(1)), 'cavalry')
+
+    def test_anticipates_player_countering_r1(self):
+        # AI showed cavalry in R1, so archers are the likely reply; infantry beats archers
+        context = {'round': 2, 'ai_count': 10, 'player_pool': 12, 'player_last_type': 'infantry', 'ai_last_type': 'cavalry'}
+        unit_type, report = self.planner.plan(context, random.Random(2))
+        self.assertEqual(unit_type, 'infantry')
+        self.assertEqual(report['samples'], 512)
+
+    def test_response_model_stays_within_pool(self):
+        context = {'player_pool': 7, 'player_last_type': 'infantry', 'ai_last_type': 'archers'}
+        type_codes, counts = PlayerResponseModel(self.combat_engine, context).sample(random.Random(3), 1000)
+        self.assertTrue(all(1 <= count <= 7 for count in counts))
+        self.assertEqual(set(type_codes), {0, 1, 2})
+
+    def test_budget_is_respected(self):
+        planner = MonteCarloPlanner(self.combat_engine, budget_seconds=0.005, batch_size=64)
+        context = {'round': 2, 'ai_count': 10, 'player_pool': 12, 'player_last_type': 'infantry', 'ai_last_type': 'cavalry'}
+        start = time.perf_counter()
+        unit_type, report = planner.plan(context, random.Random(4))
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertIn(unit_type, VALID_UNIT_TYPES)
+        self.assertGreater(report['samples'], 0)
+
+    def test_engine_uses_planner(self):
+        engine = GameEngine(ai_planner=self.planner)
+        r1, state = engine.play_round_1(random.Random(5))
+        self.assertEqual(r1['ai_army']['type'], 'cavalry')
+        r2 = engine.play_round_2(state, [], 0, random.Random(6))
+        self.assertIn(r2['ai_army']['type'], VALID_UNIT_TYPES)
+
+
+if __name__ == '__main__':
+    unittest.main()
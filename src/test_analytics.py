@@ -0,0 +1,82 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+import launch
+from analytics import BalanceStats
+
+
+def game(r1_winner, r2_winner, r1_strengths=(30.0, 20.0), r2_strengths=(25.0, 25.0)):
+    return SimpleNamespace(r1=('cavalry', 'archers', r1_winner) + r1_strengths,
+                           r2=('infantry', 'archers', r2_winner) + r2_strengths)
+
+
+class TestBalanceStats(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.stats = BalanceStats(window_seconds=10, windows=3, clock=lambda: self.now)
+
+    def test_matchup_rates_and_strength_spread(self):
+        self.stats.record(game('Player', 'Player', r1_strengths=(30.0, 20.0)))
+        self.stats.record(game('AI', 'Draw', r1_strengths=(10.0, 20.0)))
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['games'], 2)
+        r1 = snapshot['matchups'][0]
+        self.assertEqual((r1['round'], r1['player_type'], r1['ai_type'], r1['games']), (1, 'cavalry', 'archers', 2))
+        self.assertEqual((r1['player_win_rate'], r1['ai_win_rate'], r1['draw_rate']), (0.5, 0.5, 0.0))
+        self.assertEqual((r1['mean_strength_difference'], r1['stddev_strength_difference']), (0.0, 10.0))
+        self.assertEqual(snapshot['matchups'][1]['draw_rate'], 0.5)
+        self.assertEqual(snapshot['bonus_troops']['Player']['mean'], 10.0)
+        self.assertEqual(snapshot['bonus_troops']['AI']['games'], 1)
+
+    def test_round_correlation(self):
+        for r1_winner, r2_winner in [('Player', 'Player'), ('Player', 'Player'), ('AI', 'AI'), ('AI', 'Player')]:
+            self.stats.record(game(r1_winner, r2_winner))
+        correlation = self.stats.snapshot()['round_correlation']
+        self.assertEqual(correlation['table']['AI'], {'Player': 1, 'AI': 1, 'Draw': 0})
+        self.assertEqual(correlation['same_winner_rate'], 0.75)
+        self.assertAlmostEqual(correlation['phi'], 0.5773502691896258)
+
+    def test_old_windows_drop_out(self):
+        self.stats.record(game('Player', 'Player'))
+        self.now += 10
+        self.stats.record(game('AI', 'AI'))
+        self.assertEqual(self.stats.snapshot()['games'], 2)
+        self.assertEqual(self.stats.snapshot(1)['games'], 1)
+        self.now += 30 # Both windows are now older than the three kept
+        self.stats.record(game('AI', 'AI'))
+        self.assertEqual(self.stats.snapshot()['games'], 1)
+        self.assertLessEqual(sum(len(shard.windows) for shard in self.stats._shards), 3)
+
+    def test_threads_update_concurrently(self):
+        threads = [threading.Thread(target=lambda: [self.stats.record(game('Player', 'AI')) for _ in range(500)])
+                   for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stats.snapshot()['games'], 6000)
+
+
+class TestBalanceStatsRoute(unittest.TestCase):
+
+    def setUp(self):
+        original = launch.balance_stats
+        launch.balance_stats = BalanceStats()
+        self.addCleanup(setattr, launch, 'balance_stats', original)
+        self.client = launch.app.test_client()
+
+    def test_finished_games_show_up(self):
+        for _ in range(3):
+            game_id = self.client.post('/submit_round_1', json={}).get_json()['game_id']
+            self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': []})
+        stats = self.client.get('/balance_stats').get_json()
+        self.assertEqual(stats['games'], 3)
+        self.assertEqual(sum(m['games'] for m in stats['matchups'] if m['round'] == 2), 3)
+        self.assertEqual(sum(sum(row.values()) for row in stats['round_correlation']['table'].values()), 3)
+        self.assertEqual(self.client.get('/balance_stats?windows=0').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
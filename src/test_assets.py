@@ -0,0 +1,103 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import launch
+import sprites
+from assets import AssetCache, IMMUTABLE, build
+
+INDEX = """<html><head><link rel="stylesheet" href="/static/style.css"></head>
+<body><script src="/static/script.js"></script></body></html>"""
+
+
+class TestSprites(unittest.TestCase):
+
+    def test_png_round_trip(self):
+        image = sprites.Image(3, 2, 3, bytearray(range(18)))
+        back = sprites.read_png(sprites.write_png(image))
+        self.assertEqual((back.width, back.height, back.channels, back.pixels), (3, 2, 3, image.pixels))
+
+    def test_downscale_averages_boxes(self):
+        image = sprites.Image(4, 2, 1, bytearray([0, 10, 20, 30, 40, 50, 60, 70]))
+        self.assertEqual(list(sprites.downscale(image, 2, 1).pixels), [25, 45])
+
+    def test_atlas_places_tiles_side_by_side(self):
+        red = sprites.Image(4, 4, 3, bytearray(b'\xff\x00\x00' * 16))
+        grey = sprites.Image(4, 4, 1, bytearray(b'\x80' * 16))
+        atlas, offsets = sprites.build_atlas([('red', red), ('grey', grey)], tile_size=2)
+        self.assertEqual((atlas.width, atlas.height, offsets), (4, 2, {'red': 0, 'grey': 2}))
+        self.assertEqual(bytes(atlas.pixels[:12]), b'\xff\x00\x00' * 2 + b'\x80' * 6)
+
+
+class TestAssets(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.static = os.path.join(tmpdir.name, 'static')
+        self.dist = os.path.join(tmpdir.name, 'dist')
+        os.makedirs(os.path.join(self.static, 'images'))
+        self.write('index.html', INDEX.encode())
+        self.write('style.css', b'body { color: red; }\n' * 100)
+        self.write('script.js', b'console.log(1);\n')
+        for name in ('p1_cavalry', 'ai_cavalry'):
+            self.write(f'images/{name}.png', sprites.write_png(sprites.Image(8, 8, 3, bytearray(8 * 8 * 3))))
+
+    def write(self, name, body):
+        with open(os.path.join(self.static, name), 'wb') as f:
+            f.write(body)
+
+    def serve(self):
+        cache = AssetCache.load(self.dist)
+        original = launch.asset_cache
+        launch.asset_cache = cache
+        self.addCleanup(setattr, launch, 'asset_cache', original)
+        return launch.app.test_client()
+
+    def test_build_fingerprints_and_rewrites_index(self):
+        files = build(self.static, self.dist)['files']
+        self.assertRegex(files['style.css'], r'^style\.[0-9a-f]{16}\.css$')
+        with open(os.path.join(self.dist, 'index.html')) as f:
+            html = f.read()
+        for name in ('style.css', 'script.js', 'units.css'):
+            self.assertIn(f'/assets/{files[name]}', html)
+        self.assertIn('<body data-unit-sprites>', html)
+        with open(os.path.join(self.dist, files['units.css'])) as f:
+            self.assertIn(f'/assets/{files["units.png"]}', f.read())
+
+    def test_rebuild_removes_stale_files(self):
+        old = build(self.static, self.dist)['files']['script.js']
+        self.write('script.js', b'console.log(2);\n')
+        new = build(self.static, self.dist)['files']['script.js']
+        self.assertNotEqual(old, new)
+        self.assertFalse(os.path.exists(os.path.join(self.dist, old)))
+        self.assertFalse(os.path.exists(os.path.join(self.dist, old + '.gz')))
+
+    def test_served_from_memory_with_etags(self):
+        style = build(self.static, self.dist)['files']['style.css']
+        client = self.serve()
+        plain = client.get(f'/assets/{style}')
+        self.assertEqual(plain.headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(plain.data, b'body { color: red; }\n' * 100)
+        zipped = client.get(f'/assets/{style}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(zipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(zipped.data), plain.data)
+        self.assertNotEqual(zipped.headers['ETag'], plain.headers['ETag'])
+        # No deflate build exists, so a deflate-only client gets the identity body, not a deflated one under its ETag
+        deflate = client.get(f'/assets/{style}', headers={'Accept-Encoding': 'deflate'})
+        self.assertNotIn('Content-Encoding', deflate.headers)
+        self.assertEqual((deflate.data, deflate.headers['ETag']), (plain.data, plain.headers['ETag']))
+        again = client.get(f'/assets/{style}', headers={'If-None-Match': plain.headers['ETag']})
+        self.assertEqual((again.status_code, again.data), (304, b''))
+        index = client.get('/')
+        self.assertEqual(index.headers['Cache-Control'], 'no-cache')
+        self.assertIn(b'/assets/', index.data)
+        self.assertEqual(client.get('/assets/missing.css').status_code, 404)
+
+    def test_unbuilt_directory_loads_nothing(self):
+        self.assertIsNone(AssetCache.load(self.dist))
+
+
+if __name__ == '__main__':
+    unittest.main()
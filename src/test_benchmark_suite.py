@@ -0,0 +1,27 @@
+import unittest
+from benchmarks import suite
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_compare_flags_time_and_memory_regressions(self):
+        baseline = {'a': {'median_s': 1.0, 'peak_bytes': 1000}, 'b': {'median_s': 1.0, 'peak_bytes': 1000}}
+        results = {
+            'a': {'median_s': 1.2, 'peak_bytes': 1100},  # Within 25%
+            'b': {'median_s': 1.3, 'peak_bytes': 2000},  # Both regress
+            'c': {'median_s': 9.0, 'peak_bytes': 9000}   # Not in baseline, ignored
+        }
+        regressions = suite.compare(results, baseline, 0.25, 0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(message.startswith('b:') for message in regressions))
+
+    def test_measure_runs_a_case(self):
+        case = suite.BenchCase('deploy_ai_units', {'map_size': 5, 'units': 3}, lambda: suite.setup_deploy_ai_units(5, 3))
+        self.assertEqual(case.key, 'deploy_ai_units[map_size=5,units=3]')
+        result = suite.measure(case, repeat=2, min_time=0.001)
+        self.assertGreater(result['median_s'], 0)
+        self.assertGreater(result['peak_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
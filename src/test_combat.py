@@ -0,0 +1,94 @@
+import itertools
+import unittest
+from combat import CombatEngine, WINNER_NAMES
+import launch
+from launch import app
+
+UNIT_TYPES = ['infantry', 'archers', 'cavalry']
+
+
+def legacy_resolve(player_type, player_count, ai_type, ai_count):
+    # The original scalar if-chain from the round handlers
+    player_modifier = 1.0
+    ai_modifier = 1.0
+    if (player_type == 'infantry' and ai_type == 'archers') or \
+       (player_type == 'archers' and ai_type == 'cavalry') or \
+       (player_type == 'cavalry' and ai_type == 'infantry'):
+        player_modifier = 1.25
+    elif (ai_type == 'infantry' and player_type == 'archers') or \
+          (ai_type == 'archers' and player_type == 'cavalry') or \
+          (ai_type == 'cavalry' and player_type == 'infantry'):
+        ai_modifier = 1.25
+    player_strength = float(player_count) * player_modifier
+    ai_strength = float(ai_count) * ai_modifier
+    winner = "Draw"
+    if player_strength > ai_strength: winner = "Player"
+    elif ai_strength > player_strength: winner = "AI"
+    return player_strength, ai_strength, winner, int(abs(player_strength - ai_strength))
+
+
+class TestCombatEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = CombatEngine(UNIT_TYPES)
+        self.matchups = list(itertools.product(UNIT_TYPES, [0, 1, 7, 10, 13], UNIT_TYPES, [0, 1, 8, 10, 12]))
+
+    def test_scalar_matches_legacy_rules(self):
+        for matchup in self.matchups:
+            result = self.engine.resolve(*matchup)
+            expected = legacy_resolve(*matchup)
+            self.assertEqual((result['player_strength'], result['ai_strength'], result['winner'], result['bonus_troops']), expected)
+
+    def test_batch_matches_legacy_rules(self):
+        player_types, player_counts, ai_types, ai_counts = zip(*self.matchups)
+        result = self.engine.resolve_batch(self.engine.encode_types(player_types), player_counts,
+                                           self.engine.encode_types(ai_types), ai_counts)
+        for i, matchup in enumerate(self.matchups):
+            got = (result.player_strength[i], result.ai_strength[i], WINNER_NAMES[result.winner[i]], result.bonus_troops[i])
+            self.assertEqual(got, legacy_resolve(*matchup))
+
+
+class TestSimulateBatchEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+
+    def test_simulate_batch(self):
+        response = self.client.post('/simulate_batch', json={
+            'player_types': ['infantry', 'cavalry'], 'player_counts': [10, 5],
+            'ai_types': ['archers', 'archers'], 'ai_counts': [12, 5]
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['player_strength'], [12.5, 5.0])
+        self.assertEqual(data['ai_strength'], [12.0, 6.25])
+        self.assertEqual(data['winner'], ['Player', 'AI'])
+        self.assertEqual(data['bonus_troops'], [0, 1])
+
+    def test_simulate_batch_rejects_bad_input(self):
+        response = self.client.post('/simulate_batch', json={
+            'player_types': ['pikemen'], 'player_counts': [1], 'ai_types': ['archers'], 'ai_counts': [1]
+        })
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/simulate_batch', json={
+            'player_types': ['infantry'], 'player_counts': [1, 2], 'ai_types': ['archers'], 'ai_counts': [1]
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_simulate_batch_rejects_oversize_count(self):
+        response = self.client.post('/simulate_batch', json={
+            'player_types': ['infantry'], 'player_counts': [10 ** 30], 'ai_types': ['archers'], 'ai_counts': [1]
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too large', response.get_json()['error'])
+        # The largest count allowed still resolves, with the advantage modifier applied
+        limit = launch.combat_engine.max_count
+        response = self.client.post('/simulate_batch', json={
+            'player_types': ['infantry'], 'player_counts': [limit], 'ai_types': ['archers'], 'ai_counts': [0]
+        })
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from deployments import DeploymentBatch
+from game_engine import VALID_UNIT_TYPES, deploy_ai_units, initialize_map, populate_map_from_deployments
+from occupancy import OccupancyGrid
+
+DEPLOYMENTS = [
+    {'owner': 'P1', 'unit_type': 'cavalry', 'count': 4, 'x': 1, 'y': 2},
+    {'owner': 'AI', 'unit_type': 'infantry', 'count': 7, 'x': 4, 'y': 0}
+]
+
+
+class TestDeploymentBatch(unittest.TestCase):
+
+    def test_round_trips_dicts(self):
+        batch = DeploymentBatch.from_dicts(DEPLOYMENTS, 5, VALID_UNIT_TYPES)
+        self.assertEqual(batch.to_dicts(), DEPLOYMENTS)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.total(), 11)
+        self.assertEqual(batch[1].to_dict(), DEPLOYMENTS[1])
+        self.assertIs(DeploymentBatch.coerce(batch, 5, VALID_UNIT_TYPES), batch)
+        self.assertEqual(batch.subset([1]).to_dicts(), DEPLOYMENTS[1:])
+
+    def test_map_from_batch_matches_map_from_dicts(self):
+        from_dicts = populate_map_from_deployments(DEPLOYMENTS, initialize_map())
+        from_batch = populate_map_from_deployments(DeploymentBatch.from_dicts(DEPLOYMENTS, 5, VALID_UNIT_TYPES), initialize_map())
+        self.assertEqual(list(from_batch.cells()), list(from_dicts.cells()))
+
+    def test_batch_with_other_type_order_is_applied_by_name(self):
+        batch = DeploymentBatch.from_dicts(DEPLOYMENTS, 5, list(reversed(VALID_UNIT_TYPES)))
+        game_map = populate_map_from_deployments(batch, initialize_map())
+        self.assertEqual(game_map.get(1, 2)['unit_type'], 'cavalry')
+        self.assertEqual(game_map.get(4, 0)['unit_type'], 'infantry')
+
+    def test_deploy_ai_units_into_batch(self):
+        grid = OccupancyGrid(5, [(0, 0)])
+        batch, _ = deploy_ai_units(6, 'archers', grid, 'AI', random.Random(3), DeploymentBatch(5, VALID_UNIT_TYPES))
+        as_dicts, _ = deploy_ai_units(6, 'archers', OccupancyGrid(5, [(0, 0)]), 'AI', random.Random(3))
+        self.assertEqual(batch.to_dicts(), as_dicts)
+        self.assertEqual(len(grid), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
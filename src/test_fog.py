@@ -0,0 +1,135 @@
+import base64
+import random
+import unittest
+from unittest import mock
+
+import launch
+import wire_format
+from fog import Visibility
+from game_engine import GameEngine, initialize_map, populate_map_from_deployments
+
+SIGHT_RANGES = {'infantry': 2, 'archers': 3, 'cavalry': 3}
+
+
+class TestVisibility(unittest.TestCase):
+
+    def test_reveal_matches_manhattan_diamond(self):
+        rng = random.Random(1)
+        for size in (5, 9, 40):
+            for _ in range(20):
+                radius = rng.randint(0, 12)
+                x, y = rng.randrange(size), rng.randrange(size)
+                visibility = Visibility(size, [radius])
+                visibility.reveal([(x * size + y, 0)])
+                for cx in range(size):
+                    for cy in range(size):
+                        self.assertEqual(visibility.is_visible(cx, cy), abs(cx - x) + abs(cy - y) <= radius,
+                                         (size, radius, x, y, cx, cy))
+
+    def test_masked_map_keeps_own_and_visible_stacks(self):
+        game_map = populate_map_from_deployments([
+            {'owner': 'P1', 'unit_type': 'infantry', 'count': 5, 'x': 0, 'y': 0},
+            {'owner': 'AI', 'unit_type': 'cavalry', 'count': 3, 'x': 1, 'y': 1},
+            {'owner': 'AI', 'unit_type': 'archers', 'count': 4, 'x': 4, 'y': 4}
+        ], initialize_map())
+        visibility = Visibility.from_map(game_map, 1, [2, 3, 3])
+        masked = game_map.masked(visibility.bits, 'P1')
+        self.assertEqual(sorted((x, y) for x, y, _, _, _ in masked.cells()), [(0, 0), (1, 1)])
+        self.assertEqual(len(game_map), 3) # The original is untouched
+
+
+class TestFogInGame(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = GameEngine(sight_ranges=SIGHT_RANGES)
+        self.client = launch.app.test_client()
+        original = launch.game_engine
+        launch.game_engine = self.engine
+        self.addCleanup(setattr, launch, 'game_engine', original)
+
+    def play(self, headers=None, query=''):
+        r1 = self.client.post('/submit_round_1', json={}, headers=headers)
+        game_id = (wire_format.decode_binary(r1.data)[0] if headers else r1.get_json())['game_id']
+        r2 = self.client.post('/submit_round_2' + query, headers=headers, json={
+            'game_id': game_id,
+            'player_deployments_r2': [{'unit_type': 'archers', 'unit_count': 5, 'x': 0, 'y': 1}]
+        })
+        self.assertEqual(r2.status_code, 200)
+        return r1, r2
+
+    def test_r2_hides_ai_stacks_out_of_sight(self):
+        random.seed(3)
+        _, r2 = self.play()
+        data = r2.get_json()
+        bits = base64.b64decode(data['visibility']['bits'])
+        visible = lambda x, y: (bits[(x * 6 + y) >> 3] >> ((x * 6 + y) & 7)) & 1 # Rows padded to 6 bits
+        for x, column in enumerate(data['final_map_state']):
+            for y, cell in enumerate(column):
+                if cell is not None and cell['owner'] == 'AI':
+                    self.assertTrue(visible(x, y))
+        for dep in data['ai_r2_deployments']:
+            self.assertTrue(visible(dep['x'], dep['y']))
+        self.assertTrue(visible(4, 4)) # The fixed R1 opening is public
+        self.assertFalse(visible(2, 4)) # Out of everyone's sight
+
+    def test_no_hidden_ai_position_in_moves_or_losses(self):
+        # Spatial combat and movement on a big map: AI stacks move and fight out of the player's sight
+        launch.game_engine = GameEngine(map_size=32, combat_mode='spatial', move_ranges=SIGHT_RANGES, sight_ranges=SIGHT_RANGES)
+        rng = random.Random(5)
+        reported = {'moves': 0, 'cell_losses': 0}
+        for seed in range(30):
+            with mock.patch.object(launch, 'new_game_seed', return_value=seed):
+                game_id = self.client.post('/submit_round_1', json={}).get_json()['game_id']
+            deployments = [{'unit_type': 'cavalry', 'unit_count': 1, 'x': rng.randrange(16, 31), 'y': rng.randrange(16, 31)}
+                           for _ in range(8)]
+            deployments = list({(dep['x'], dep['y']): dep for dep in deployments}.values())
+            data = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': deployments}).get_json()
+            bits = base64.b64decode(data['visibility']['bits'])
+            visible = lambda x, y: (bits[(x * 33 + y) >> 3] >> ((x * 33 + y) & 7)) & 1
+            def check(value):
+                # Every position anywhere in the response must be one the player can see
+                if isinstance(value, dict):
+                    for x, y in (('x', 'y'), ('to_x', 'to_y')):
+                        if x in value:
+                            self.assertTrue(visible(value[x], value[y]), (seed, value))
+                    for item in value.values(): check(item)
+                elif isinstance(value, list):
+                    for item in value: check(item)
+            check(data)
+            for x, column in enumerate(data['final_map_state']):
+                for y, cell in enumerate(column):
+                    self.assertTrue(cell is None or visible(x, y))
+            reported['moves'] += len(data['moves'])
+            reported['cell_losses'] += len(data['spatial_combat']['cell_losses'])
+        self.assertTrue(reported['moves'] and reported['cell_losses']) # The lists were not just emptied
+
+    def test_binary_delta_applies_to_the_fogged_r1_view(self):
+        # The same seeded game twice: R1 view + R2 delta must equal the full R2 view
+        views = []
+        for query in ('?delta=1', ''):
+            with mock.patch.object(launch, 'new_game_seed', return_value=4):
+                r1, r2 = self.play(headers={'Accept': wire_format.BINARY}, query=query)
+            _, _, cells, _, _ = wire_format.decode_binary(r1.data)
+            view = {(x, y): tuple(cell) for x, y, *cell in cells} if query else {}
+            _, _, changed, removed, _ = wire_format.decode_binary(r2.data)
+            for x, y, *cell in changed:
+                view[(x, y)] = tuple(cell)
+            for coord in removed:
+                view.pop(coord)
+            views.append(view)
+        self.assertEqual(views[0], views[1])
+        self.assertNotIn((2, 4), views[1])
+
+    def test_fog_can_be_turned_off(self):
+        engine = GameEngine()
+        r1, state = engine.play_round_1(random.Random(5))
+        self.assertNotIn('visibility', r1)
+        self.assertNotIn('player_visibility', state)
+
+    def test_fog_needs_maps(self):
+        with self.assertRaises(ValueError):
+            GameEngine(sight_ranges=SIGHT_RANGES, build_maps=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import launch
+from game_log import GameLogReader, GameLogWriter, replay
+
+
+class TestGameLog(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'games.log')
+        self.writer = GameLogWriter(self.path)
+        self.addCleanup(self.writer.close)
+        original = launch.game_log
+        launch.game_log = self.writer
+        self.addCleanup(setattr, launch, 'game_log', original)
+        self.client = launch.app.test_client()
+
+    def play(self, deployments):
+        game_id = self.client.post('/submit_round_1', json={}).get_json()['game_id']
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': deployments})
+        self.assertEqual(r2.status_code, 200)
+        return game_id, r2.get_json()
+
+    def test_logged_games_read_back_and_replay(self):
+        played = [self.play([{'unit_type': 'cavalry', 'unit_count': 1, 'x': 2, 'y': y} for y in range(n)]) for n in range(4)]
+        self.writer.flush()
+        with GameLogReader(self.path) as reader:
+            records = list(reader.games())
+        self.assertEqual([record.game_id for record in records], [game_id for game_id, _ in played])
+        for record, (_, r2) in zip(records, played):
+            self.assertEqual(record.r2[2], r2['round_2_results']['round_winner'])
+            self.assertEqual(record.player_r2.to_dicts(), r2['player_r2_deployments'])
+            logged_ai = record.ai_r2.to_dicts()
+            for dep in r2['ai_r2_deployments']: # The response only shows what fog lets through
+                self.assertIn(dep, logged_ai)
+            self.assertEqual(replay(record, launch.game_engine), [])
+
+    def test_replay_notices_a_different_game(self):
+        self.play([{'unit_type': 'cavalry', 'unit_count': 1, 'x': 2, 'y': 2}])
+        self.writer.flush()
+        with GameLogReader(self.path) as reader:
+            record = next(reader.games())
+        record.seed += 1
+        self.assertIn('ai_r2', replay(record, launch.game_engine))
+
+    def test_record_cut_short_is_ignored(self):
+        for _ in range(2):
+            self.play([])
+        self.writer.flush()
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        with GameLogReader(self.path) as reader:
+            self.assertEqual(len(list(reader.games(deployments=False))), 1)
+
+    def test_empty_log(self):
+        open(self.path, 'wb').close()
+        with GameLogReader(self.path) as reader:
+            self.assertEqual(list(reader.games()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -146,9 +146,7 @@ class TestMapBasedGameLogic(unittest.TestCase):
         self.assertEqual(r1_response.status_code, 200, f"R1 call failed for R2 test setup. Data: {self._get_json_response(r1_response)}")
         r1_data = self._get_json_response(r1_response)
 
-        player_r1_deployments_from_r1 = r1_data['player_r1_deployments']
-        ai_r1_deployments_from_r1 = r1_data['ai_r1_deployments']
-        ai_r2_data_for_r2_from_r1 = r1_data['ai_r2_data_for_r2']
+        game_id = r1_data['game_id']
         player_r2_pool = r1_data['player_r2_data']['total_r2_pool']
 
         # Step 2: Round 2 submission
@@ -160,11 +158,8 @@ class TestMapBasedGameLogic(unittest.TestCase):
             )
         
         r2_payload = {
-            "player_deployments_r2": player_r2_deployments_list,
-            "player_r1_deployments": player_r1_deployments_from_r1,
-            "ai_r1_deployments": ai_r1_deployments_from_r1,
-            "ai_r2_data_for_r2": ai_r2_data_for_r2_from_r1,
-            "player_r2_total_pool": player_r2_pool # Added this field as per backend expectation
+            "game_id": game_id, # R1 state (deployments, budgets) is kept server-side
+            "player_deployments_r2": player_r2_deployments_list
         }
 
         r2_response = self.client.post('/submit_round_2', json=r2_payload)
@@ -203,10 +198,7 @@ class TestMapBasedGameLogic(unittest.TestCase):
             "player_deployments_r2": [
                 {"unit_type": "archers", "unit_count": player_r2_pool + 1, "x": 1, "y": 0}
             ],
-            "player_r1_deployments": r1_data['player_r1_deployments'],
-            "ai_r1_deployments": r1_data['ai_r1_deployments'],
-            "ai_r2_data_for_r2": r1_data['ai_r2_data_for_r2'],
-            "player_r2_total_pool": player_r2_pool
+            "game_id": r1_data['game_id']
         }
         response = self.client.post('/submit_round_2', json=r2_payload)
         self.assertEqual(response.status_code, 400)
@@ -214,22 +206,38 @@ class TestMapBasedGameLogic(unittest.TestCase):
         self.assertIn('error', data)
         self.assertIn("exceeds budget", data['error']) # Generic check based on backend
 
-    def test_r2_missing_r1_deployment_data(self):
+    def test_r2_missing_game_id(self):
         r1_payload = {"player_deployments": [{"unit_type": "infantry", "unit_count": 10, "x": 0, "y": 0}]}
         r1_response = self.client.post('/submit_round_1', json=r1_payload)
-        r1_data = self._get_json_response(r1_response)
-        
+        self.assertEqual(r1_response.status_code, 200)
+
         r2_payload = {
-            "player_deployments_r2": [{"unit_type": "cavalry", "unit_count": 5, "x": 1, "y": 1}],
-            "ai_r2_data_for_r2": r1_data['ai_r2_data_for_r2'],
-            "player_r2_total_pool": r1_data['player_r2_data']['total_r2_pool']
-            # Missing player_r1_deployments, ai_r1_deployments
+            "player_deployments_r2": [{"unit_type": "cavalry", "unit_count": 5, "x": 1, "y": 1}]
+            # Missing game_id
         }
         response = self.client.post('/submit_round_2', json=r2_payload)
         self.assertEqual(response.status_code, 400)
         data = self._get_json_response(response)
         self.assertIn('error', data)
-        self.assertIn("Missing R1 deployment data", data['error'])
+        self.assertIn("Missing game_id", data['error'])
+
+    def test_r2_unknown_game_id(self):
+        r2_payload = {
+            "game_id": "not-a-real-game",
+            "player_deployments_r2": [{"unit_type": "cavalry", "unit_count": 5, "x": 1, "y": 1}]
+        }
+        response = self.client.post('/submit_round_2', json=r2_payload)
+        self.assertEqual(response.status_code, 404)
+        data = self._get_json_response(response)
+        self.assertIn("Unknown or expired game_id", data['error'])
+
+    def test_r2_game_id_cannot_be_replayed(self):
+        r1_data = self._get_json_response(self.client.post('/submit_round_1', json={}))
+        r2_payload = {"game_id": r1_data['game_id'], "player_deployments_r2": []}
+        first = self.client.post('/submit_round_2', json=r2_payload)
+        self.assertEqual(first.status_code, 200)
+        second = self.client.post('/submit_round_2', json=r2_payload)
+        self.assertEqual(second.status_code, 404)
 
 if __name__ == '__main__':
     unittest.main()
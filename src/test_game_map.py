@@ -0,0 +1,39 @@
+import unittest
+from game_map import GameMap
+
+UNIT_TYPES = ['infantry', 'archers', 'cavalry']
+
+
+class TestGameMap(unittest.TestCase):
+
+    def test_lookup_and_dense_grid(self):
+        game_map = GameMap(5, UNIT_TYPES)
+        game_map.apply([
+            {'owner': 'P1', 'unit_type': 'infantry', 'count': 10, 'x': 0, 'y': 0},
+            {'owner': 'AI', 'unit_type': 'cavalry', 'count': 4, 'x': 4, 'y': 2}
+        ])
+        self.assertEqual(len(game_map), 2)
+        self.assertEqual(game_map.get(4, 2), {'owner': 'AI', 'unit_type': 'cavalry', 'count': 4})
+        self.assertIsNone(game_map.get(2, 2))
+        grid = game_map.to_grid()
+        self.assertEqual(len(grid), 5)
+        self.assertEqual(grid[0][0], {'owner': 'P1', 'unit_type': 'infantry', 'count': 10})
+        self.assertEqual(sum(cell is not None for row in grid for cell in row), 2)
+
+    def test_incremental_apply_reports_overwrites(self):
+        game_map = GameMap(5, UNIT_TYPES)
+        game_map.apply([{'owner': 'P1', 'unit_type': 'infantry', 'count': 10, 'x': 1, 'y': 1}])
+        next_round = game_map.copy()
+        overwritten = next_round.apply([
+            {'owner': 'AI', 'unit_type': 'archers', 'count': 3, 'x': 1, 'y': 1},
+            {'owner': 'AI', 'unit_type': 'archers', 'count': 3, 'x': 9, 'y': 9} # Off the map, skipped
+        ])
+        self.assertEqual(len(overwritten), 1)
+        self.assertEqual(overwritten[0][1]['owner'], 'P1')
+        self.assertEqual(next_round.get(1, 1)['owner'], 'AI')
+        self.assertEqual(game_map.get(1, 1)['owner'], 'P1') # Copy leaves the original untouched
+        self.assertEqual(len(next_round), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+import launch
+from instrumentation import MetricsRegistry
+from launch import app
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+
+    def test_server_timing_has_phases(self):
+        r1 = self.client.post('/submit_round_1', json={})
+        r2 = self.client.post('/submit_round_2', json={'game_id': r1.get_json()['game_id'], 'player_deployments_r2': []})
+        timing = r2.headers['Server-Timing']
+        for phase_name in ('parse', 'validate', 'deploy_ai', 'map', 'combat', 'serialize', 'total'):
+            self.assertIn(f'{phase_name};dur=', timing)
+
+    def test_metrics_endpoint_exposes_histograms_and_errors(self):
+        self.client.post('/submit_round_1', json={})
+        with mock.patch.object(launch.game_engine, 'play_round_1', side_effect=RuntimeError('boom')):
+            failed = self.client.post('/submit_round_1', json={})
+        self.assertEqual(failed.status_code, 500)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE rts_request_duration_seconds histogram', text)
+        self.assertIn('rts_phase_duration_seconds_count{route="/submit_round_1",phase="combat"}', text)
+        self.assertIn('rts_request_errors_total{route="/submit_round_1"}', text)
+        self.assertIn('rts_response_size_bytes_bucket{route="/submit_round_1",le="+Inf"}', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        for value in (0.0001, 0.003, 20.0):
+            registry.observe('latency', (('route', '/x'),), value)
+        text = registry.render()
+        self.assertIn('latency_bucket{route="/x",le="0.0005"} 1', text)
+        self.assertIn('latency_bucket{route="/x",le="0.005"} 2', text)
+        self.assertIn('latency_bucket{route="/x",le="10.0"} 2', text)
+        self.assertIn('latency_bucket{route="/x",le="+Inf"} 3', text)
+        self.assertIn('latency_count{route="/x"} 3', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import random
+import socket
+import threading
+import unittest
+
+import launch
+import loadgen
+from serve import WorkerServer
+
+
+class TestLoadgenHelpers(unittest.TestCase):
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadgen.percentile(values, 50), 50)
+        self.assertEqual(loadgen.percentile(values, 99), 99)
+        self.assertEqual(loadgen.percentile([7], 95), 7)
+        self.assertEqual(loadgen.percentile([], 50), 0.0)
+
+    def test_r2_deployments_pass_server_validation(self):
+        client = launch.app.test_client()
+        rng = random.Random(3)
+        for _ in range(20):
+            r1 = client.post('/submit_round_1', json={}, headers={'Accept': loadgen.ROUND_ACCEPT_HEADER}).get_json()
+            deployments = loadgen.build_r2_deployments(r1, rng)
+            self.assertEqual(sum(d['unit_count'] for d in deployments), r1['player_r2_data']['total_r2_pool'])
+            state = launch.game_store.get(r1['game_id'])
+            launch.game_engine.validate_round_2_deployments(state, deployments) # Raises if invalid
+            launch.game_store.delete(r1['game_id'])
+
+
+class TestLoadAgainstWorkerServer(unittest.TestCase):
+
+    def test_full_games_over_keep_alive(self):
+        listen_socket = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listen_socket.close)
+        server = WorkerServer(listen_socket, launch.app, threads=2, keepalive_timeout=5)
+        thread = threading.Thread(target=server.serve_forever, args=(5,), daemon=True)
+        thread.start()
+        try:
+            port = listen_socket.getsockname()[1]
+            summary = asyncio.run(loadgen.run_load('127.0.0.1', port, clients=10, connections=4, games=30, seed=1))
+        finally:
+            server.stop()
+            thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(summary['games_completed'], 30)
+        self.assertEqual(summary['games_failed'], 0)
+        for endpoint in loadgen.ENDPOINTS:
+            self.assertEqual(summary['endpoints'][endpoint]['statuses'], {'200': 30})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import random
+import unittest
+from collections import deque
+
+from bitboard import AI_CODE, PLAYER_CODE, owner_boards
+from game_engine import GameEngine, initialize_map, populate_map_from_deployments
+from movement import MovementPhase, compute_distance_field
+
+MOVE_RANGES = {'infantry': 2, 'archers': 1, 'cavalry': 4}
+
+
+def make_map(deployments, size=5):
+    return populate_map_from_deployments(
+        [{'owner': owner, 'unit_type': unit_type, 'count': 5, 'x': x, 'y': y} for owner, unit_type, x, y in deployments],
+        initialize_map(size))
+
+
+def positions(game_map):
+    return {(x, y): (owner, unit_type) for x, y, owner, unit_type, _ in game_map.cells()}
+
+
+class TestMovementPhase(unittest.TestCase):
+
+    def test_units_advance_by_their_move_range(self):
+        game_map = make_map([('P1', 'cavalry', 0, 0), ('P1', 'archers', 4, 0), ('AI', 'infantry', 0, 4)])
+        MovementPhase(MOVE_RANGES).move(game_map)
+        cells = positions(game_map)
+        self.assertEqual(cells[(0, 3)], ('P1', 'cavalry')) # Stops next to the enemy
+        self.assertEqual(cells[(3, 0)], ('P1', 'archers')) # Range 1
+        self.assertEqual(cells[(0, 4)], ('AI', 'infantry')) # The cavalry moved up first, so it is engaged already
+        self.assertEqual(len(game_map), 3)
+
+    def test_routes_around_occupied_cells(self):
+        # An allied wall across row x=1 except y=4 blocks the direct route down
+        wall = [('P1', 'archers', 1, y) for y in range(4)]
+        game_map = make_map(wall + [('P1', 'cavalry', 0, 0), ('AI', 'archers', 2, 0)])
+        movement = MovementPhase({'cavalry': 4, 'archers': 0})
+        moves = movement.move(game_map)
+        self.assertEqual(moves, [(0, 4)]) # 4 steps along row 0 toward the gap at (1,4)
+
+    def test_distance_field_matches_plain_bfs(self):
+        rng = random.Random(3)
+        for size in (6, 13, 32):
+            deployments, taken = [], set()
+            for _ in range(size * size // 4):
+                x, y = rng.randrange(size), rng.randrange(size)
+                if (x, y) not in taken:
+                    taken.add((x, y))
+                    deployments.append((rng.choice(['P1', 'AI']), 'infantry', x, y))
+            game_map = make_map(deployments, size)
+            boards, _ = owner_boards(game_map)
+            field = compute_distance_field(size, boards[AI_CODE], boards[PLAYER_CODE] | boards[AI_CODE])
+
+            owners = {(x, y): owner for owner, _, x, y in deployments}
+            expected, queue = {}, deque()
+            seen = {cell for cell, owner in owners.items() if owner == 'AI'}
+            queue.extend((cell, 0) for cell in seen)
+            while queue:
+                (x, y), distance = queue.popleft()
+                for nxt in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                    if 0 <= nxt[0] < size and 0 <= nxt[1] < size and nxt not in seen:
+                        seen.add(nxt)
+                        if nxt in owners:
+                            expected[nxt[0] * size + nxt[1]] = distance + 1 # Reached but blocks the flood
+                        else:
+                            queue.append((nxt, distance + 1))
+            self.assertEqual(field.distances, expected)
+
+    def test_fields_are_cached_until_occupancy_changes(self):
+        game_map = make_map([('P1', 'infantry', 0, 0), ('AI', 'infantry', 4, 4)])
+        movement = MovementPhase(MOVE_RANGES)
+        movement.move(game_map.copy())
+        movement.move(game_map.copy())
+        self.assertEqual((movement.misses, movement.hits), (2, 2))
+        movement.move(game_map) # Moved stacks change occupancy for the next phase
+        movement.move(game_map)
+        self.assertEqual(movement.misses, 4)
+
+
+class TestMovementInGame(unittest.TestCase):
+
+    def test_round_2_moves_before_combat(self):
+        engine = GameEngine(combat_mode='spatial', move_ranges=MOVE_RANGES)
+        _, state = engine.play_round_1(random.Random(1))
+        deployments = [{'owner': 'P1', 'unit_type': 'cavalry', 'count': 5, 'x': 2, 'y': 2}]
+        r2 = engine.play_round_2(state, deployments, 5, random.Random(2))
+        self.assertTrue(r2['moves'])
+        occupied = {(x, y) for x, y, _, _, _ in r2['map'].cells()}
+        for move in r2['moves']:
+            self.assertNotEqual((move['x'], move['y']), (move['to_x'], move['to_y']))
+        self.assertEqual(len(occupied), len(r2['map']))
+        self.assertIsNotNone(state['map'].get(0, 0)) # Stored R1 map is untouched
+
+    def test_movement_needs_maps(self):
+        with self.assertRaises(ValueError):
+            GameEngine(move_ranges=MOVE_RANGES, build_maps=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import random
+import unittest
+from game_engine import deploy_ai_units
+from occupancy import OccupancyGrid
+
+
+class TestOccupancyGrid(unittest.TestCase):
+
+    def test_membership_and_iteration(self):
+        grid = OccupancyGrid(5, [(0, 0), (4, 4)])
+        self.assertIn((0, 0), grid)
+        self.assertNotIn((1, 1), grid)
+        self.assertNotIn((5, 0), grid) # Out of bounds is never occupied
+        self.assertFalse(grid.occupy(0, 0))
+        self.assertEqual(list(grid), [(0, 0), (4, 4)])
+        self.assertEqual(grid.free_count, 23)
+
+    def test_sample_free_cells_is_distinct_and_free(self):
+        rng = random.Random(7)
+        for size, occupied in ((5, 20), (64, 10)):
+            grid = OccupancyGrid(size)
+            for x, y in grid.sample_free_cells(occupied, rng): grid.occupy(x, y)
+            picked = grid.sample_free_cells(5, rng)
+            self.assertEqual(len(picked), 5)
+            self.assertEqual(len(set(picked)), 5)
+            for cell in picked: self.assertNotIn(cell, grid)
+        self.assertEqual(len(OccupancyGrid(2).sample_free_cells(10, rng)), 4)
+
+
+class TestDeployAiUnits(unittest.TestCase):
+
+    def test_spreads_units_with_remainder_on_last_cell(self):
+        grid = OccupancyGrid(5, [(r, c) for r in range(5) for c in range(5)][3:])
+        deployments, returned = deploy_ai_units(7, 'archers', grid, 'AI', random.Random(1))
+        self.assertIs(returned, grid)
+        self.assertEqual([d['count'] for d in deployments], [2, 2, 3])
+        self.assertEqual(grid.free_count, 0)
+
+    def test_one_unit_per_cell_when_space_allows(self):
+        deployments, _ = deploy_ai_units(12, 'cavalry', OccupancyGrid(512), 'AI', random.Random(2))
+        self.assertEqual([d['count'] for d in deployments], [1] * 12)
+
+    def test_accepts_coordinate_list(self):
+        occupied = [(0, 0)]
+        deployments, returned = deploy_ai_units(3, 'infantry', occupied)
+        self.assertIs(returned, occupied)
+        self.assertEqual(len(occupied), 4)
+        self.assertNotIn((0, 0), [(d['x'], d['y']) for d in deployments])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+import launch
+from profiler import RequestProfiler, collapse, sample
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_collapse_format(self):
+        self.assertEqual(collapse({('a', 'b'): 3, ('a',): 5, ('c',): 0}), 'a 5\na;b 3\n')
+
+    def test_request_profiler_charges_self_time(self):
+        profiler = RequestProfiler()
+        profiler.start()
+        spin(0.01)
+        weights = profiler.stop()
+        # Time inside the profiler's own callbacks is left out, so only check where the rest went
+        leaves = {stack[-1] for stack, micros in weights.items() if micros and any(f.startswith('spin ') for f in stack)}
+        self.assertEqual(leaves, {'spin (test_profiler.py:11)', 'time.perf_counter'})
+
+    def test_sample_sees_other_threads(self):
+        thread = threading.Thread(target=spin, args=(0.3,), name='spinner')
+        thread.start()
+        counts = sample(0.1, 200)
+        thread.join()
+        spinner = sum(n for stack, n in counts.items() if stack[0] == 'spinner' and any(f.startswith('spin ') for f in stack))
+        self.assertGreater(spinner, 0)
+
+
+class TestProfilerRoutes(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.dict(os.environ, {'PROFILER_TOKEN': 'secret'}):
+            self.client = launch.create_app().test_client()
+
+    def test_profiled_request_returns_its_stacks(self):
+        response = self.client.post('/submit_round_1', json={}, headers={'X-Profile': 'secret'})
+        self.assertEqual(response.headers['X-Profile-Status'], '200')
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('submit_round_1 (launch.py', response.get_data(as_text=True))
+        self.assertEqual(self.client.post('/submit_round_1', json={}, headers={'X-Profile': 'wrong'}).status_code, 403)
+
+    def test_admin_profile_needs_token_and_sane_arguments(self):
+        self.assertEqual(self.client.get('/admin/profile?seconds=0.05').status_code, 401)
+        auth = {'Authorization': 'Bearer secret'}
+        self.assertEqual(self.client.get('/admin/profile?seconds=600', headers=auth).status_code, 400)
+        response = self.client.get('/admin/profile?seconds=0.05&hz=100', headers=auth)
+        self.assertEqual((response.status_code, response.mimetype), (200, 'text/plain'))
+
+    def test_off_without_token(self):
+        self.assertEqual(launch.app.test_client().get('/admin/profile').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import os
+import random
+import tempfile
+import unittest
+
+import launch
+from game_engine import R2_BASE_RECRUITS, GameEngine
+from game_log import GameLogReader, GameLogWriter, replay
+
+RANGES = {'infantry': 1, 'archers': 2, 'cavalry': 3}
+
+
+def deployments_for(state, rng, stacks=3):
+    # One unit on each of a few free cells, within the player's pool
+    free = state['occupancy'].sample_free_cells(min(stacks, state['player_pool']), rng)
+    return [{'unit_type': rng.choice(['infantry', 'archers', 'cavalry']), 'unit_count': 1, 'x': x, 'y': y} for x, y in free]
+
+
+class TestRoundEngine(unittest.TestCase):
+
+    def play(self, engine, check):
+        rng = random.Random(7)
+        _, state = engine.play_round_1(rng)
+        keys = set(state)
+        for round_number in range(2, engine.rounds + 1):
+            validated, total = engine.validate_round_deployments(state, deployments_for(state, rng))
+            before = check(state, None)
+            results = engine.play_round(state, validated, total, rng)
+            check(results, before)
+            self.assertEqual((results['round'], state['round']), (round_number, round_number))
+        self.assertIn('game_winner', results)
+        # Only what the next round needs is kept, so the state does not grow with the rounds
+        self.assertEqual(set(state), keys)
+        self.assertEqual(state['last_round'], results['summary'])
+        with self.assertRaises(ValueError):
+            engine.play_round(state, [], 0, rng)
+
+    def assert_delta(self, delta, changed, removed):
+        self.assertEqual((sorted(delta.changed), sorted(delta.removed)), (sorted(changed), sorted(removed)))
+
+    def test_journaled_delta_matches_full_diff(self):
+        engine = GameEngine(map_size=9, combat_mode='spatial', move_ranges=RANGES, rounds=5)
+        def check(results, before):
+            if before is None:
+                return results['map'].copy()
+            self.assert_delta(results['map_changes'], *results['map'].diff(before))
+        self.play(engine, check)
+
+    def test_view_delta_matches_full_diff_of_masked_maps(self):
+        engine = GameEngine(map_size=9, combat_mode='spatial', move_ranges=RANGES, sight_ranges=RANGES, rounds=5)
+        def check(results, before):
+            if before is None: # results is the state before the round
+                return results['map'].masked(results['shown_visibility'].bits, 'P1')
+            after = results['map'].masked(results['visibility'].bits, 'P1')
+            self.assert_delta(results['map_changes'], *after.diff(before))
+        self.play(engine, check)
+
+    def test_occupancy_follows_the_map(self):
+        # Moves and losses free cells, and later rounds may deploy on them again
+        engine = GameEngine(map_size=9, combat_mode='spatial', move_ranges=RANGES, rounds=5)
+        rng = random.Random(7)
+        _, state = engine.play_round_1(rng)
+        for _ in range(2, engine.rounds + 1):
+            validated, total = engine.validate_round_deployments(state, deployments_for(state, rng))
+            engine.play_round(state, validated, total, rng)
+            self.assertEqual(sorted(state['occupancy']), sorted((x, y) for x, y, *_ in state['map'].cells()))
+
+    def test_hidden_held_cell_is_dropped_without_naming_it(self):
+        engine = GameEngine(map_size=32, sight_ranges=RANGES, rounds=4)
+        rng = random.Random(5)
+        _, state = engine.play_round_1(rng)
+        engine.play_round(state, [], 0, rng) # R1 positions are public; R2 ones are not
+        shown = state['shown_visibility']
+        hidden = [(x, y) for x, y, owner, *_ in state['map'].cells() if owner == 'AI' and not shown.is_visible(x, y)]
+        self.assertTrue(hidden)
+        x, y = hidden[0]
+        (free,) = state['occupancy'].sample_free_cells(1, rng)
+        pool = state['player_pool']
+        validated, total = engine.validate_round_deployments(state, [
+            {'unit_type': 'archers', 'unit_count': 2, 'x': x, 'y': y},
+            {'unit_type': 'cavalry', 'unit_count': 1, 'x': free[0], 'y': free[1]}])
+        self.assertEqual(total, 3)
+        results = engine.play_round(state, validated, total, rng)
+        self.assertEqual([(d['x'], d['y']) for d in results['player_deployments'].to_dicts()], [free])
+        self.assertEqual(state['map'].get(x, y)['owner'], 'AI')
+        # Only the placed unit was spent; the dropped archers carry over
+        self.assertEqual(results['player_next_data']['base_recruits'], R2_BASE_RECRUITS + pool - 1)
+
+    def test_pools_carry_between_rounds(self):
+        engine = GameEngine(rounds=3)
+        rng = random.Random(3)
+        _, state = engine.play_round_1(rng)
+        r2 = engine.play_round(state, [], 0, rng)
+        # Nothing deployed, so the whole R2 pool carries over on top of the base recruits
+        self.assertGreaterEqual(r2['player_next_data']['total_r3_pool'], 10 + r2['player_next_data']['bonus'] + 10)
+        self.assertEqual(state['player_pool'], r2['player_next_data']['total_r3_pool'])
+
+    def test_at_least_two_rounds(self):
+        with self.assertRaises(ValueError):
+            GameEngine(rounds=1)
+
+
+class TestRoundRoutes(unittest.TestCase):
+
+    def setUp(self):
+        original = launch.game_engine
+        launch.game_engine = GameEngine(sight_ranges=RANGES, rounds=3)
+        self.addCleanup(setattr, launch, 'game_engine', original)
+        self.client = launch.app.test_client()
+        self.game_id = self.client.post('/submit_round_1', json={}).get_json()['game_id']
+
+    def free_cell(self):
+        # The AI deploys at random, so look up a cell nobody has used yet
+        ((x, y),) = launch.game_store.get(self.game_id)['occupancy'].sample_free_cells(1, random.Random(1))
+        return x, y
+
+    def submit(self, round_number, deployments=()):
+        return self.client.post(f'/submit_round_{round_number}', json={
+            'game_id': self.game_id, f'player_deployments_r{round_number}': list(deployments)})
+
+    def test_three_round_game(self):
+        r2 = self.submit(2, [{'unit_type': 'archers', 'unit_count': 2, 'x': 1, 'y': 1}])
+        self.assertEqual(r2.status_code, 200)
+        data = r2.get_json()
+        self.assertIn('total_r3_pool', data['player_r3_data'])
+        self.assertIn('ai_r3_data_for_r3', data)
+        self.assertIn('current_map_state', data)
+        self.assertNotIn('game_winner', data)
+        x, y = self.free_cell()
+        r3 = self.submit(3, [{'unit_type': 'cavalry', 'unit_count': 1, 'x': x, 'y': y}])
+        self.assertEqual(r3.status_code, 200)
+        data = r3.get_json()
+        self.assertEqual(data['game_winner'], data['round_3_results']['round_winner'])
+        self.assertEqual(data['player_r3_deployments'], [{'owner': 'P1', 'unit_type': 'cavalry', 'count': 1, 'x': x, 'y': y}])
+        self.assertIn('final_map_state', data)
+        self.assertEqual(self.submit(3).status_code, 404) # Finished games are gone
+
+    def test_rounds_must_come_in_order(self):
+        self.assertEqual(self.submit(3).status_code, 409)
+        self.assertEqual(self.submit(2).status_code, 200)
+        self.assertEqual(self.submit(2).status_code, 409) # Already played
+        self.assertEqual(self.submit(4).status_code, 409)
+        self.assertEqual(self.submit(3).status_code, 200)
+
+    def test_cells_held_on_the_map_are_taken(self):
+        self.assertEqual(self.submit(2, [{'unit_type': 'archers', 'unit_count': 2, 'x': 1, 'y': 1}]).status_code, 200)
+        r3 = self.submit(3, [{'unit_type': 'archers', 'unit_count': 1, 'x': 1, 'y': 1}])
+        self.assertEqual(r3.status_code, 400)
+        self.assertEqual(r3.get_json()['error'], 'Player R3 cannot deploy to an occupied cell (1,1).')
+
+    def test_three_round_game_logs_and_replays(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        writer = GameLogWriter(os.path.join(tmpdir.name, 'games.log'))
+        self.addCleanup(writer.close)
+        original = launch.game_log
+        launch.game_log = writer
+        self.addCleanup(setattr, launch, 'game_log', original)
+        self.assertEqual(self.submit(2, [{'unit_type': 'archers', 'unit_count': 2, 'x': 1, 'y': 1}]).status_code, 200)
+        x, y = self.free_cell()
+        self.assertEqual(self.submit(3, [{'unit_type': 'cavalry', 'unit_count': 1, 'x': x, 'y': y}]).status_code, 200)
+        writer.flush()
+        with GameLogReader(writer.path) as reader:
+            (record,) = list(reader.games())
+        ((summary, batch),) = record.middle_rounds
+        self.assertEqual(summary[0], 'archers')
+        self.assertEqual(batch.to_dicts(), [{'owner': 'P1', 'unit_type': 'archers', 'count': 2, 'x': 1, 'y': 1}])
+        self.assertEqual(replay(record, GameEngine(sight_ranges=RANGES)), []) # Plays as many rounds as were logged
+
+    def test_interleaved_games_get_their_own_rounds_back(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        writer = GameLogWriter(os.path.join(tmpdir.name, 'games.log'))
+        self.addCleanup(writer.close)
+        original = launch.game_log
+        launch.game_log = writer
+        self.addCleanup(setattr, launch, 'game_log', original)
+        first, second = self.game_id, self.client.post('/submit_round_1', json={}).get_json()['game_id']
+        for game_id, x in ((first, 1), (second, 2)):
+            self.game_id = game_id
+            self.assertEqual(self.submit(2, [{'unit_type': 'archers', 'unit_count': x, 'x': x, 'y': x}]).status_code, 200)
+        for game_id in (second, first):
+            self.game_id = game_id
+            self.assertEqual(self.submit(3).status_code, 200)
+        writer.flush()
+        with GameLogReader(writer.path) as reader:
+            records = {record.game_id: record for record in reader.games()}
+        for game_id, x in ((first, 1), (second, 2)):
+            ((_, batch),) = records[game_id].middle_rounds
+            self.assertEqual(batch.to_dicts(), [{'owner': 'P1', 'unit_type': 'archers', 'count': x, 'x': x, 'y': x}])
+            self.assertEqual(replay(records[game_id], GameEngine(sight_ranges=RANGES)), [])
+
+    def test_one_store_read_and_write_per_round(self):
+        calls = []
+        store = launch.game_store
+        class CountingStore:
+            def __getattr__(self, name):
+                calls.append(name)
+                return getattr(store, name)
+        launch.game_store = CountingStore()
+        self.addCleanup(setattr, launch, 'game_store', store)
+        # A rejected round puts the game back untouched
+        self.assertEqual(self.submit(2, [{'unit_type': 'archers', 'unit_count': 10 ** 6, 'x': 1, 'y': 1}]).status_code, 400)
+        self.assertEqual(calls, ['pop', 'put'])
+        del calls[:]
+        self.assertEqual(self.submit(2).status_code, 200)
+        self.assertEqual(calls, ['pop', 'put'])
+        del calls[:]
+        self.assertEqual(self.submit(3).status_code, 200)
+        self.assertEqual(calls, ['pop']) # Finished games are not put back
+
+
+if __name__ == '__main__':
+    unittest.main()
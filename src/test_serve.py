@@ -0,0 +1,70 @@
+import socket
+import threading
+import time
+import unittest
+
+import launch
+from serve import MAX_DRAIN_BYTES, WorkerServer
+
+
+class TestWorkerServer(unittest.TestCase):
+
+    def setUp(self):
+        listen_socket = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listen_socket.close)
+        server = WorkerServer(listen_socket, launch.app, threads=2, keepalive_timeout=5)
+        thread = threading.Thread(target=server.serve_forever, args=(5,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(server.stop)
+        self.address = listen_socket.getsockname()
+
+    def connect(self):
+        connection = socket.create_connection(self.address, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def read_response(self, connection):
+        # (status line, headers dict, body) of one Content-Length response
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = connection.recv(65536)
+            self.assertTrue(chunk, 'Connection closed before the response')
+            data += chunk
+        head, body = data.split(b'\r\n\r\n', 1)
+        status, *lines = head.decode('latin-1').split('\r\n')
+        headers = {name.lower(): value.strip() for name, value in (line.split(':', 1) for line in lines)}
+        while len(body) < int(headers['content-length']):
+            body += connection.recv(65536)
+        return status, headers, body
+
+    def test_rejected_huge_body_closes_instead_of_draining(self):
+        connection = self.connect()
+        connection.sendall(b'POST /submit_round_2 HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n'
+                           b'Content-Length: 1000000000\r\n\r\n{"game_id": ')
+        start = time.monotonic()
+        status, headers, _ = self.read_response(connection)
+        self.assertIn(' 413 ', status)
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(connection.recv(1), b'') # Closed without waiting for the rest of the body
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_small_unread_body_is_drained_on_keep_alive(self):
+        connection = self.connect()
+        for _ in range(2): # The second request only parses if the first body was read off
+            connection.sendall(b'GET /unit_types HTTP/1.1\r\nHost: test\r\nContent-Length: 5\r\n\r\nhello')
+            status, headers, _ = self.read_response(connection)
+            self.assertIn(' 200 ', status)
+            self.assertNotEqual(headers.get('connection'), 'close')
+
+    def test_large_unread_body_closes_even_on_success(self):
+        connection = self.connect()
+        length = MAX_DRAIN_BYTES + 1
+        connection.sendall(f'GET /unit_types HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n'.encode())
+        status, headers, _ = self.read_response(connection)
+        self.assertIn(' 200 ', status)
+        self.assertEqual(headers['connection'], 'close')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from session_store import InMemorySessionStore, SqliteSessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInMemorySessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = InMemorySessionStore(max_games=3, ttl_seconds=60, clock=self.clock)
+
+    def test_create_and_get(self):
+        game_id = self.store.create({'pool': 10})
+        self.assertEqual(self.store.get(game_id), {'pool': 10})
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_lru_eviction_keeps_recently_used(self):
+        ids = [self.store.create({'n': i}) for i in range(3)]
+        self.store.get(ids[0]) # ids[1] is now least recently used
+        new_id = self.store.create({'n': 3})
+        self.assertEqual(len(self.store), 3)
+        self.assertIsNone(self.store.get(ids[1]))
+        self.assertIsNotNone(self.store.get(ids[0]))
+        self.assertIsNotNone(self.store.get(new_id))
+
+    def test_ttl_expiry(self):
+        game_id = self.store.create({'n': 1})
+        self.clock.now = 59
+        self.assertIsNotNone(self.store.get(game_id)) # Access refreshes the TTL
+        self.clock.now = 118
+        self.assertIsNotNone(self.store.get(game_id))
+        self.clock.now = 200
+        self.assertIsNone(self.store.get(game_id))
+        self.assertEqual(len(self.store), 0)
+
+    def test_delete(self):
+        game_id = self.store.create({'n': 1})
+        self.store.delete(game_id)
+        self.store.delete(game_id) # Unknown ids are ignored
+        self.assertIsNone(self.store.get(game_id))
+
+    def test_pop(self):
+        game_id = self.store.create({'n': 1})
+        self.assertEqual(self.store.pop(game_id), {'n': 1})
+        self.assertIsNone(self.store.pop(game_id)) # Only the first pop gets the game
+        self.assertEqual(len(self.store), 0)
+
+
+class TestSqliteSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'games.sqlite3')
+        self.clock = FakeClock()
+        self.store = SqliteSessionStore(self.path, max_games=3, ttl_seconds=60, clock=self.clock)
+
+    def test_state_shared_between_store_instances(self):
+        # Each worker process opens its own store on the same file
+        game_id = self.store.create({'pool': 10, 'cells': {(1, 2)}})
+        other = SqliteSessionStore(self.path, max_games=3, ttl_seconds=60, clock=self.clock)
+        self.assertEqual(other.get(game_id), {'pool': 10, 'cells': {(1, 2)}})
+        other.delete(game_id)
+        self.assertIsNone(self.store.get(game_id))
+
+    def test_pop(self):
+        game_id = self.store.create({'n': 1})
+        self.assertEqual(self.store.pop(game_id), {'n': 1})
+        self.assertIsNone(self.store.pop(game_id))
+        expired = self.store.create({'n': 2})
+        self.clock.now = 100
+        self.assertIsNone(self.store.pop(expired))
+
+    def test_lru_and_ttl_eviction(self):
+        ids = []
+        for i in range(3):
+            self.clock.now = i
+            ids.append(self.store.create({'n': i}))
+        self.clock.now = 3
+        self.store.get(ids[0]) # ids[1] is now least recently used
+        self.clock.now = 4
+        new_id = self.store.create({'n': 3})
+        self.assertEqual(len(self.store), 3)
+        self.assertIsNone(self.store.get(ids[1]))
+        self.assertIsNotNone(self.store.get(new_id))
+        self.clock.now = 200
+        self.assertIsNone(self.store.get(new_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import random
+import unittest
+
+from combat import CombatEngine
+from game_engine import GameEngine, VALID_UNIT_TYPES, initialize_map, populate_map_from_deployments
+from spatial_combat import AI_CODE, PLAYER_CODE, SpatialCombat
+
+
+def make_map(deployments, size=5):
+    return populate_map_from_deployments(
+        [{'owner': owner, 'unit_type': unit_type, 'count': count, 'x': x, 'y': y} for owner, unit_type, count, x, y in deployments],
+        initialize_map(size))
+
+
+class TestSpatialCombat(unittest.TestCase):
+
+    def setUp(self):
+        self.spatial_combat = SpatialCombat(CombatEngine(VALID_UNIT_TYPES))
+
+    def test_only_adjacent_stacks_engage(self):
+        game_map = make_map([('P1', 'infantry', 10, 2, 2), ('AI', 'infantry', 10, 2, 3),
+                             ('AI', 'infantry', 10, 3, 3), ('P1', 'infantry', 10, 0, 0)])
+        boards, totals = self.spatial_combat.engaged_cells(game_map)
+        self.assertEqual(sorted(boards[PLAYER_CODE]), [2 * 5 + 2])
+        self.assertEqual(sorted(boards[AI_CODE]), [2 * 5 + 3]) # (3,3) only touches (2,3), its ally
+        self.assertEqual(totals, {PLAYER_CODE: 20, AI_CODE: 20})
+
+        result = self.spatial_combat.resolve(game_map)
+        self.assertEqual(result['engagements'], 1)
+        self.assertEqual(result['player_losses'], 5) # 10 * 1.0 * LOSS_RATE each way
+        self.assertEqual(result['ai_losses'], 5)
+        self.assertEqual(result['winner'], 'Draw')
+
+    def test_no_wrap_across_rows(self):
+        # (0, 4) and (1, 0) are consecutive flat cells but not neighbours
+        game_map = make_map([('P1', 'archers', 5, 0, 4), ('AI', 'archers', 5, 1, 0)])
+        result = self.spatial_combat.resolve(game_map)
+        self.assertEqual(result['engagements'], 0)
+        self.assertEqual(result['cell_losses'], [])
+
+    def test_type_modifier_and_split_attention(self):
+        # AI cavalry beats infantry; its 8 units split over the two infantry stacks it touches
+        game_map = make_map([('P1', 'infantry', 4, 1, 0), ('P1', 'infantry', 4, 1, 2), ('AI', 'cavalry', 8, 1, 1)])
+        result = self.spatial_combat.resolve(game_map)
+        losses = {(cell, owner): lost for cell, owner, lost in result['cell_losses']}
+        self.assertEqual(losses[(5, PLAYER_CODE)], 3)  # 4 * 1.25 * 0.5 = 2.5, rounded half up
+        self.assertEqual(losses[(7, PLAYER_CODE)], 3)
+        self.assertEqual(losses[(6, AI_CODE)], 4)      # 4 + 4 at 1.0, halved
+        self.assertEqual(result['engagements'], 2)
+        self.assertEqual(result['winner'], 'AI')
+
+    def test_matches_brute_force_on_random_maps(self):
+        rng = random.Random(7)
+        for size in (3, 8, 17):
+            deployments, taken = [], set()
+            for _ in range(size * size // 2):
+                x, y = rng.randrange(size), rng.randrange(size)
+                if (x, y) not in taken:
+                    taken.add((x, y))
+                    deployments.append((rng.choice(['P1', 'AI']), rng.choice(VALID_UNIT_TYPES), rng.randint(1, 9), x, y))
+            boards, _ = self.spatial_combat.engaged_cells(make_map(deployments, size))
+            owners = {(x, y): owner for owner, _, _, x, y in deployments}
+            expected = {PLAYER_CODE: set(), AI_CODE: set()}
+            for (x, y), owner in owners.items():
+                for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                    if owners.get((nx, ny), owner) != owner:
+                        expected[PLAYER_CODE if owner == 'P1' else AI_CODE].add(x * size + y)
+            self.assertEqual({code: set(cells) for code, cells in boards.items()}, expected)
+
+    def test_apply_losses_removes_wiped_stacks(self):
+        game_map = make_map([('P1', 'infantry', 3, 0, 0), ('AI', 'archers', 4, 0, 1), ('AI', 'cavalry', 2, 4, 4)])
+        game_map.apply_losses([(0, 3), (1, 1)])
+        self.assertIsNone(game_map.get(0, 0))
+        self.assertEqual(game_map.get(0, 1)['count'], 3)
+        self.assertEqual(game_map.get(4, 4)['count'], 2)
+        self.assertEqual(len(game_map), 2)
+
+
+class TestSpatialGameEngine(unittest.TestCase):
+
+    def test_rounds_apply_losses_to_the_map(self):
+        engine = GameEngine(combat_mode='spatial')
+        r1, state = engine.play_round_1(random.Random(1))
+        self.assertEqual(r1['spatial_combat']['engagements'], 0) # Opening armies sit in opposite corners
+        deployments = [{'owner': 'P1', 'unit_type': 'cavalry', 'count': 10, 'x': 3, 'y': 4},
+                       {'owner': 'P1', 'unit_type': 'cavalry', 'count': 10, 'x': 4, 'y': 3}]
+        r2 = engine.play_round_2(state, deployments, 20, random.Random(2))
+        summary = r2['spatial_combat']
+        self.assertGreater(summary['engagements'], 0)
+        self.assertGreater(summary['ai_losses'], 0)
+        lost_ai_units = sum(loss['lost'] for loss in summary['cell_losses'] if loss['owner'] == 'AI')
+        self.assertEqual(lost_ai_units, summary['ai_losses'])
+        on_map = sum(count for _, _, owner, _, count in r2['map'].cells() if owner == 'AI')
+        self.assertEqual(on_map, r2['ai_army']['strength'])
+        self.assertIs(state['map'], r2['map']) # The game's map is carried forward in place
+
+    def test_spatial_mode_needs_maps(self):
+        with self.assertRaises(ValueError):
+            GameEngine(combat_mode='spatial', build_maps=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
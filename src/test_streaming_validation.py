@@ -0,0 +1,131 @@
+import io
+import json
+import unittest
+
+import launch
+from json_stream import JSONObjectStream, JSONStreamError, PayloadTooLarge
+
+
+class TestJSONObjectStream(unittest.TestCase):
+
+    def read(self, body, chunk_size=7, max_bytes=10**6):
+        stream = JSONObjectStream(io.BytesIO(body.encode('utf-8')), max_bytes, stream_keys=('items',), chunk_size=chunk_size)
+        return [(key, list(value) if key == 'items' and hasattr(value, '__next__') else value)
+                for key, value in stream.members()]
+
+    def test_matches_json_loads_across_chunk_boundaries(self):
+        data = {'game_id': 'abc', 'items': [{'x': 12345, 'name': 'café ☃'}, 3.25, None, [1, [2]], 'a,]}'],
+                'tail': {'nested': [True, False]}}
+        body = json.dumps(data)
+        for chunk_size in (1, 2, 3, 7, 64):
+            self.assertEqual(dict(self.read(body, chunk_size)), data, chunk_size)
+
+    def test_number_at_end_of_chunk_is_not_cut(self):
+        self.assertEqual(self.read('{"items": [1234567]}', chunk_size=12), [('items', [1234567])])
+
+    def test_empty_object_and_array(self):
+        self.assertEqual(self.read('{}'), [])
+        self.assertEqual(self.read(' {"items" : [ ] } '), [('items', [])])
+
+    def test_invalid_json(self):
+        for body in ('', '[1]', '{"items": [1,, 2]}', '{"items": [1] "x": 2}', '{"a": 1} extra', '{"a": tru}'):
+            with self.assertRaises(JSONStreamError, msg=body):
+                self.read(body)
+
+    def test_size_limit(self):
+        body = json.dumps({'items': list(range(1000))})
+        with self.assertRaises(PayloadTooLarge):
+            self.read(body, chunk_size=64, max_bytes=500)
+
+
+class TestStreamingR2Route(unittest.TestCase):
+
+    def setUp(self):
+        self.client = launch.app.test_client()
+
+    def start_game(self):
+        r1 = self.client.post('/submit_round_1', json={}).get_json()
+        return r1['game_id'], r1['player_r2_data']['total_r2_pool']
+
+    def test_reports_all_errors_at_once(self):
+        game_id, budget = self.start_game()
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': [
+            {'unit_type': 'dragons', 'unit_count': 1, 'x': 1, 'y': 1},
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 9, 'y': 9},
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 0, 'y': 0}, # Player's R1 cell
+            {'unit_type': 'archers', 'unit_count': budget, 'x': 2, 'y': 2},
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 2, 'y': 2},
+            {'unit_type': 'archers', 'unit_count': -1, 'x': 3, 'y': 3}
+        ]})
+        self.assertEqual(r2.status_code, 400)
+        data = r2.get_json()
+        self.assertEqual(data['error'], 'R2: Invalid unit_type: dragons.')
+        self.assertEqual([error['index'] for error in data['errors']], [0, 1, 2, 4, 5])
+        self.assertEqual(data['error_count'], 5)
+        # The game is still playable after a rejected submission
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': []})
+        self.assertEqual(r2.status_code, 200)
+
+    def test_budget_error(self):
+        game_id, budget = self.start_game()
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': [
+            {'unit_type': 'archers', 'unit_count': budget, 'x': 1, 'y': 1},
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 2, 'y': 2}
+        ]})
+        self.assertEqual(r2.status_code, 400)
+        self.assertEqual(r2.get_json()['errors'], [
+            {'index': None, 'message': f'Player R2 deployment ({budget + 1}) exceeds budget of {budget}.'}])
+
+    def test_non_finite_counts_are_item_errors(self):
+        game_id, _ = self.start_game()
+        body = '{"game_id": "%s", "player_deployments_r2": [' % game_id + ', '.join(
+            '{"unit_type": "archers", "unit_count": %s, "x": %d, "y": 1}' % (count, x)
+            for x, count in enumerate(('Infinity', '-Infinity', 'NaN', '1e400'), 1)) + ']}'
+        r2 = self.client.post('/submit_round_2', data=body, content_type='application/json')
+        self.assertEqual(r2.status_code, 400)
+        self.assertEqual(r2.get_json()['errors'], [{'index': i, 'message': 'R2: Invalid unit_count format.'} for i in range(4)])
+
+    def test_count_too_large_for_a_batch_is_an_item_error(self):
+        game_id, budget = self.start_game()
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': [
+            {'unit_type': 'archers', 'unit_count': 10 ** 20, 'x': 1, 'y': 1},
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 2, 'y': 2}
+        ]})
+        self.assertEqual(r2.status_code, 400)
+        self.assertEqual(r2.get_json()['errors'], [
+            {'index': 0, 'message': f'R2 unit count ({10 ** 20}) exceeds budget of {budget}.'}])
+        # Beyond int64 even when the budget is not
+        state = dict(launch.game_store.get(game_id), player_pool=2 ** 70)
+        validator = launch.game_engine.round_validator(state)
+        validator.add({'unit_type': 'archers', 'unit_count': 2 ** 64, 'x': 1, 'y': 1})
+        self.assertEqual(validator.error_count, 1)
+
+    def test_game_id_may_come_after_deployments(self):
+        game_id, _ = self.start_game()
+        body = '{"player_deployments_r2": [{"unit_type": "archers", "unit_count": 1, "x": 1, "y": 1}], "game_id": "%s"}' % game_id
+        r2 = self.client.post('/submit_round_2', data=body, content_type='application/json')
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.get_json()['player_r2_deployments'][0]['count'], 1)
+
+    def test_oversized_body_is_rejected(self):
+        original = launch.MAX_R2_BODY_BYTES
+        launch.MAX_R2_BODY_BYTES = 100
+        self.addCleanup(setattr, launch, 'MAX_R2_BODY_BYTES', original)
+        game_id, _ = self.start_game()
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': [
+            {'unit_type': 'archers', 'unit_count': 1, 'x': 1, 'y': 1}] * 10})
+        self.assertEqual(r2.status_code, 413)
+
+    def test_invalid_body(self):
+        r2 = self.client.post('/submit_round_2', data='{"game_id": ', content_type='application/json')
+        self.assertEqual(r2.status_code, 400)
+        self.assertEqual(r2.get_json()['error'], 'Invalid request, no JSON data received.')
+        r2 = self.client.post('/submit_round_2', json={'player_deployments_r2': []})
+        self.assertEqual(r2.get_json()['error'], 'Missing game_id from Round 1.')
+        game_id, _ = self.start_game()
+        r2 = self.client.post('/submit_round_2', json={'game_id': game_id, 'player_deployments_r2': 'all'})
+        self.assertEqual(r2.get_json()['error'], 'Invalid player_deployments_r2 format.')
+
+
+if __name__ == '__main__':
+    unittest.main()
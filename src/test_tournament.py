@@ -0,0 +1,58 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+import tournament
+from game_engine import DeploymentError, GameEngine
+
+
+class TestGameEngine(unittest.TestCase):
+
+    def test_seeded_games_replay_exactly(self):
+        engine = GameEngine()
+        strategy = tournament.resolve_strategy('ai', engine.unit_types)
+        first = tournament.play_game(engine, strategy, random.Random(99))
+        second = tournament.play_game(engine, strategy, random.Random(99))
+        self.assertEqual(first[1]['ai_r2_deployments'], second[1]['ai_r2_deployments'])
+        self.assertEqual(first[0]['round_winner'], second[0]['round_winner'])
+
+    def test_validation_raises_deployment_error(self):
+        engine = GameEngine()
+        _, state = engine.play_round_1(random.Random(1))
+        with self.assertRaises(DeploymentError) as ctx:
+            engine.validate_round_2_deployments(state, [{'unit_type': 'infantry', 'unit_count': 1, 'x': 0, 'y': 0}])
+        self.assertIn('R1 occupied cell', str(ctx.exception))
+
+
+class TestTournament(unittest.TestCase):
+
+    def test_run_chunk_is_deterministic_and_complete(self):
+        stats = tournament.run_chunk((7, 0, 200, 'counter'))
+        self.assertEqual(stats, tournament.run_chunk((7, 0, 200, 'counter')))
+        self.assertEqual(stats['games'], 200)
+        self.assertEqual(sum(stats['game_winner'].values()), 200)
+        r1_games = sum(sum(c.values()) for key, c in stats['matchups'].items() if key.startswith('r1:'))
+        self.assertEqual(r1_games, 200)
+
+    def test_plays_the_configured_unit_types(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'units.json')
+        with open(path, 'w') as f:
+            json.dump({'unit_types': [
+                {'name': 'infantry', 'beats': ['pikemen']},
+                {'name': 'pikemen', 'beats': {'infantry': 3.0}}
+            ]}, f)
+        stats = tournament.run_chunk((7, 0, 200, 'pikemen', 0, path))
+        types = {part for key in stats['matchups'] for part in key.split(':')[1:]}
+        self.assertEqual(types, {'infantry', 'pikemen'})
+        self.assertEqual(stats['games'], 200)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            tournament.resolve_strategy('pikemen', GameEngine().unit_types)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import launch
+from combat import CombatEngine
+from game_engine import GameEngine, VALID_UNIT_TYPES
+from unit_registry import UnitConfigError, UnitRegistry, compile_unit_config, load_unit_config
+
+FOUR_TYPES = {
+    'default_advantage_modifier': 1.25,
+    'unit_types': [
+        {'name': 'infantry', 'beats': ['archers']},
+        {'name': 'archers', 'beats': ['cavalry']},
+        {'name': 'cavalry', 'beats': ['infantry']},
+        {'name': 'pikemen', 'beats': {'cavalry': 1.5}, 'hp': 11}
+    ]
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUnitConfig(unittest.TestCase):
+
+    def test_default_config_matches_builtin_rules(self):
+        unit_set = load_unit_config()
+        builtin = CombatEngine(VALID_UNIT_TYPES)
+        self.assertEqual(unit_set.unit_types, VALID_UNIT_TYPES)
+        for attacker in VALID_UNIT_TYPES:
+            for defender in VALID_UNIT_TYPES:
+                self.assertEqual(unit_set.combat_engine.modifier(attacker, defender), builtin.modifier(attacker, defender))
+
+    def test_per_pair_modifiers_and_stats(self):
+        unit_set = compile_unit_config(FOUR_TYPES)
+        self.assertEqual(unit_set.combat_engine.modifier('pikemen', 'cavalry'), 1.5)
+        self.assertEqual(unit_set.combat_engine.modifier('cavalry', 'pikemen'), 1.0)
+        self.assertEqual(unit_set.stats['pikemen'], {'label': 'Pikemen', 'hp': 11})
+        described = {unit['name']: unit for unit in unit_set.describe()['unit_types']}
+        self.assertEqual(described['pikemen']['modifiers'], {'cavalry': 1.5})
+
+    def test_invalid_configs(self):
+        for config in ({'unit_types': []},
+                       {'unit_types': [{'name': 'a'}, {'name': 'a'}]},
+                       {'unit_types': [{'name': 'a', 'beats': ['ghost']}]},
+                       {'unit_types': [{'name': 'a', 'beats': {'a': -1}}]}):
+            with self.assertRaises(UnitConfigError):
+                compile_unit_config(config)
+
+    def test_engine_accepts_configured_types(self):
+        unit_set = compile_unit_config(FOUR_TYPES)
+        engine = GameEngine(unit_set.unit_types, combat_engine=unit_set.combat_engine)
+        _, state = engine.play_round_1(random.Random(1))
+        validated, total = engine.validate_round_2_deployments(state, [{'unit_type': 'pikemen', 'unit_count': 3, 'x': 1, 'y': 1}])
+        self.assertEqual(total, 3)
+        r2 = engine.play_round_2(state, validated, total, random.Random(2))
+        self.assertEqual(r2['player_army']['type'], 'pikemen')
+
+
+class TestUnitRegistry(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'units.json')
+        self.write({'unit_types': FOUR_TYPES['unit_types'][:3]})
+        self.clock = FakeClock()
+        self.registry = UnitRegistry(self.path, check_interval=1.0, clock=self.clock)
+
+    def write(self, config):
+        with open(self.path, 'w') as f:
+            json.dump(config, f)
+        # Make the change visible even on filesystems with coarse mtimes
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9 * getattr(self, 'writes', 0)))
+        self.writes = getattr(self, 'writes', 0) + 1
+
+    def test_reloads_changed_file_after_interval(self):
+        self.write(FOUR_TYPES)
+        self.assertFalse(self.registry.refresh()) # Not yet time to check
+        self.clock.now = 1.0
+        self.assertTrue(self.registry.refresh())
+        self.assertEqual(self.registry.current.version, 2)
+        self.assertIn('pikemen', self.registry.current.unit_types)
+        self.clock.now = 2.0
+        self.assertFalse(self.registry.refresh()) # Unchanged since
+
+    def test_broken_config_keeps_previous(self):
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertFalse(self.registry.reload())
+        self.assertEqual(self.registry.current.unit_types, VALID_UNIT_TYPES)
+        self.assertEqual(self.registry.current.version, 1)
+
+    def test_config_without_r1_opening_type_keeps_previous(self):
+        self.write({'unit_types': FOUR_TYPES['unit_types'][1:]}) # No infantry, which the player always opens with
+        self.clock.now = 1.0
+        self.assertFalse(self.registry.refresh())
+        self.assertEqual(self.registry.current.unit_types, VALID_UNIT_TYPES)
+        unit_set = self.registry.current
+        engine = GameEngine(unit_set.unit_types, combat_engine=unit_set.combat_engine)
+        r1, _ = engine.play_round_1(random.Random(1))
+        self.assertEqual(r1['player_army']['type'], 'infantry')
+
+
+class TestUnitTypesEndpoint(unittest.TestCase):
+
+    def test_lists_active_unit_types(self):
+        data = launch.app.test_client().get('/unit_types').get_json()
+        self.assertEqual([unit['name'] for unit in data['unit_types']], VALID_UNIT_TYPES)
+        self.assertEqual(data['unit_types'][0]['modifiers'], {'archers': 1.25})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import launch
+import wire_format
+from launch import app
+
+
+class TestWireFormat(unittest.TestCase):
+
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+
+    def _start_game(self, **kwargs):
+        return self.client.post('/submit_round_1', json={}, **kwargs)
+
+    def test_default_stays_dense_json(self):
+        response = self._start_game(headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'application/json')
+        data = response.get_json()
+        self.assertEqual(len(data['current_map_state']), 5)
+        self.assertIn('player_r1_deployments', data)
+
+    def test_sparse_json_r1(self):
+        response = self._start_game(headers={'Accept': wire_format.SPARSE_JSON})
+        self.assertEqual(response.mimetype, wire_format.SPARSE_JSON)
+        data = json.loads(response.data)
+        encoded = data['current_map_state']
+        self.assertEqual(encoded['encoding'], 'sparse')
+        self.assertEqual(encoded['cells'][:5], [0, 0, 1, 0, 10]) # P1 infantry x10 at (0,0)
+        self.assertEqual(len(encoded['cells']), 10)
+        self.assertNotIn('player_r1_deployments', data)
+
+    def test_binary_r2_delta_roundtrip(self):
+        r1 = self._start_game(headers={'Accept': wire_format.BINARY})
+        metadata, size, cells, removed, is_delta = wire_format.decode_binary(r1.data)
+        self.assertEqual(size, 5)
+        self.assertFalse(is_delta)
+        self.assertIn((0, 0, 'P1', 'infantry', 10), cells)
+
+        r2 = self.client.post('/submit_round_2?delta=1', headers={'Accept': wire_format.BINARY}, json={
+            'game_id': metadata['game_id'],
+            'player_deployments_r2': [{'unit_type': 'cavalry', 'unit_count': 2, 'x': 1, 'y': 1}]
+        })
+        self.assertEqual(r2.status_code, 200)
+        metadata, _, cells, removed, is_delta = wire_format.decode_binary(r2.data)
+        self.assertTrue(is_delta)
+        self.assertEqual(metadata['map_key'], 'final_map_state')
+        self.assertIn((1, 1, 'P1', 'cavalry', 2), cells)
+        self.assertNotIn((0, 0, 'P1', 'infantry', 10), cells) # Unchanged since R1, so not resent
+        self.assertEqual(removed, [])
+
+    def test_large_bodies_are_gzipped(self):
+        with mock.patch.object(wire_format, 'COMPRESS_MIN_BYTES', 100):
+            response = self._start_game(headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        data = json.loads(gzip.decompress(response.data))
+        self.assertIn('round_1_results', data)
+
+    def test_compressing_changes_a_strong_etag(self):
+        for etag, weak, expected in (('abc', False, '"abc-deflate"'), ('abc', True, 'W/"abc"')):
+            with app.test_request_context(headers={'Accept-Encoding': 'deflate'}):
+                response = app.response_class(b'{}' * 1000, mimetype='application/json')
+                response.set_etag(etag, weak)
+                response = launch.compress_response(response)
+            self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+            self.assertEqual(response.headers['ETag'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
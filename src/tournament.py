@@ -0,0 +1,191 @@
+"""
+Headless tournament simulator: plays full R1 -> R2 games through GameEngine across a process pool.
+Run from src/:  python tournament.py --games 1000000 --workers 8 --player ai --seed 42
+Add --ai planner to pit the players against the Monte Carlo AI planner instead of the random AI.
+Unit types and modifiers come from --unit-config (unit_types.json by default), as on the server.
+
+Games are split into chunks of --chunk-size; each chunk gets its own random.Random seeded from
+(--seed, chunk index), so results are reproducible regardless of worker count or scheduling.
+Aggregated win counts per (round, player type, AI type) matchup are streamed as JSON lines.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from ai_planner import MonteCarloPlanner
+from deployments import DeploymentBatch
+from game_engine import GameEngine, deploy_ai_units
+from unit_registry import DEFAULT_CONFIG_PATH, load_unit_config
+
+
+# --- Scripted player strategies for R2 ---
+# Each takes (engine, r1_results, rng) and returns the unit type the player recruits in R2.
+def strategy_ai(engine, r1, rng):
+    return rng.choice(engine.unit_types) # Same as the server's random AI
+
+def strategy_counter(engine, r1, rng):
+    # Recruit whatever beats the type the AI revealed in R1
+    ai_type = r1['ai_army']['type']
+    for unit_type in engine.unit_types:
+        if engine.combat_engine.modifier(unit_type, ai_type) > 1.0:
+            return unit_type
+    return rng.choice(engine.unit_types)
+
+def make_fixed_strategy(unit_type):
+    def strategy_fixed(engine, r1, rng):
+        return unit_type
+    return strategy_fixed
+
+PLAYER_STRATEGIES = {'ai': strategy_ai, 'counter': strategy_counter}
+
+
+def resolve_strategy(name, unit_types):
+    if name in PLAYER_STRATEGIES:
+        return PLAYER_STRATEGIES[name]
+    if name in unit_types:
+        return make_fixed_strategy(name)
+    raise ValueError(f"Unknown player strategy '{name}'. Choose from {sorted(PLAYER_STRATEGIES)} or a unit type.")
+
+
+def new_stats():
+    return {'games': 0, 'matchups': {}, 'game_winner': {'Player': 0, 'AI': 0, 'Draw': 0}}
+
+def record(stats, round_name, player_type, ai_type, winner):
+    key = f'{round_name}:{player_type}:{ai_type}'
+    counts = stats['matchups'].get(key)
+    if counts is None:
+        counts = stats['matchups'][key] = {'Player': 0, 'AI': 0, 'Draw': 0}
+    counts[winner] += 1
+
+def merge_stats(into, other):
+    into['games'] += other['games']
+    for key, counts in other['matchups'].items():
+        target = into['matchups'].setdefault(key, {'Player': 0, 'AI': 0, 'Draw': 0})
+        for winner, n in counts.items():
+            target[winner] += n
+    for winner, n in other['game_winner'].items():
+        into['game_winner'][winner] += n
+
+
+def play_game(engine, strategy, rng):
+    """Plays one headless game. Returns (r1_results, r2_results)."""
+    r1, state = engine.play_round_1(rng)
+    unit_type = strategy(engine, r1, rng)
+    player_deployments, _ = deploy_ai_units(
+        state['player_pool'], unit_type, state['occupancy'].copy(), 'P1', rng,
+        DeploymentBatch(engine.map_size, engine.unit_types)
+    )
+    total = player_deployments.total()
+    r2 = engine.play_round_2(state, player_deployments, total, rng)
+    return r1, r2
+
+
+def make_engine(unit_set):
+    # Combat never reads the map, so skip building it
+    return GameEngine(unit_set.unit_types, combat_engine=unit_set.combat_engine, build_maps=False)
+
+
+def run_chunk(task):
+    """
+    Worker entry point. task = (seed, chunk_index, games, strategy_name[, planner_samples[, unit_config_path]]).
+    planner_samples > 0 has the AI use the Monte Carlo planner with that many sampled player
+    responses per decision instead of a time budget, so results stay reproducible.
+    unit_config_path defaults to the server's unit_types.json.
+    """
+    seed, chunk_index, games, strategy_name = task[:4]
+    planner_samples = task[4] if len(task) > 4 else 0
+    engine = make_engine(load_unit_config(task[5] if len(task) > 5 else DEFAULT_CONFIG_PATH))
+    if planner_samples > 0:
+        engine.ai_planner = MonteCarloPlanner(engine.combat_engine, budget_seconds=float('inf'),
+                                              batch_size=min(planner_samples, 256), max_samples=planner_samples)
+    strategy = resolve_strategy(strategy_name, engine.unit_types)
+    rng = random.Random(f'{seed}:{chunk_index}')
+    stats = new_stats()
+    for _ in range(games):
+        r1, r2 = play_game(engine, strategy, rng)
+        record(stats, 'r1', r1['player_army']['type'], r1['ai_army']['type'], r1['round_winner'])
+        record(stats, 'r2', r2['player_army']['type'], r2['ai_army']['type'], r2['round_winner'])
+        stats['game_winner'][r2['game_winner']] += 1
+        stats['games'] += 1
+    return stats
+
+
+def snapshot(stats, elapsed):
+    """Aggregated stats plus win rates, as a JSON-able dict."""
+    matchups = {}
+    for key, counts in sorted(stats['matchups'].items()):
+        games = sum(counts.values())
+        matchups[key] = dict(counts, games=games,
+                             player_win_rate=counts['Player'] / games, ai_win_rate=counts['AI'] / games)
+    return {
+        'games': stats['games'],
+        'elapsed_seconds': round(elapsed, 3),
+        'games_per_second': round(stats['games'] / elapsed, 1) if elapsed > 0 else None,
+        'game_winner': stats['game_winner'],
+        'matchups': matchups
+    }
+
+
+def print_table(snap, stream):
+    print(f"{'matchup':<28} {'games':>10} {'player_win':>11} {'ai_win':>8}", file=stream)
+    for key, row in snap['matchups'].items():
+        print(f"{key:<28} {row['games']:>10} {row['player_win_rate']:>11.4f} {row['ai_win_rate']:>8.4f}", file=stream)
+    print(f"{snap['games']} games in {snap['elapsed_seconds']}s ({snap['games_per_second']} games/s); "
+          f"game winners: {snap['game_winner']}", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless AI-vs-AI / scripted-vs-AI tournament simulator.')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Games per worker task.')
+    parser.add_argument('--player', default='ai', help="R2 player strategy: 'ai', 'counter' or a unit type.")
+    parser.add_argument('--ai', choices=('random', 'planner'), default='random', help='AI unit type selection.')
+    parser.add_argument('--planner-samples', type=int, default=256, help='Player responses sampled per planner decision.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--unit-config', default=DEFAULT_CONFIG_PATH, help='Unit types JSON config to play with.')
+    parser.add_argument('--output', default='-', help="File for JSON-lines snapshots, '-' for stdout.")
+    parser.add_argument('--report-every', type=int, default=10, help='Emit a snapshot every N finished chunks.')
+    parser.add_argument('--table', action='store_true', help='Print a final win-rate table to stderr.')
+    args = parser.parse_args(argv)
+
+    # Fail fast on a bad config or a typo, before forking
+    try:
+        unit_set = load_unit_config(args.unit_config)
+        resolve_strategy(args.player, unit_set.unit_types)
+    except ValueError as e: # UnitConfigError included
+        parser.error(str(e))
+    tasks = []
+    remaining, chunk_index = args.games, 0
+    while remaining > 0:
+        games = min(args.chunk_size, remaining)
+        tasks.append((args.seed, chunk_index, games, args.player, args.planner_samples if args.ai == 'planner' else 0,
+                      args.unit_config))
+        remaining -= games
+        chunk_index += 1
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    totals = new_stats()
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            for done, chunk_stats in enumerate(pool.imap_unordered(run_chunk, tasks), start=1):
+                merge_stats(totals, chunk_stats)
+                if done % args.report_every == 0 and done != len(tasks):
+                    out.write(json.dumps(snapshot(totals, time.perf_counter() - start)) + '\n')
+                    out.flush()
+        final = snapshot(totals, time.perf_counter() - start)
+        out.write(json.dumps(final) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.table:
+        print_table(final, sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
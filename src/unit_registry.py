@@ -0,0 +1,167 @@
+"""
+Unit types loaded from a JSON config file (unit_types.json by default) and compiled into a
+CombatEngine: integer type codes plus a flat modifier table, so lookups stay O(1) however
+many types are configured.
+
+Config format:
+    {
+        "default_advantage_modifier": 1.25,
+        "unit_types": [
+            {"name": "infantry", "label": "Infantry", "beats": ["archers"], "hp": 10, ...},
+            {"name": "archers", "beats": {"cavalry": 1.5}},   # per-pair modifier
+            ...
+        ]
+    }
+Keys other than name/label/beats (hp, move_range, ...) are passed through as unit stats.
+The player's fixed R1 army (game_engine.PLAYER_R1_UNIT_TYPE) must stay among the types.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from combat import CombatEngine
+from game_engine import PLAYER_R1_UNIT_TYPE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'unit_types.json')
+
+
+class UnitConfigError(ValueError):
+    """The unit config is malformed. str(error) says what is wrong."""
+
+
+class UnitTypeSet:
+    """
+    One compiled, immutable unit config.
+    - unit_types: List of type names in code order.
+    - combat_engine: CombatEngine with the configured modifiers.
+    - stats: Dict of type name -> dict of its label and extra stats.
+    - version: Integer, increases with every successful reload.
+    """
+
+    __slots__ = ('unit_types', 'combat_engine', 'stats', 'version')
+
+    def __init__(self, unit_types, combat_engine, stats, version):
+        self.unit_types = unit_types
+        self.combat_engine = combat_engine
+        self.stats = stats
+        self.version = version
+
+    def describe(self):
+        """JSON-able description for clients."""
+        modifiers = {}
+        for attacker in self.unit_types:
+            for defender in self.unit_types:
+                modifier = self.combat_engine.modifier(attacker, defender)
+                if modifier != 1.0:
+                    modifiers.setdefault(attacker, {})[defender] = modifier
+        return {
+            'version': self.version,
+            'unit_types': [dict(self.stats[name], name=name, modifiers=modifiers.get(name, {})) for name in self.unit_types]
+        }
+
+
+def compile_unit_config(config, version=1):
+    """Validates a parsed config dict and returns a UnitTypeSet. Raises UnitConfigError."""
+    if not isinstance(config, dict) or not isinstance(config.get('unit_types'), list) or not config['unit_types']:
+        raise UnitConfigError("Config needs a non-empty 'unit_types' list.")
+    default_modifier = config.get('default_advantage_modifier', 1.25)
+    if not isinstance(default_modifier, (int, float)) or default_modifier <= 0:
+        raise UnitConfigError('default_advantage_modifier must be a positive number.')
+
+    unit_types, stats, beats_by_type = [], {}, {}
+    for entry in config['unit_types']:
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not name:
+            raise UnitConfigError(f'Every unit type needs a non-empty string name, got {entry!r}.')
+        if name in stats:
+            raise UnitConfigError(f'Duplicate unit type {name!r}.')
+        unit_types.append(name)
+        stats[name] = {key: value for key, value in entry.items() if key not in ('name', 'beats')}
+        stats[name].setdefault('label', name.capitalize())
+        beats_by_type[name] = entry.get('beats', [])
+    if PLAYER_R1_UNIT_TYPE not in stats:
+        raise UnitConfigError(f'Unit types must include {PLAYER_R1_UNIT_TYPE!r}, the player\'s fixed R1 army.')
+
+    modifiers = {}
+    for attacker, beats in beats_by_type.items():
+        if isinstance(beats, list):
+            beats = {defender: default_modifier for defender in beats}
+        if not isinstance(beats, dict):
+            raise UnitConfigError(f"'beats' of {attacker!r} must be a list or an object.")
+        for defender, modifier in beats.items():
+            if defender not in stats:
+                raise UnitConfigError(f'{attacker!r} beats unknown unit type {defender!r}.')
+            if not isinstance(modifier, (int, float)) or modifier <= 0:
+                raise UnitConfigError(f'Modifier for {attacker!r} vs {defender!r} must be a positive number.')
+            modifiers[(attacker, defender)] = modifier
+
+    return UnitTypeSet(unit_types, CombatEngine(unit_types, beats={}, modifiers=modifiers), stats, version)
+
+
+def load_unit_config(path=DEFAULT_CONFIG_PATH, version=1):
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise UnitConfigError(f'Cannot read unit config {path}: {e}') from e
+    return compile_unit_config(config, version)
+
+
+class UnitRegistry:
+    """
+    The current UnitTypeSet, reloaded when the config file changes on disk.
+    - path: String, config file path.
+    - check_interval: Seconds between stat() calls in refresh(), so checking on every
+      request costs a clock read most of the time.
+    A config that fails to load is logged and ignored; the previous one stays active.
+    """
+
+    def __init__(self, path=DEFAULT_CONFIG_PATH, check_interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file_signature = self._signature()
+        self.current = load_unit_config(path) # A broken config at startup is fatal
+        self._next_check = clock() + check_interval
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self):
+        """Reloads if the file changed since the last check. Returns True if a new config took effect."""
+        now = self._clock()
+        if now < self._next_check:
+            return False
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            signature = self._signature()
+            if signature is None or signature == self._file_signature:
+                return False
+            self._file_signature = signature
+            return self._load()
+
+    def reload(self):
+        """Reloads unconditionally. Returns True on success."""
+        with self._lock:
+            self._file_signature = self._signature()
+            return self._load()
+
+    def _load(self):
+        try:
+            self.current = load_unit_config(self.path, self.current.version + 1)
+        except UnitConfigError as e:
+            logger.error(f'Keeping unit config version {self.current.version}: {e}')
+            return False
+        logger.info(f'Loaded unit config version {self.current.version}: {self.current.unit_types}')
+        return True
@@ -0,0 +1,123 @@
+import gzip
+import json
+import struct
+import zlib
+
+from game_map import OWNERS, MapDelta
+
+# --- Media types ---
+DENSE_JSON = 'application/json'
+SPARSE_JSON = 'application/vnd.rts.sparse+json'
+BINARY = 'application/vnd.rts.map+octet-stream'
+# Order matters: best_match prefers earlier entries on ties, so '*/*' and
+# clients that send no Accept header keep getting the dense JSON contract.
+MAP_FORMATS = [DENSE_JSON, SPARSE_JSON, BINARY]
+
+COMPRESSIBLE_MIMETYPES = {DENSE_JSON, SPARSE_JSON, BINARY, 'text/html', 'text/css', 'text/javascript', 'application/javascript'}
+COMPRESS_MIN_BYTES = 1024
+
+# --- Binary layout (little-endian) ---
+# header: magic, version, flags, reserved, map size, metadata length
+# then:   metadata JSON (utf-8), u32 cell count, cells, u32 removed count, removed cell indexes
+BINARY_MAGIC = b'RTSM'
+BINARY_VERSION = 1
+FLAG_DELTA = 0x01
+HEADER = struct.Struct('<4sBBHII')
+CELL = struct.Struct('<IBBI') # cell index (x * size + y), owner code, type code, count
+U32 = struct.Struct('<I')
+
+
+def negotiate_map_format(accept_mimetypes):
+    """Picks DENSE_JSON, SPARSE_JSON or BINARY from a werkzeug MIMEAccept."""
+    return accept_mimetypes.best_match(MAP_FORMATS, default=DENSE_JSON) or DENSE_JSON
+
+
+def _map_cells(game_map, previous_map):
+    # previous_map is the earlier GameMap, or a MapDelta already worked out against it
+    if previous_map is None:
+        return list(game_map.iter_codes()), []
+    if isinstance(previous_map, MapDelta):
+        return previous_map.changed, previous_map.removed
+    return game_map.diff(previous_map)
+
+
+def encode_sparse(game_map, previous_map=None):
+    """
+    Encodes only occupied cells as a flat integer list, 5 ints per cell:
+    [x, y, owner_code, type_code, count, ...]. Codes index into 'owners' and 'unit_types'.
+    With previous_map (a GameMap, or a MapDelta against one), only changed cells are sent
+    plus 'removed' as [x, y, ...].
+    """
+    size = game_map.size
+    changed, removed = _map_cells(game_map, previous_map)
+    flat = []
+    for cell, owner_code, type_code, count in changed:
+        x, y = divmod(cell, size)
+        flat.extend((x, y, owner_code, type_code, count))
+    encoded = {
+        'encoding': 'sparse',
+        'size': size,
+        'owners': OWNERS,
+        'unit_types': game_map.unit_types,
+        'cells': flat
+    }
+    if previous_map is not None:
+        encoded['delta'] = True
+        encoded['removed'] = [coord for cell in removed for coord in divmod(cell, size)]
+    return encoded
+
+
+def encode_binary(metadata, game_map, previous_map=None):
+    """
+    Packs a response as bytes. metadata is the JSON-able part of the payload (without the map)
+    and is embedded as-is. owners/unit_types are added to it so the codes can be decoded.
+    """
+    changed, removed = _map_cells(game_map, previous_map)
+    metadata = dict(metadata, owners=OWNERS, unit_types=game_map.unit_types)
+    meta_bytes = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+    flags = FLAG_DELTA if previous_map is not None else 0
+
+    parts = [HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, 0, game_map.size, len(meta_bytes)), meta_bytes]
+    parts.append(U32.pack(len(changed)))
+    parts.extend(CELL.pack(*cell) for cell in changed)
+    parts.append(U32.pack(len(removed)))
+    parts.extend(U32.pack(cell) for cell in removed)
+    return b''.join(parts)
+
+
+def decode_binary(data):
+    """Inverse of encode_binary. Returns (metadata, size, cells, removed, is_delta); cells as (x, y, owner, unit_type, count)."""
+    magic, version, flags, _, size, meta_len = HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError('Not an RTS binary map payload.')
+    offset = HEADER.size
+    metadata = json.loads(data[offset:offset + meta_len].decode('utf-8'))
+    offset += meta_len
+    (n_cells,) = U32.unpack_from(data, offset)
+    offset += U32.size
+    owners, unit_types = metadata['owners'], metadata['unit_types']
+    cells = []
+    for cell, owner_code, type_code, count in CELL.iter_unpack(data[offset:offset + n_cells * CELL.size]):
+        x, y = divmod(cell, size)
+        cells.append((x, y, owners[owner_code], unit_types[type_code], count))
+    offset += n_cells * CELL.size
+    (n_removed,) = U32.unpack_from(data, offset)
+    offset += U32.size
+    removed = [divmod(cell, size) for (cell,) in U32.iter_unpack(data[offset:offset + n_removed * U32.size])]
+    return metadata, size, cells, removed, bool(flags & FLAG_DELTA)
+
+
+def compress_body(body, accept_encodings):
+    """
+    Compresses body with gzip or deflate if the client accepts it and it is large enough.
+    - accept_encodings: werkzeug Accept header (request.accept_encodings).
+    Returns (body, content_encoding or None).
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    encoding = accept_encodings.best_match(['gzip', 'deflate'])
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=5), 'gzip'
+    if encoding == 'deflate':
+        return zlib.compress(body, 5), 'deflate'
+    return body, None